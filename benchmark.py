@@ -0,0 +1,335 @@
+#!/usr/bin/python
+
+''' These are the micro benchmarks for the performance sensitive parts of SNAP.
+    They use generated gateway responses, so they need no credentials and make no network calls.
+
+    Usage: benchmark.py [-n iterations] [-t transactions] benchmark ...
+        -n - times each measurement is repeated (best of three runs is reported)
+        -t - number of transactions in the generated SearchTransactions and GetBatch responses, and of plans projected
+        benchmark - one or more of the names in 'benchmarks' below, or 'all'
+
+    Main Functions
+        sampleTransaction - one generated transaction record, shaped like the gateway's
+        sampleSearchResponse / sampleBatchResponse - generated SearchTransactions and GetBatch responses
+        samplePlan - one generated payment plan dictionary
+        bestOf - time a function
+    Main Classes
+        StubSession - stands in for the HTTP session so wpTransact() can run without a gateway
+'''
+
+import sys
+import os
+import timeit
+import json
+import logging
+import datetime
+from getopt import getopt, GetoptError
+
+import wpcodec
+import wplog
+import wpresponseobjects
+import wpcolumns
+import wpprojection
+from wptotal import worldpay, wpTransact
+from wpthrottle import governor, configureTrafficClass, WpTokenBucket
+
+
+def sampleTransaction(i):
+    ''' Return a dictionary shaped like a transaction record returned by the gateway '''
+    return {
+        "transactionId": 110000000 + i,
+        "orderId": "ORD%08d" % i,
+        "secureNetId": 8000000,
+        "transactionType": "AUTH_CAPTURE",
+        "responseText": "Approved",
+        "authorizationCode": "A%05d" % (i % 100000),
+        "authorizedAmount": round(10 + (i % 5000) * 0.37, 2),
+        "paymentTypeCode": "VI",
+        "paymentTypeResult": "CREDIT_CARD",
+        "level2Valid": False,
+        "level3Valid": False,
+        "creditCardType": "VISA",
+        "cardNumber": "XXXXXXXXXXXX1111",
+        "avsCode": "Y",
+        "avsResult": "Address and 5 digit zip match",
+        "cardHolder_FirstName": "Jane",
+        "cardHolder_LastName": "Customer %d" % i,
+        "expirationDate": "1220",
+        "email": "customer%d@example.com" % i,
+        "cardCodeCode": "M",
+        "cardCodeResult": "Match",
+        "customerId": str(5000 + i % 300),
+        "method": "CC",
+        "additionalData1": None,
+        "additionalData2": None,
+        "billAddress": {"line1": "%d Main Street" % i, "city": "Austin", "state": "TX", "zip": "78701", "country": "US", "company": "", "phone": "512-555-0100"},
+        "transactionData": {"date": "2017-09-%02dT10:%02d:00" % (1 + i % 28, i % 60), "amount": round(10 + (i % 5000) * 0.37, 2)},
+        "settlementData": {"date": "2017-09-%02dT23:00:00" % (1 + i % 28), "amount": round(10 + (i % 5000) * 0.37, 2), "batchId": 2000 + i % 28},
+        "vaultData": {"company": "", "firstName": "Jane", "lastName": "Customer %d" % i, "email": "", "phone": "", "token": {"customerId": str(5000 + i % 300), "paymentMethodId": "1", "paymentType": "CREDIT_CARD"}},
+    }
+
+
+def sampleResponseHeader():
+    return {"result": "APPROVED", "responseCode": 1, "message": "SUCCESS", "responseDateTime": "2017-09-28T10:00:00.000Z", "success": True,
+            "rawRequest": None, "rawResponse": None, "jsonRequest": None}
+
+
+def sampleSearchResponse(n):
+    ''' Return a generated SearchTransactions response holding n transactions '''
+    d = sampleResponseHeader()
+    d["transactions"] = [sampleTransaction(i) for i in xrange(n)]
+    return d
+
+
+def sampleBatchResponse(n):
+    ''' Return a generated GetBatch response holding n transactions '''
+    d = sampleResponseHeader()
+    d["batchId"] = 2017
+    d["batchCount"] = n
+    d["transactions"] = [sampleTransaction(i) for i in xrange(n)]
+    return d
+
+
+def samplePlan(i):
+    ''' Return a recurring (monthly, weekly, or quarterly) or installment plan, shaped like the gateway's '''
+    plan = {"planId": i + 1, "cycleType": ("monthly", "weekly", "quarterly")[i % 3], "frequency": 1 + i % 2,
+            "dayOfTheMonth": 1 + i % 31, "dayOfTheWeek": 1 + i % 7, "startDate": "%d/%d/%d" % (1 + i % 12, 1 + i % 28, 2015 + i % 4)}
+    if i % 4 == 3:
+        plan.update(numberOfPayments=12 + i % 24, totalAmount=100 + i % 900, balloonAmount=0.0)
+    else:
+        plan.update(amount=9.95 + i % 50, endDate="" if i % 2 else "2021-06-30T00:00:00")
+    return plan
+
+
+def bestOf(fn, iterations):
+    ''' Return the best time, in seconds per call, of three runs of fn() '''
+    return min(timeit.repeat(fn, number=iterations, repeat=3)) / iterations
+
+
+class StubResponse(object):
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class StubSession(object):
+    '''This answers every request with the same body'''
+
+    def __init__(self, content):
+        self.content = content
+
+    def request(self, verb, url, **kwargs):
+        return StubResponse(self.content)
+
+    def close(self):
+        pass
+
+
+def useStubSession(sample):
+    ''' Point wpTransact() at a StubSession returning sample, and lift the client side rate limits '''
+    worldpay.closeSession()
+    worldpay.session = StubSession(json.dumps(sample))
+    governor.bucket = WpTokenBucket(None, None)
+    configureTrafficClass("reporting")
+
+
+def countCalls(module, name):
+    ''' Replace module.name with a wrapper that counts its calls. Returns the one element list holding the count '''
+    fn = getattr(module, name)
+    count = [0]
+
+    def counted(*args, **kwargs):
+        count[0] += 1
+        return fn(*args, **kwargs)
+    setattr(module, name, counted)
+    return count
+
+
+def benchCodec(iterations, size):
+    ''' Decode generated SearchTransactions and GetBatch bodies with every installed codec.
+        The baseline is the way wpTransact used to decode: stdlib json.loads of the body decoded to unicode (response.text).
+    '''
+    print "JSON codecs installed: %s (in use: %s)" % (", ".join(wpcodec.availableCodecs()), wpcodec.codec.name)
+    for label, sample in (("SearchTransactions", sampleSearchResponse(size)), ("GetBatch", sampleBatchResponse(size))):
+        body = json.dumps(sample)
+        print
+        print "%s response: %d transactions, %d bytes" % (label, size, len(body))
+
+        base = bestOf(lambda: json.loads(body.decode("utf-8")), iterations)
+        print "  %-28s %9.2f ms" % ("json.loads(text) - baseline", base * 1000)
+        for name in wpcodec.availableCodecs():
+            c = wpcodec.loadCodec(name)
+            t = bestOf(lambda: c.loads(body), iterations)
+            print "  %-28s %9.2f ms  %5.2fx" % (name + ".loads(content)", t * 1000, base / t)
+
+        base = bestOf(lambda: json.dumps(sample), iterations)
+        for name in wpcodec.availableCodecs():
+            c = wpcodec.loadCodec(name)
+            t = bestOf(lambda: c.dumps(sample), iterations)
+            print "  %-28s %9.2f ms  %5.2fx" % (name + ".dumps", t * 1000, base / t)
+
+
+def benchLogging(iterations, size):
+    ''' Run a SearchTransactions call and build its Response Object at WARNING, INFO, and DEBUG.
+        At WARNING nothing should be pretty-printed at all.
+    '''
+    sample = sampleSearchResponse(size)
+    useStubSession(sample)
+    pformats = countCalls(wplog, "pformat")
+    responsePformats = countCalls(wpresponseobjects, "pformat")
+
+    root = logging.getLogger()
+    sink = open(os.devnull, "w")
+    handler = logging.StreamHandler(sink)  # messages are fully formatted, then thrown away
+    root.addHandler(handler)
+
+    def transact():
+        ret = wpTransact("SearchTransactions", {})
+        wpresponseobjects.TransactionReportingResponseParameters(ret)
+
+    print "SearchTransactions response: %d transactions" % size
+    try:
+        for level in (logging.WARNING, logging.INFO, logging.DEBUG):
+            root.setLevel(level)
+            pformats[0] = responsePformats[0] = 0
+            transact()
+            calls = pformats[0] + responsePformats[0]
+            t = bestOf(transact, iterations if level != logging.DEBUG else max(1, iterations / 10))
+            print "  %-8s %9.2f ms per call  pformat calls per call: %d" % (logging.getLevelName(level), t * 1000, calls)
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(logging.WARNING)
+        sink.close()
+        worldpay.session = None
+
+
+def benchResponses(iterations, size):
+    ''' Build a GetBatch Response Object and read different amounts of it.
+        Reading every nested object of every transaction costs what building the whole response used to.
+    '''
+    body = json.dumps(sampleBatchResponse(size))
+
+    def build():
+        return wpresponseobjects.BatchResponseParameters(wpcodec.loads(body))
+
+    def readIds():  # what batchOperation() reads
+        for t in build().transactions:
+            t.transactionId
+
+    def readAll():
+        for t in build().transactions:
+            t.billAddress, t.transactionData, t.settlementData, t.vaultData.token
+
+    print "GetBatch response: %d transactions" % size
+    decode = bestOf(lambda: wpcodec.loads(body), iterations)
+    print "  %-36s %9.2f ms" % ("decode only", decode * 1000)
+    for label, fn in (("build response object", build), ("read transactionId of each", readIds), ("read every nested object", readAll)):
+        t = bestOf(fn, iterations)
+        print "  %-36s %9.2f ms" % (label, t * 1000)
+
+
+def benchColumns(iterations, size):
+    ''' Total a GetBatch response by card type: looping over Transaction objects, then from wpColumns() and wpArray().
+        Each includes decoding the body and building the response object. The last lines time a second grouping
+        of a table that has already been exported.
+    '''
+    body = json.dumps(sampleBatchResponse(size))
+
+    def build():
+        return wpresponseobjects.BatchResponseParameters(wpcodec.loads(body))
+
+    def loop():
+        totals = {}
+        for t in build().transactions:
+            count, total = totals.get(t.creditCardType, (0, 0))
+            totals[t.creditCardType] = (count + 1, total + wpcolumns.cents(t.transactionData.amount))
+        return totals
+
+    def columns():
+        return wpcolumns.wpTotals(wpcolumns.wpColumns(build().transactions), "creditCardType")
+
+    def array():
+        return wpcolumns.wpTotals(wpcolumns.wpArray(build().transactions), "creditCardType")
+
+    print "GetBatch response: %d transactions" % size
+    base = bestOf(loop, iterations)
+    print "  %-36s %9.2f ms" % ("loop over Transaction objects", base * 1000)
+    t = bestOf(columns, iterations)
+    print "  %-36s %9.2f ms  %5.2fx" % ("wpColumns + wpTotals", t * 1000, base / t)
+    cols = wpcolumns.wpColumns(build().transactions)
+    t = bestOf(lambda: wpcolumns.wpTotals(cols, "settled"), iterations)
+    print "  %-36s %9.2f ms" % ("  group exported columns again", t * 1000)
+    if wpcolumns.numpy is None:
+        print "  numpy not installed. wpArray skipped"
+        return
+    t = bestOf(array, iterations)
+    print "  %-36s %9.2f ms  %5.2fx" % ("wpArray + wpTotals", t * 1000, base / t)
+    table = wpcolumns.wpArray(build().transactions)
+    t = bestOf(lambda: wpcolumns.wpTotals(table, "settled"), iterations)
+    print "  %-36s %9.2f ms" % ("  group exported array again", t * 1000)
+
+
+def benchProjection(iterations, size):
+    ''' Project three years of charges of generated plans: one plan at a time with planOccurrences(), then all at
+        once with wpProjectPlans().
+    '''
+    plans = [samplePlan(i) for i in xrange(size)]
+    start, end = datetime.date(2018, 1, 1), datetime.date(2020, 12, 31)
+
+    def loop():
+        return [wpprojection.planOccurrences(plan, start, end, i) for i, plan in enumerate(plans)]
+
+    print "%d plans, %s to %s: %d charges" % (size, start, end, sum(len(charges) for charges in loop()))
+    base = bestOf(loop, iterations)
+    print "  %-36s %9.2f ms" % ("planOccurrences per plan", base * 1000)
+    if wpprojection.numpy is None:
+        print "  numpy not installed. wpProjectPlans skipped"
+        return
+    t = bestOf(lambda: wpprojection.wpProjectPlans(plans, start, end), iterations)
+    print "  %-36s %9.2f ms  %5.2fx" % ("wpProjectPlans", t * 1000, base / t)
+    table = wpprojection.wpProjectPlans(plans, start, end)
+    t = bestOf(lambda: wpprojection.wpForecast(table, "M"), iterations)
+    print "  %-36s %9.2f ms" % ("  wpForecast by month", t * 1000)
+
+
+benchmarks = {
+    "codec": benchCodec,
+    "columns": benchColumns,
+    "logging": benchLogging,
+    "projection": benchProjection,
+    "responses": benchResponses,
+}
+
+
+def main(argv):
+    try:
+        opts, args = getopt(argv, "n:t:")
+    except GetoptError as err:
+        print err
+        print 'Usage: benchmark.py [-n iterations] [-t transactions] ' + "|".join(sorted(benchmarks)) + "|all ..."
+        sys.exit(2)
+
+    iterations = 20
+    size = 1000
+    for opt, arg in opts:
+        if opt == '-n':
+            iterations = int(arg)
+        if opt == '-t':
+            size = int(arg)
+
+    names = sorted(benchmarks) if not args or 'all' in args else args
+    for name in names:
+        if name not in benchmarks:
+            print "Unknown benchmark: " + name
+            sys.exit(2)
+        print '*' * 80
+        print name
+        benchmarks[name](iterations, size)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
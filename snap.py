@@ -5,10 +5,14 @@ import sys
 import datetime
 import os
 import shutil
-from pprint import pformat
+from wplog import lazyPformat
 from getopt import getopt
-from wpexceptions import WpTimeoutError, WpConnectionError, WpTooManyRedirectsError, WpJSONError, WpBadResponseError, WpHTTPError, WpInvalidEndpointError
+from wpexceptions import WpTimeoutError, WpConnectionError, WpTooManyRedirectsError, WpJSONError, WpBadResponseError, WpHTTPError, WpInvalidEndpointError, WpScheduleError
 from wptotal import worldpay
+from wptransactionstore import closeTransactionStore
+from wpfingerprint import closeFingerprintIndex
+from wpwritebehind import closeWriteBehind
+from wpscheduler import WpScheduler
 from xauth import doAuth, doCharge, doPriorAuthCapture, doVerify, doManualAuthTransaction, doChargeWithToken
 from xsettlement import doGetBatch, doCloseBatch, doGetBatchById
 from xchargebacks import doVoid  # doRefund, doCredit
@@ -48,7 +52,8 @@ def main(argv):
     try:
         worldpay.validateConfiguration()  # Make sure our keys and ids are correct
         print '*' * 80
-        enactFullScript()
+        enactScheduledScript()
+        # enactFullScript()
         # enactTestScript()
         # enactInstallmentPaymentScript()
         # enactManualTransaction()
@@ -90,6 +95,11 @@ def main(argv):
     if worldpay.doubleSecretProbation is not None:  # For now, if requested, dump return headers to a special file
         worldpay.doubleSecretProbation.close()
 
+    closeWriteBehind()  # send queued vault updates before the session goes
+    worldpay.closeSession()  # release the pooled connections to the gateway
+    closeTransactionStore()
+    closeFingerprintIndex()
+
     return status
 
 
@@ -187,8 +197,8 @@ def enactFullScript():
         # Get Batch
         doGetBatch()  # get the current batch contents fix - not returning anything
 
-        log.info("Authorized Transactions: %s", pformat(capturedTransactions, indent=1))
-        log.info("Captured Transactions: %s", pformat(authTransactions, indent=1))
+        log.info("Authorized Transactions: %s", lazyPformat(capturedTransactions, indent=1))
+        log.info("Captured Transactions: %s", lazyPformat(authTransactions, indent=1))
 
         # Void
         if len(capturedTransactions):
@@ -303,6 +313,70 @@ def enactFullScript():
     return
 
 
+def enactScheduledScript():
+    ''' This is the same battery of transactions as enactFullScript, expressed as a dependency graph.
+        Each step names the ids it consumes and the id it produces, following the rules documented in
+        enactFullScript. Steps that don't depend on each other run in parallel. When a step fails, only
+        the steps that need its output are skipped; every other branch still runs to completion.
+        Raises:
+            WpScheduleError - after the run, if any step failed or was skipped
+    '''
+    s = WpScheduler()
+
+    # Unsettled and settled transactions (tid). Auth and Charge return [tid, amount]
+    s.add("Auth1", doAuth, produces="authTid1")
+    s.add("Auth2", doAuth, produces="authTid2")
+    s.add("Verify", doVerify)
+    s.add("Charge", doCharge, produces="chargeTid")
+    s.add("PriorAuthCapture", doPriorAuthCapture, consumes=["authTid2"], produces="captureTid")
+    s.add("UpdateTransaction", lambda t: doUpdateTransaction(t[0]), consumes=["captureTid"])
+    s.add("GetTransaction", lambda t: doGetTransaction(t[0]), consumes=["captureTid"], after=["UpdateTransaction"])
+    s.add("GetBatch", doGetBatch, after=["Charge", "PriorAuthCapture"])
+    s.add("Void", lambda t: doVoid(t[0]), consumes=["captureTid"], after=["GetTransaction", "GetBatch"])
+
+    # Batch (batch id). Close only once everything that lands in the current batch is done
+    s.add("CloseBatch", doCloseBatch, produces="batchId", after=["Auth1", "Verify", "Void"])
+    s.add("GetBatchById", doGetBatchById, consumes=["batchId"])
+
+    # Standalone
+    s.add("SearchTransactions", doSearchTransactions)
+    s.add("CreateToken", lambda: doCreateToken("", False))
+
+    # Customer (cid) and payment account (pid)
+    s.add("CreateCustomer", doCreateCustomer, produces="cid")
+    s.add("GetCustomer", doGetCustomer, consumes=["cid"])
+    s.add("UpdateCustomer", doUpdateCustomer, consumes=["cid"], after=["GetCustomer"])
+    s.add("CreatePaymentAccount", doCreatePaymentAccount, consumes=["cid"], produces="pid")
+    s.add("UpdatePaymentAccount", doUpdatePaymentAccount, consumes=["cid", "pid"])
+    s.add("GetPaymentAccount", doGetPaymentAccount, consumes=["cid", "pid"], after=["UpdatePaymentAccount"])
+    s.add("DeletePaymentAccount", doDeletePaymentAccount, consumes=["cid", "pid"], after=["GetPaymentAccount"])
+    s.add("CreateCustomerAndPayment", doCreateCustomerAndPayment, produces="cpCid")
+    s.add("UpdateCustomerAndPayment", doUpdateCustomerAndPayment, consumes=["cpCid"])
+
+    # Payment plans (plan id). Each plan gets its own customer
+    s.add("RecurringCustomer", doCreateCustomerAndPayment, produces="recurringCid")
+    s.add("CreateRecurringPaymentPlan", doCreateRecurringPaymentPlan, consumes=["recurringCid"], produces="recurringPlanId")
+    s.add("UpdateRecurringPaymentPlan", doUpdateRecurringPaymentPlan, consumes=["recurringCid", "recurringPlanId"])
+    s.add("InstallmentCustomer", doCreateCustomerAndPayment, produces="installmentCid")
+    s.add("CreateInstallmentPaymentPlan", doCreateInstallmentPaymentPlan, consumes=["installmentCid"], produces="installmentPlanId")
+    s.add("VariableCustomer", doCreateCustomerAndPayment, produces="variableCid")
+    s.add("CreateVariablePaymentPlan", doCreateVariablePaymentPlan, consumes=["variableCid"], produces="variablePlanId")
+    s.add("UpdateVariablePaymentPlan", doUpdateVariablePaymentPlan, consumes=["variableCid", "variablePlanId"])
+    s.add("GetPaymentPlan", doGetPaymentPlan, consumes=["variableCid", "variablePlanId"], after=["UpdateVariablePaymentPlan"])
+
+    result = s.run()
+
+    for name in sorted(result.errors):
+        print name + " failed: " + getattr(result.errors[name], 'message', str(result.errors[name]))
+    if result.skipped:
+        print "Skipped: " + ", ".join(sorted(result.skipped))
+
+    if not result.ok:
+        raise WpScheduleError(", ".join(sorted(result.errors)))
+
+    return
+
+
 def enactTestScript():
     try:
         cid = doCreateCustomerAndPayment()
@@ -0,0 +1,10 @@
+''' Tests of the bulk job, projection, and resilience modules. They never call the gateway: each test
+    replaces wpTransact in the module under test with a fake.
+
+    Run from the top directory, since the modules read their data files from there:
+        python -m unittest discover -s tests -t .
+'''
+
+import logging
+
+logging.getLogger().addHandler(logging.NullHandler())  # the modules log freely. Keep it out of the test output
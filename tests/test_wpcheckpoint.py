@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+''' WpCheckpoint and WpResultsFile, and resuming wpImportCustomers() with them '''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import wpimport
+from wpcheckpoint import WpCheckpoint, WpResultsFile
+from wpexceptions import WpStoreError
+
+
+def fakeCreate(calls):
+    ''' Return a wpTransact that creates a customer for every CreateCustomerAndPayment and notes its notes in calls '''
+    def transact(operation, payload, *args):
+        calls.append(payload.get("notes"))
+        customer = {"customerId": "c%d" % len(calls), "primaryPaymentMethodId": "p%d" % len(calls), "paymentMethods": [],
+                    "variablePaymentPlans": [], "recurringPaymentPlans": [], "installmentPaymentPlans": [], "userDefinedFields": []}
+        return {"responseCode": 1, "vaultCustomer": customer}
+    return transact
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "job.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testSaveAndReload(self):
+        checkpoint = WpCheckpoint(self.path)
+        self.assertEqual((checkpoint.position, checkpoint.complete), (0, False))
+        checkpoint.save(200, {"batch": 7})
+        checkpoint = WpCheckpoint(self.path)
+        self.assertEqual((checkpoint.position, checkpoint.state, checkpoint.complete), (200, {"batch": 7}, False))
+        checkpoint.finish()
+        self.assertTrue(WpCheckpoint(self.path).complete)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def testUnreadableCheckpoint(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertRaises(WpStoreError, WpCheckpoint, self.path)
+
+
+class ResultsFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "results.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testUnicodeAndUtf8TextSurviveAReload(self):
+        results = WpResultsFile(self.path, ("row", "id", "status"))
+        results.write({"row": 1, "id": "Jos\xc3\xa9", "status": "created"})  # as csv.DictReader reads it
+        results.write({"row": 2, "id": u"Zo\xeb", "status": None})  # as json.loads reads it
+        results.close()
+
+        done = WpResultsFile(self.path, ("row", "id", "status")).done
+        self.assertEqual(done[1]["id"], "Jos\xc3\xa9")
+        self.assertEqual(done[2]["id"], "Zo\xc3\xab")
+        self.assertEqual(done[2]["status"], "")
+
+    def testLaterLinesWin(self):
+        results = WpResultsFile(self.path, ("row", "status"))
+        results.write({"row": 3, "status": "customer"})
+        results.write({"row": 3, "status": "created"})
+        results.close()
+        self.assertEqual(WpResultsFile(self.path, ("row", "status")).done[3]["status"], "created")
+
+
+class ImportResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "customers.csv")
+        self.results = os.path.join(self.dir, "results.csv")
+        with open(self.source, "w") as f:
+            f.write("id,firstName,lastName,notes,cardNumber\n")
+            for n in xrange(1, 8):
+                f.write("s%d,Jos\xc3\xa9,Smith %d,s%d,4111111111111111\n" % (n, n, n))
+        self.saved = wpimport.wpTransact, WpResultsFile.write
+
+    def tearDown(self):
+        wpimport.wpTransact, WpResultsFile.write = self.saved
+        shutil.rmtree(self.dir)
+
+    def testRerunAfterCompletionDoesNothing(self):
+        calls = []
+        wpimport.wpTransact = fakeCreate(calls)
+        self.assertEqual(wpimport.wpImportCustomers(self.source, self.results, chunkSize=3), (7, 0, 0))
+        self.assertEqual(wpimport.wpImportCustomers(self.source, self.results, chunkSize=3), (0, 0, 0))
+        self.assertEqual(len(calls), 7)
+
+    def testFailedResultsWriteStopsBeforeTheCheckpoint(self):
+        calls = []
+        wpimport.wpTransact = fakeCreate(calls)
+        write = WpResultsFile.write
+
+        def failingWrite(results, values):
+            if values["row"] == 5:
+                raise WpStoreError("disk full")
+            write(results, values)
+        WpResultsFile.write = failingWrite
+        self.assertRaises(WpStoreError, wpimport.wpImportCustomers, self.source, self.results, chunkSize=3)
+        self.assertEqual(WpCheckpoint(self.results + ".checkpoint").position, 3)  # not moved past the chunk holding row 5
+
+        WpResultsFile.write = write
+        self.assertEqual(wpimport.wpImportCustomers(self.source, self.results, chunkSize=3), (2, 0, 2))
+        self.assertEqual(sorted(calls), ["s1", "s2", "s3", "s4", "s5", "s5", "s6", "s7"])  # only the unrecorded row is sent again
+
+    def testResumeSkipsRowsAlreadyRecorded(self):
+        calls = []
+        wpimport.wpTransact = fakeCreate(calls)
+        results = WpResultsFile(self.results, wpimport.resultColumns)  # a run that stopped after row 2, before any checkpoint
+        results.write({"row": 1, "id": "s1", "status": "created", "customerId": "x1"})
+        results.write({"row": 2, "id": "s2", "status": "failed", "message": "declined"})
+        results.close()
+        self.assertEqual(wpimport.wpImportCustomers(self.source, self.results, chunkSize=3), (5, 0, 2))
+        self.assertEqual(sorted(calls), ["s3", "s4", "s5", "s6", "s7"])
+
+
+if __name__ == "__main__":
+    unittest.main()
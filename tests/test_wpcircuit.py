@@ -0,0 +1,97 @@
+''' The circuit breaker's closed, open, and half open states '''
+
+import unittest
+
+from wpcircuit import WpCircuitBreaker
+from wpexceptions import WpCircuitOpenError, WpTimeoutError
+
+
+def fail():
+    raise WpTimeoutError("Test")
+
+
+def succeed():
+    return "ok"
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = WpCircuitBreaker("Test")
+        self.breaker.minCalls = 4
+        self.breaker.errorRate = 0.5
+        self.breaker.openSeconds = 30.0
+        self.breaker.halfOpenProbes = 2
+
+    def trip(self):
+        for fn in (succeed, succeed, fail, fail):
+            try:
+                self.breaker.call(fn)
+            except WpTimeoutError:
+                pass
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.opened)
+
+    def waitOut(self):
+        self.breaker.openedAt -= self.breaker.openSeconds + 1  # as if openSeconds had passed
+
+    def testStaysClosedBelowMinCalls(self):
+        for _ in xrange(3):
+            self.assertRaises(WpTimeoutError, self.breaker.call, fail)
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.closed)
+
+    def testStaysClosedBelowTheErrorRate(self):
+        for fn in (succeed, succeed, succeed, fail, succeed):
+            try:
+                self.breaker.call(fn)
+            except WpTimeoutError:
+                pass
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.closed)
+        self.assertAlmostEqual(self.breaker.snapshot()["errorRate"], 0.2)
+
+    def testOpenFailsFastWithoutCalling(self):
+        self.trip()
+        calls = []
+        self.assertRaises(WpCircuitOpenError, self.breaker.call, lambda: calls.append(1))
+        self.assertEqual(calls, [])
+
+    def testTrialCallsCloseIt(self):
+        self.trip()
+        self.waitOut()
+        self.assertEqual(self.breaker.call(succeed), "ok")
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.halfOpen)
+        self.breaker.call(succeed)
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.closed)
+        self.assertEqual(self.breaker.snapshot()["calls"], 0)  # the old failures are forgotten
+
+    def testFailedTrialCallReopensIt(self):
+        self.trip()
+        self.waitOut()
+        self.assertRaises(WpTimeoutError, self.breaker.call, fail)
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.opened)
+        self.assertRaises(WpCircuitOpenError, self.breaker.call, succeed)
+
+    def testOneTrialAtATime(self):
+        self.trip()
+        self.waitOut()
+        seen = []
+
+        def nested():  # a second call arriving while the first trial is still running
+            self.assertRaises(WpCircuitOpenError, self.breaker.call, succeed)
+            seen.append(True)
+        self.breaker.call(nested)
+        self.assertEqual(seen, [True])
+
+    def testReturnedFailuresCount(self):
+        for _ in xrange(4):
+            self.breaker.call(lambda: 503, lambda status: status >= 500)
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.opened)
+
+    def testSlowCallsOpenIt(self):
+        self.breaker.slowSeconds = -1.0  # every call is slow
+        for _ in xrange(4):
+            self.breaker.call(succeed)
+        self.assertEqual(self.breaker.state, WpCircuitBreaker.opened)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+''' wpProjectPlans() against planOccurrences(), and the plans neither will project '''
+
+import datetime
+import random
+import unittest
+
+import wpprojection
+from wpprojection import planOccurrences, wpProjectPlans, wpForecast
+from wprecurringobjects import RecurringPaymentPlan
+from wpresponseobjects import RecurringPaymentPlanRO
+from wpexceptions import WpInvalidFunctionCallError
+
+cycleTypes = ("daily", "weekly", "biweekly", "monthly", "quarterly", "semiannually", "annually", "Semi-Annually")
+
+
+def randomPlan(rng, planId):
+    ''' A recurring or installment plan dictionary with a random schedule '''
+    start = datetime.date(2017, 1, 1) + datetime.timedelta(rng.randint(0, 900))
+    plan = {"planId": planId, "active": True, "cycleType": rng.choice(cycleTypes), "frequency": rng.randint(0, 3),
+            "dayOfTheMonth": rng.choice((0, 1, 15, 28, 29, 30, 31)), "dayOfTheWeek": rng.randint(0, 7),
+            "month": rng.choice(("", 0, 2, 12)), "startDate": start.strftime("%m/%d/%Y")}
+    if rng.random() < 0.5:
+        plan["amount"] = rng.randint(100, 99999) / 100.0
+        if rng.random() < 0.5:
+            plan["endDate"] = (start + datetime.timedelta(rng.randint(0, 700))).isoformat() + "T00:00:00"
+    else:
+        plan["numberOfPayments"] = rng.randint(1, 24)
+        plan["totalAmount"] = rng.randint(1000, 500000) / 100.0
+        plan["balloonAmount"] = rng.choice((0, 50.0))
+        plan["balloonPaymentAddedTo"] = rng.choice(("FIRST", "LAST"))
+        plan["remainderPaymentAddedTo"] = rng.choice(("FIRST", "LAST", ""))
+    return plan
+
+
+@unittest.skipIf(wpprojection.numpy is None, "numpy is not installed")
+class ProjectPlansTest(unittest.TestCase):
+
+    def testMatchesPlanOccurrences(self):
+        rng = random.Random(20180101)
+        plans = [randomPlan(rng, n + 1) for n in xrange(500)]
+        start, end = datetime.date(2018, 1, 1), datetime.date(2019, 12, 31)
+        table = wpProjectPlans(plans, start, end)
+
+        projected = dict((i, []) for i in xrange(len(plans)))
+        for row in table:
+            projected[int(row["plan"])].append((row["date"].astype(datetime.date), int(row["amount"]), int(row["payment"])))
+        for i, plan in enumerate(plans):
+            self.assertEqual(projected[i], planOccurrences(plan, start, end, i), "plan %d: %r" % (i, plan))
+        self.assertTrue(all(table["date"][:-1] <= table["date"][1:]))
+
+    def testInactivePlansAreSkippedUnlessAsked(self):
+        plan = {"planId": 7, "active": False, "cycleType": "monthly", "amount": 10, "startDate": "01/15/2018"}
+        self.assertEqual(len(wpProjectPlans([plan], "01/01/2018", "12/31/2018")), 0)
+        self.assertEqual(planOccurrences(plan, "01/01/2018", "12/31/2018"), [])
+        self.assertEqual(len(wpProjectPlans([plan], "01/01/2018", "12/31/2018", includeInactive=True)), 12)
+
+    def testMonthEndMovesBackInShortMonths(self):
+        plan = {"active": True, "cycleType": "monthly", "dayOfTheMonth": 31, "amount": 1, "startDate": "01/31/2019"}
+        days = [c[0] for c in planOccurrences(plan, "01/01/2019", "04/30/2019")]
+        self.assertEqual(days, [datetime.date(2019, 1, 31), datetime.date(2019, 2, 28), datetime.date(2019, 3, 31), datetime.date(2019, 4, 30)])
+
+    def testInstallmentRemainderAndBalloon(self):
+        plan = {"active": True, "cycleType": "monthly", "numberOfPayments": 3, "totalAmount": 100.0,
+                "balloonAmount": 10.0, "balloonPaymentAddedTo": "FIRST", "startDate": "01/01/2019"}
+        charges = planOccurrences(plan, "01/01/2019", "12/31/2019")
+        self.assertEqual([c[1] for c in charges], [3000 + 1000, 3000, 3000])  # (100 - 10) / 3 each, and the balloon on the first
+        self.assertEqual(sum(c[1] for c in charges), 10000)
+
+    def testForecastTotals(self):
+        plans = [{"active": True, "cycleType": "weekly", "amount": 5, "startDate": "01/01/2019"}]
+        byMonth = wpForecast(wpProjectPlans(plans, "01/01/2019", "01/31/2019"), "M")
+        self.assertEqual(byMonth, {datetime.date(2019, 1, 1): (5, 2500)})
+
+    def testResponseObjectIsRefused(self):
+        ro = RecurringPaymentPlanRO({"planId": 1, "active": True, "cycleType": "monthly", "startDate": "2019-01-01"})
+        self.assertRaises(WpInvalidFunctionCallError, wpProjectPlans, [ro], "01/01/2019", "12/31/2019")
+
+    def testRequestObject(self):
+        plan = RecurringPaymentPlan()
+        plan.active = True
+        plan.cycleType = "quarterly"
+        plan.amount = 30.0
+        plan.startDate = "02/10/2019"
+        self.assertEqual([c[0].month for c in planOccurrences(plan, "01/01/2019", "12/31/2019")], [2, 5, 8, 11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+''' Resuming wpProvisionPlans() after plan failures '''
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import wpimport
+import wpprovision
+from wpexceptions import WpTimeoutError
+
+
+class FakeVault(object):
+    '''This answers CreateCustomerAndPayment, the create plan calls, and GetCustomer from memory.
+        planFailures - source id: "timeout" (the plan is created, then the call times out), "lost" (the call
+                       times out before reaching the gateway), or "refuse". Each is used once
+    '''
+
+    def __init__(self, planFailures=None):
+        self.planFailures = dict(planFailures or {})
+        self.customers = {}  # customerId: {"id": source id, "recurringPaymentPlans": [...], "installmentPaymentPlans": [...]}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, operation, payload, *args):
+        with self.lock:
+            self.calls.append(operation)
+            if operation == "CreateCustomerAndPayment":
+                cid = "c%d" % (len(self.customers) + 1)
+                self.customers[cid] = {"id": payload["notes"], "recurringPaymentPlans": [], "installmentPaymentPlans": []}
+                customer = {"customerId": cid, "primaryPaymentMethodId": "p" + cid[1:], "paymentMethods": [],
+                            "variablePaymentPlans": [], "recurringPaymentPlans": [], "installmentPaymentPlans": [], "userDefinedFields": []}
+                return {"responseCode": 1, "vaultCustomer": customer}
+            customer = self.customers[args[0]]
+            if operation == "GetCustomer":
+                return {"responseCode": 1, "vaultCustomer": json.loads(json.dumps(customer))}
+            failure = self.planFailures.pop(customer["id"], None)
+            if failure == "lost":
+                raise WpTimeoutError(operation)
+            if failure == "refuse":
+                return {"responseCode": 3, "result": "DECLINED", "message": "bad plan"}
+            plan = dict(payload["plan"], planId=100 + len(self.calls))
+            customer["installmentPaymentPlans" if "Installment" in operation else "recurringPaymentPlans"].append(plan)
+            if failure == "timeout":
+                raise WpTimeoutError(operation)
+            return {"responseCode": 1, "planId": plan["planId"], "customerId": args[0]}
+
+    def count(self, operation):
+        return self.calls.count(operation)
+
+
+class ProvisionResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, "plans.csv")
+        self.results = os.path.join(self.dir, "results.csv")
+        self.saved = wpimport.wpTransact, wpprovision.wpTransact
+
+    def tearDown(self):
+        wpimport.wpTransact, wpprovision.wpTransact = self.saved
+        shutil.rmtree(self.dir)
+
+    def writeSource(self, rows):
+        with open(self.source, "w") as f:
+            f.write("id,firstName,lastName,notes,cardNumber,cycleType,frequency,amount,startDate,active\n")
+            for i, name in rows:
+                f.write("%s,%s,Smith,%s,4111111111111111,monthly,1,9.95,1/1/2019,1\n" % (i, name, i))
+
+    def provision(self, vault):
+        wpimport.wpTransact = wpprovision.wpTransact = vault
+        return wpprovision.wpProvisionPlans(self.source, self.results, chunkSize=2, customerWorkers=2, planWorkers=2)
+
+    def lastLines(self):
+        with open(self.results) as f:
+            lines = [line.rstrip("\r\n").split(",") for line in f][1:]
+        return dict((int(line[0]), line) for line in lines)
+
+    def testTimedOutPlanThatWentThroughIsNotCreatedAgain(self):
+        self.writeSource([("s1", "Ann"), ("s2", "Bob"), ("s3", "Cy")])
+        vault = FakeVault({"s2": "timeout"})
+        self.assertEqual(self.provision(vault), (2, 1, 0, 1))
+        self.assertEqual(self.lastLines()[2][2], "customer")
+
+        self.assertEqual(self.provision(vault), (1, 0, 2, 0))
+        self.assertEqual(vault.count("CreateCustomerAndPayment"), 3)
+        self.assertEqual(vault.count("CreateRecurringPaymentPlan"), 3)
+        plans = [c["recurringPaymentPlans"] for c in vault.customers.values()]
+        self.assertEqual(sorted(len(p) for p in plans), [1, 1, 1])
+        row = self.lastLines()[2]
+        self.assertEqual(row[2], "created")
+        self.assertEqual(row[5], str(vault.customers[row[3]]["recurringPaymentPlans"][0]["planId"]))
+
+    def testLostPlanIsCreatedForTheSameCustomer(self):
+        self.writeSource([("s1", "Ann"), ("s2", "Bob")])
+        vault = FakeVault({"s1": "lost"})
+        self.assertEqual(self.provision(vault), (1, 1, 0, 1))
+        self.assertEqual(self.provision(vault), (1, 0, 1, 0))
+        self.assertEqual(vault.count("CreateCustomerAndPayment"), 2)
+        self.assertEqual([len(c["recurringPaymentPlans"]) for c in vault.customers.values()], [1, 1])
+
+    def testRefusedPlanIsRetriedWithoutANewCustomer(self):
+        self.writeSource([("s1", "Ann"), ("s2", "Bob")])
+        vault = FakeVault({"s2": "refuse"})
+        self.assertEqual(self.provision(vault), (1, 1, 0, 1))
+        row = self.lastLines()[2]
+        self.assertEqual((row[2], row[3]), ("failed", "c2"))
+
+        self.assertEqual(self.provision(vault), (1, 0, 1, 0))
+        self.assertEqual(vault.count("CreateCustomerAndPayment"), 2)
+        self.assertEqual(self.lastLines()[2][2], "created")
+        self.assertEqual(self.provision(vault), (0, 0, 0, 0))
+
+    def testSeveralMatchingPlansAreLeftForTheOperator(self):
+        self.writeSource([("s1", "Ann")])
+        vault = FakeVault({"s1": "timeout"})
+        self.provision(vault)
+        customer = vault.customers["c1"]
+        customer["recurringPaymentPlans"].append(dict(customer["recurringPaymentPlans"][0], planId=999))
+
+        self.assertEqual(self.provision(vault), (0, 1, 0, 0))
+        self.assertEqual(self.lastLines()[1][2], "unknown")
+        self.assertEqual(vault.count("CreateRecurringPaymentPlan"), 1)
+
+    def testResumeWithNonAsciiText(self):
+        self.writeSource([("Jos\xc3\xa9", "Jos\xc3\xa9"), ("s2", "Zo\xc3\xab")])
+        vault = FakeVault({"Jos\xc3\xa9": "lost"})
+        self.assertEqual(self.provision(vault), (1, 1, 0, 1))
+        self.assertEqual(self.lastLines()[1][:3], ["1", "Jos\xc3\xa9", "customer"])
+
+        self.assertEqual(self.provision(vault), (1, 0, 1, 0))
+        self.assertEqual(vault.count("CreateCustomerAndPayment"), 2)
+        self.assertEqual(self.lastLines()[1][2], "created")
+
+
+if __name__ == "__main__":
+    unittest.main()
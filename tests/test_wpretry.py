@@ -0,0 +1,100 @@
+''' Retry limits, backoff with jitter, and which calls are allowed to repeat '''
+
+import random
+import unittest
+
+import wpretry
+from wpretry import WpRetryPolicy, retryCall, setRetryPolicy, isIdempotent, lastRetryRecord
+from wpexceptions import WpTimeoutError, WpConnectionError, WpBadResponseError
+
+
+class Flaky(object):
+    '''A call that raises the given exceptions in turn, then returns "ok"'''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def testBackoffDoublesUpToTheCap(self):
+        policy = WpRetryPolicy(baseDelay=0.5, maxDelay=3.0, jitter=False)
+        self.assertEqual([policy.delay(n) for n in xrange(1, 6)], [0.5, 1.0, 2.0, 3.0, 3.0])
+
+    def testJitterStaysWithinTheBackoff(self):
+        policy = WpRetryPolicy(baseDelay=0.5, maxDelay=3.0)
+        random.seed(7)
+        for attempt in xrange(1, 8):
+            backoff = min(3.0, 0.5 * 2 ** (attempt - 1))
+            delays = [policy.delay(attempt) for _ in xrange(200)]
+            self.assertTrue(all(0 <= d <= backoff for d in delays))
+            self.assertGreater(max(delays) - min(delays), backoff / 2)  # spread out, not in lock step
+
+
+class RetryCallTest(unittest.TestCase):
+
+    def setUp(self):
+        setRetryPolicy("TestOperation", WpRetryPolicy(maxAttempts=3, baseDelay=0.0, maxDelay=0.0))
+
+    def tearDown(self):
+        setRetryPolicy("TestOperation", None)
+
+    def testTransientErrorsAreRetried(self):
+        call = Flaky(WpTimeoutError("TestOperation"), WpConnectionError("TestOperation"))
+        self.assertEqual(retryCall("TestOperation", True, call), "ok")
+        self.assertEqual(call.calls, 3)
+        record = lastRetryRecord()
+        self.assertTrue(record.succeeded and record.retried)
+        self.assertEqual([a.error is None for a in record.attempts], [False, False, True])
+
+    def testAttemptsRunOut(self):
+        call = Flaky(*[WpTimeoutError("TestOperation")] * 5)
+        with self.assertRaises(WpTimeoutError) as raised:
+            retryCall("TestOperation", True, call)
+        self.assertEqual(call.calls, 3)
+        self.assertFalse(raised.exception.retryRecord.succeeded)
+
+    def testNonIdempotentCallIsNeverRepeated(self):
+        call = Flaky(WpTimeoutError("TestOperation"))
+        self.assertRaises(WpTimeoutError, retryCall, "TestOperation", False, call)
+        self.assertEqual(call.calls, 1)
+
+    def testOtherErrorsAreNotRetried(self):
+        call = Flaky(WpBadResponseError("declined"))
+        self.assertRaises(WpBadResponseError, retryCall, "TestOperation", True, call)
+        self.assertEqual(call.calls, 1)
+
+    def testBudgetStopsRetries(self):
+        setRetryPolicy("TestOperation", WpRetryPolicy(maxAttempts=10, baseDelay=5.0, maxDelay=5.0, budget=1.0, jitter=False))
+        call = Flaky(*[WpTimeoutError("TestOperation")] * 5)
+        self.assertRaises(WpTimeoutError, retryCall, "TestOperation", True, call)
+        self.assertEqual(call.calls, 1)  # the first wait would already pass the budget
+
+    def testStatsCountEachOutcome(self):
+        before = dict(wpretry.retryStats)
+        retryCall("TestOperation", True, Flaky())
+        retryCall("TestOperation", True, Flaky(WpTimeoutError("TestOperation")))
+        self.assertRaises(WpTimeoutError, retryCall, "TestOperation", False, Flaky(WpTimeoutError("TestOperation")))
+        after = wpretry.retryStats
+        self.assertEqual((after["firstTry"] - before["firstTry"], after["retried"] - before["retried"], after["failed"] - before["failed"]), (1, 1, 1))
+
+
+class IdempotentTest(unittest.TestCase):
+
+    def testWhichCallsMayRepeat(self):
+        self.assertTrue(isIdempotent("GetCustomer", False, {}))
+        self.assertTrue(isIdempotent("SearchTransactions", True, {"startDate": "01/01/2019"}))
+        self.assertTrue(isIdempotent("Charge", True, {"amount": 5, "orderId": "a1"}))
+        self.assertFalse(isIdempotent("Charge", True, {"amount": 5}))
+        self.assertFalse(isIdempotent("CreateRecurringPaymentPlan", True, {"customerId": "5"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
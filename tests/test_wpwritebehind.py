@@ -0,0 +1,93 @@
+''' Coalescing, retrying, and journaling of queued vault updates '''
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import wpwritebehind
+from wpwritebehind import WpWriteBehind
+from wpexceptions import WpTimeoutError, WpInvalidFunctionCallError
+
+
+class FakeGateway(object):
+    '''This records each update sent. failures - exceptions to raise for the next calls, in turn'''
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, operation, payload, *args):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.sent.append((operation, args, payload))
+        return {"responseCode": 1}
+
+
+class WriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = wpwritebehind.wpTransact, wpwritebehind.getFingerprintIndex
+        wpwritebehind.getFingerprintIndex = lambda: None
+
+    def tearDown(self):
+        wpwritebehind.wpTransact, wpwritebehind.getFingerprintIndex = self.saved
+        shutil.rmtree(self.dir)
+
+    def queue(self, gateway, journal=None):
+        wpwritebehind.wpTransact = gateway
+        return WpWriteBehind(window=60.0, journal=journal)  # long enough that only flush() sends
+
+    def testChangesToOneCustomerAreSentTogether(self):
+        gateway = FakeGateway()
+        queue = self.queue(gateway)
+        queue.updateCustomer("5", emailAddress="old@example.com")
+        queue.updateCustomer("5", phoneNumber="512-555-0100")
+        queue.updateCustomer("5", emailAddress="new@example.com")
+        queue.updateCustomer("6", company="Acme")
+        self.assertEqual(queue.pendingCount(), 2)
+        self.assertEqual(queue.close(), 0)
+
+        sent = dict((args[0], payload) for operation, args, payload in gateway.sent)
+        self.assertEqual(len(gateway.sent), 2)
+        self.assertEqual((sent["5"]["emailAddress"], sent["5"]["phoneNumber"]), ("new@example.com", "512-555-0100"))
+        self.assertEqual(sent["6"]["company"], "Acme")
+        self.assertNotIn("company", sent["5"])  # fields that weren't changed are left alone
+
+    def testTransientFailureStaysQueued(self):
+        gateway = FakeGateway(WpTimeoutError("UpdateCustomer"))
+        queue = self.queue(gateway)
+        queue.updateCustomer("5", emailAddress="a@example.com")
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(queue.failures, [])
+        self.assertEqual(queue.close(), 0)
+        self.assertEqual(len(gateway.sent), 1)
+
+    def testUnknownFieldIsRefused(self):
+        queue = self.queue(FakeGateway())
+        self.assertRaises(WpInvalidFunctionCallError, queue.updateCustomer, "5", favouriteColour="blue")
+        self.assertRaises(WpInvalidFunctionCallError, queue.updateCustomer, "5", customerId="6")
+        queue.close()
+
+    def testJournalSurvivesARestart(self):
+        journal = os.path.join(self.dir, "queue.db")
+        queue = self.queue(FakeGateway(), journal)
+        queue.updatePaymentAccount("5", "2", notes="moved")
+        with queue.changed:  # as if the process died before sending
+            queue.stopped = True
+            queue.changed.notify_all()
+        queue.db.close()
+
+        gateway = FakeGateway()
+        queue = self.queue(gateway, journal)
+        self.assertEqual(queue.close(), 0)
+        self.assertEqual([(operation, args, payload["notes"]) for operation, args, payload in gateway.sent],
+                         [("UpdatePaymentAccount", ("5", "2"), "moved")])
+
+
+if __name__ == "__main__":
+    unittest.main()
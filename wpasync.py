@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+''' These are the classes used to run Worldpay Total transactions without blocking the caller.
+    This package targets Python 2, which has no asyncio, so non-blocking calls are serviced by a
+    shared pool of worker threads. Each call immediately returns a WpFuture that can be waited on
+    later, allowing a single process to keep many gateway calls in flight at once. All calls still
+    go through wpTransact() and the same Request and Response Objects.
+
+    Main Functions
+        wpTransactAsync - non-blocking version of wpTransact(). Returns a WpFuture
+        wpAsync - wrap any doXXX function so that it returns a WpFuture instead of blocking
+        wpWaitAll - wait on a list of futures and return their results in the same order
+    Global Variables
+        workers - the shared WpWorkerPool used by the functions above. Sized by WPTotal.asyncWorkers
+    Main Classes
+        WpFuture - handle to the eventual result of a call
+        WpWorkerPool - fixed pool of daemon threads that service a queue of calls
+'''
+
+import atexit
+import logging
+import sys
+import threading
+from Queue import Queue
+
+from wpexceptions import WpTimeoutError
+from wptotal import worldpay, wpTransact
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+class WpFuture(object):
+    '''This is the handle returned by every non-blocking call. The result is filled in by a worker thread.
+        Methods:
+            done() - True once the call has finished (successfully or not)
+            result(timeout) - block until finished and return the value, or raise the exception the call raised
+            exception(timeout) - block until finished and return the exception raised, or None
+            addDoneCallback(fn) - call fn(future) when the call finishes. Called immediately if already done
+    '''
+
+    def __init__(self, name=""):
+        self.name = name  # used for log and error messages only
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._excInfo = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise WpTimeoutError("waiting on " + self.name)
+        if self._excInfo is not None:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]  # re-raise with the worker's traceback
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise WpTimeoutError("waiting on " + self.name)
+        if self._excInfo is not None:
+            return self._excInfo[1]
+        return None
+
+    def addDoneCallback(self, fn):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        self._invoke(fn)
+
+    def setResult(self, value):
+        '''Called by the worker that ran the call. Not intended for use outside of this module.'''
+        self._result = value
+        self._finish()
+
+    def setException(self, excInfo):
+        '''Called by the worker that ran the call. excInfo is the tuple from sys.exc_info()'''
+        self._excInfo = excInfo
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            self._invoke(fn)
+
+    def _invoke(self, fn):
+        try:
+            fn(self)
+        except Exception:
+            log.exception("Callback for %s raised an exception", self.name)
+
+
+class WpWorkerPool(object):
+    '''This is a fixed size pool of daemon threads servicing a queue of calls.
+        The threads are started on the first submit() so importing this module costs nothing.
+        Methods:
+            submit(fn, *args, **kwargs) - queue fn(*args, **kwargs) and return a WpFuture for its result
+            shutdown(wait) - stop the workers once the queue drains
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.queue = Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        future = WpFuture(getattr(fn, '__name__', str(fn)))
+        self.start()
+        self.queue.put((future, fn, args, kwargs))
+        return future
+
+    def start(self):
+        if self.threads:
+            return
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.size):
+                t = threading.Thread(target=self.work, name="wpworker-" + str(i))
+                t.daemon = True  # never keep the interpreter alive just for idle workers
+                t.start()
+                self.threads.append(t)
+            log.debug("Started %d worker threads", self.size)
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            threads = self.threads
+            self.threads = []
+        for t in threads:
+            self.queue.put(None)  # one stop marker per worker
+        if wait:
+            for t in threads:
+                t.join()
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                future.setResult(fn(*args, **kwargs))
+            except:  # hand every exception, including WP exceptions, back to the waiting caller
+                future.setException(sys.exc_info())
+
+
+workers = WpWorkerPool(worldpay.asyncWorkers)  # shared pool used for all non-blocking calls
+atexit.register(workers.shutdown)  # let the workers finish and exit before the interpreter tears down module globals
+
+
+def wpTransactAsync(operation, payload, *args):
+    ''' This is the non-blocking version of wpTransact(). The arguments are identical.
+        returns:
+            WpFuture - result() returns the response dictionary or raises the same exceptions as wpTransact()
+    '''
+    return workers.submit(wpTransact, operation, payload, *args)
+
+
+def wpAsync(fn):
+    ''' Wrap a doXXX function so that calling it queues the call and returns a WpFuture.
+        input:
+            fn - the blocking function to wrap
+        returns:
+            function with the same arguments as fn that returns a WpFuture
+    '''
+    def submit(*args, **kwargs):
+        return workers.submit(fn, *args, **kwargs)
+
+    submit.__name__ = fn.__name__ + "Async"
+    submit.__doc__ = "Non-blocking version of " + fn.__name__ + "(). Returns a WpFuture.\n" + (fn.__doc__ or "")
+    return submit
+
+
+def wpWaitAll(futures, timeout=None):
+    ''' Wait for every future in the list and return their results in the same order.
+        input:
+            futures - list of WpFuture
+            timeout - optional number of seconds to wait for each future
+        returns:
+            list of results
+        raise:
+            the first exception raised by any of the calls, in list order
+    '''
+    return [f.result(timeout) for f in futures]
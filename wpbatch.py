@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+''' These are the functions used to run many independent transactions at once.
+    Each batch gets its own WpWorkerPool so the number of calls in flight is bounded by maxWorkers,
+    regardless of how long the list is. Results always come back in the order the calls were given.
+    A failed call does not stop the rest of the batch; its exception is returned in its slot instead.
+
+    Main Functions
+        wpTransactBatch - run a list of (operation, payload, pathParams) through wpTransact()
+        wpRunBatch - run a list of (function, args) pairs, such as doXXX calls
+        wpBatchErrors - pull the (index, exception) pairs out of a batch result
+'''
+
+import logging
+import sys
+
+from wpasync import WpWorkerPool
+from wptotal import worldpay, wpTransact
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+def wpTransactBatch(calls, maxWorkers=None):
+    ''' Run many independent wpTransact() calls concurrently.
+        Input:
+            calls - list of (operation, payload, pathParams) tuples. pathParams is a list or tuple holding
+                    p1 and p2 as required by the operation. It may be empty, None, or left off entirely
+            maxWorkers - most calls allowed in flight at once. Defaults to WPTotal.batchWorkers
+        Output:
+            list with one entry per call, in input order. Each entry is either the response dictionary
+            or the exception raised by wpTransact() for that call
+        Raises:
+            nothing - exceptions from individual calls are returned in their slot
+    '''
+    work = []
+    for call in calls:
+        operation, payload = call[0], call[1]
+        pathParams = call[2] if len(call) > 2 and call[2] is not None else ()
+        work.append((wpTransact, (operation, payload) + tuple(pathParams)))
+
+    return wpRunBatch(work, maxWorkers)
+
+
+def wpRunBatch(calls, maxWorkers=None):
+    ''' Run many independent function calls concurrently. Use this to batch doXXX functions.
+        Input:
+            calls - list of (function, args) pairs. args is a tuple of positional arguments and may be left off
+            maxWorkers - most calls allowed in flight at once. Defaults to WPTotal.batchWorkers
+        Output:
+            list with one entry per call, in input order. Each entry is either the function's return value
+            or the exception it raised
+        Raises:
+            nothing - exceptions from individual calls are returned in their slot
+    '''
+    if not calls:
+        return []
+
+    if maxWorkers is None:
+        maxWorkers = worldpay.batchWorkers
+    pool = WpWorkerPool(max(1, min(maxWorkers, len(calls))))  # no point starting more threads than calls
+
+    try:
+        futures = []
+        for call in calls:
+            fn = call[0]
+            args = call[1] if len(call) > 1 and call[1] is not None else ()
+            futures.append(pool.submit(fn, *args))
+
+        results = []
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception:
+                results.append(sys.exc_info()[1])
+    finally:
+        pool.shutdown()  # every call has finished, so the workers exit as soon as they see their stop markers
+
+    failures = len(wpBatchErrors(results))
+    log.info("Batch complete. Calls: %d Failed: %d Workers: %d", len(results), failures, pool.size)
+    return results
+
+
+def wpBatchErrors(results):
+    ''' Return the (index, exception) pairs for every failed call in a batch result '''
+    return [(i, r) for i, r in enumerate(results) if isinstance(r, Exception)]
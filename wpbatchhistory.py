@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+''' These are the functions used to pull many closed settlement batches at once, such as for an audit.
+
+    wpGetBatches() sends one GetBatchById per batch id, with at most maxWorkers in flight at a time
+    (see wpbatch.py). Each BatchResponseParameters is handed on as soon as it arrives, to a callback, to
+    the transaction store, or both, and is then let go. Only the batches currently in flight are ever held
+    in memory, however many ids are asked for.
+
+    GetBatchById is reporting traffic (see wpthrottle.py), which by default allows 4 calls in flight and 5
+    a second. A maxWorkers above that only queues the calls. To run more at once, raise the limits first,
+    for example configureTrafficClass("reporting", rate=10, maxInFlight=8).
+
+    With a store, batches already stored by putBatch() are skipped without calling the gateway. A closed
+    batch never changes, so an audit that is stopped part way picks up where it left off when run again.
+
+    Main Functions
+        wpGetBatches - retrieve a list or range of closed batches concurrently
+        getBatchById - retrieve one closed batch
+'''
+
+import logging
+import threading
+import time
+
+from wptotal import wpTransact
+from wpbatch import wpRunBatch, wpBatchErrors
+from wpsettlementobjects import BatchRequest
+from wpresponseobjects import BatchResponseParameters
+from wpexceptions import WpBadResponseError, WpInvalidFunctionCallError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+def getBatchById(batchId):
+    ''' Retrieve one closed batch.
+        Output:
+            BatchResponseParameters
+        Raises:
+            WpBadResponseError
+            Exceptions raised by wpTransact()
+    '''
+    rp = BatchResponseParameters(wpTransact("GetBatchById", BatchRequest().serialize(), batchId))
+    if (rp.responseCode != 1):  # response from Worldpay indicates failure
+        errMsg = "GetBatchById failed. Batch id: " + str(batchId) + " Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + str(rp.message)
+        raise WpBadResponseError(errMsg)
+    return rp
+
+
+def wpGetBatches(batchIds, callback=None, store=None, maxWorkers=None, skipStored=True):
+    ''' Retrieve many closed batches concurrently, streaming each one out as it arrives.
+        Input:
+            batchIds - list of batch ids, or a range such as xrange(2000, 2100)
+            callback - optional function called as callback(batchId, rp) with each BatchResponseParameters.
+                       Calls are made from worker threads but never overlap, so it needn't be thread safe
+            store - optional WpTransactionStore each batch is written to with putBatch()
+            maxWorkers - most batches in flight at once. Defaults to WPTotal.batchWorkers. The reporting traffic
+                         class (see wpthrottle.py) holds this to its own maxInFlight, 4 by default
+            skipStored - with a store, don't retrieve batches it already holds
+        Output:
+            list with one entry per batch id, in input order. Each entry is the number of transactions in the
+            batch, None if it was skipped, or the exception raised retrieving or handing it on
+        Raises:
+            WpInvalidFunctionCallError - there is nowhere for the batches to go (no callback and no store)
+    '''
+    if callback is None and store is None:
+        raise WpInvalidFunctionCallError("wpGetBatches needs a callback, a store, or both")
+
+    batchIds = list(batchIds)
+    handOff = threading.Lock()  # one batch at a time through the callback
+
+    def retrieve(batchId):
+        rp = getBatchById(batchId)
+        with handOff:
+            if store is not None:
+                store.putBatch(rp)
+            if callback is not None:
+                callback(batchId, rp)
+        return len(rp.transactions)  # the response itself is dropped here
+
+    t = time.time()
+    pending = [i for i, b in enumerate(batchIds) if not (store is not None and skipStored and store.hasBatch(b))]
+    fetched = wpRunBatch([(retrieve, (batchIds[i],)) for i in pending], maxWorkers)
+
+    results = [None] * len(batchIds)
+    for i, r in zip(pending, fetched):
+        results[i] = r
+    failures = wpBatchErrors(fetched)
+    log.info("Retrieved %d of %d batches (%d already stored, %d failed), %d transactions in %.2f seconds",
+             len(pending) - len(failures), len(batchIds), len(batchIds) - len(pending), len(failures),
+             sum(r for r in fetched if not isinstance(r, Exception)), time.time() - t)
+    return results
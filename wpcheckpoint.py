@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+''' These are the classes used to make long bulk jobs resumable.
+
+    A WpCheckpoint records how far through its source a job has got, plus any small state the job wants
+    to keep, in a JSON file. The file is replaced atomically (written to a temporary file, then renamed),
+    so a crash leaves either the previous checkpoint or the new one, never a partial file.
+
+    A WpResultsFile is an append only CSV of what happened to each source row. Every row is flushed as
+    soon as it is written, so after a crash it also tells the job which rows past the checkpoint were
+    already done.
+
+    A job reads its source in chunks. As each row finishes, its result is appended. Once a whole chunk is
+    done, the checkpoint is moved past it. On restart, the job skips to the checkpoint and passes over any
+    row the results file already shows as done.
+
+    Main Classes
+        WpCheckpoint - position and state of a bulk job
+        WpResultsFile - per row results of a bulk job
+'''
+
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+from wpexceptions import WpStoreError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+def cell(value):
+    ''' Return a value as the UTF-8 bytes the csv module writes. Byte strings, such as the values csv.DictReader
+        reads, are taken to be UTF-8 already. Not intended for use outside of this module.
+    '''
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return str(value)
+
+
+class WpCheckpoint(object):
+    '''This is the saved progress of a bulk job.
+        Attributes:
+            path - the checkpoint file
+            position - number of source rows fully handled. 0 for a new job
+            state - dictionary of anything else the job saved
+            complete - True once the job has finished
+        Methods:
+            save(position, state) - record progress
+            finish() - record that the job is complete
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.position = 0
+        self.state = {}
+        self.complete = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    saved = json.load(f)
+            except (IOError, ValueError) as e:
+                raise WpStoreError("checkpoint " + path + ": " + str(e))
+            self.position = saved.get("position", 0)
+            self.state = saved.get("state", {})
+            self.complete = saved.get("complete", False)
+            log.info("Resuming from checkpoint %s at row %d", path, self.position)
+
+    def save(self, position, state=None):
+        self.position = position
+        if state is not None:
+            self.state = state
+        self.write()
+
+    def finish(self):
+        self.complete = True
+        self.write()
+
+    def write(self):
+        '''Replace the checkpoint file. Not intended for use outside of this class.'''
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump({"position": self.position, "state": self.state, "complete": self.complete, "saved": time.time()}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name == 'nt' and os.path.exists(self.path):  # rename won't replace a file on Windows
+                os.remove(self.path)
+            os.rename(temporary, self.path)
+        except (IOError, OSError) as e:
+            raise WpStoreError("checkpoint " + self.path + ": " + str(e))
+
+
+class WpResultsFile(object):
+    '''This is an append only CSV file of per row results, safe to write from several threads.
+        The first column is always the source row number.
+        Attributes:
+            path - the results file
+            columns - the column names, row first
+            done - dictionary of row number to its result (a dictionary of column values) already in the file
+        Methods:
+            write(values) - append one result (a dictionary of column values). Text may be unicode or UTF-8 bytes
+            close()
+    '''
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = ["row"] + [c for c in columns if c != "row"]
+        self.done = {}
+        self.lock = threading.Lock()
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rU') as f:
+                for result in csv.DictReader(f):
+                    if result.get("row"):
+                        self.done[int(result["row"])] = result
+        try:
+            self.file = open(path, 'ab')
+        except IOError as e:
+            raise WpStoreError("results " + path + ": " + str(e))
+        self.writer = csv.DictWriter(self.file, self.columns, extrasaction='ignore')
+        if not exists:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write(self, values):
+        ''' Append one result and flush it to disk.
+            Raises:
+                WpStoreError - the row could not be written
+        '''
+        row = dict((k, cell(v)) for k, v in values.iteritems())
+        with self.lock:
+            try:
+                self.writer.writerow(row)
+                self.file.flush()  # a crash must not lose a row that was sent to the gateway
+            except (IOError, csv.Error) as e:
+                raise WpStoreError("results " + self.path + ": " + str(e))
+            self.done[int(values["row"])] = values
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+''' These are the classes used to stop sending traffic to a gateway endpoint that is failing.
+    There is one breaker per operation in WPTarget.url. Each breaker tracks the error rate and
+    latency of the calls made in the last windowSeconds. When too many of them fail or run slow,
+    the breaker opens and calls fail immediately with WpCircuitOpenError instead of waiting out
+    WPTotal.timeout. After openSeconds the breaker lets a few trial calls through (half open).
+    If they succeed it closes again, and if any of them fails it reopens.
+
+    Main Functions
+        getBreaker - return the breaker for an operation, creating it on first use
+        configureBreaker - change the settings of an operation's breaker
+    Main Classes
+        WpCircuitBreaker - the breaker itself. wpTransact() calls it through call()
+'''
+
+import logging
+import threading
+import time
+from collections import deque
+
+from wpexceptions import WpCircuitOpenError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+class WpCircuitBreaker(object):
+    '''This tracks the health of a single operation and decides whether calls may proceed.
+        Settings (class defaults, may be overridden per breaker with configureBreaker()):
+            windowSeconds - how far back calls are remembered
+            minCalls - calls needed in the window before the breaker may open
+            errorRate - fraction of failed calls that opens the breaker
+            slowSeconds - a call taking longer than this counts as slow
+            slowRate - fraction of slow calls that opens the breaker
+            openSeconds - how long the breaker stays open before trying again
+            halfOpenProbes - trial calls allowed through, one at a time, while half open. All must succeed to close
+        Methods:
+            call(fn, isFailure) - run fn() if allowed, record the outcome, and return its result
+            snapshot() - dictionary with the current state and rolling statistics
+    '''
+
+    closed = "CLOSED"  # Constants - do not change
+    opened = "OPEN"
+    halfOpen = "HALF_OPEN"
+
+    windowSeconds = 60.0
+    minCalls = 10
+    errorRate = 0.5
+    slowSeconds = 10.0
+    slowRate = 0.8
+    openSeconds = 30.0
+    halfOpenProbes = 2
+
+    def __init__(self, name):
+        self.name = name
+        self.state = self.closed
+        self.calls = deque()  # (finish time, failed, elapsed) for each call in the window
+        self.openedAt = 0.0
+        self.probesInFlight = 0
+        self.probesPassed = 0
+        self.lock = threading.Lock()
+
+    def call(self, fn, isFailure=None):
+        ''' Run fn() through the breaker.
+            Input:
+                fn - the call to make. Takes no arguments
+                isFailure - optional function of the result that returns True if a returned value should count as a failure
+            Output:
+                the return of fn
+            Raises:
+                WpCircuitOpenError - the breaker is open, fn was not called
+                whatever fn raises. Any exception counts as a failure
+        '''
+        probe = self.allow()
+        t = time.time()
+        try:
+            ret = fn()
+        except:
+            self.record(probe, True, time.time() - t)
+            raise
+        self.record(probe, isFailure is not None and isFailure(ret), time.time() - t)
+        return ret
+
+    def allow(self):
+        '''Return False for an ordinary call, True for a half open trial call, or raise if the call must not proceed'''
+        with self.lock:
+            if self.state == self.opened:
+                if time.time() - self.openedAt < self.openSeconds:
+                    raise WpCircuitOpenError(self.name)
+                self.state = self.halfOpen
+                self.probesInFlight = 0
+                self.probesPassed = 0
+                log.warning("Circuit for %s is half open. Sending trial calls", self.name)
+            if self.state == self.halfOpen:
+                if self.probesInFlight > 0:  # one trial at a time. Everyone else keeps failing fast
+                    raise WpCircuitOpenError(self.name)
+                self.probesInFlight += 1
+                return True
+            return False
+
+    def record(self, probe, failed, elapsed):
+        now = time.time()
+        with self.lock:
+            self.calls.append((now, failed, elapsed))
+            self.prune(now)
+
+            if probe:
+                self.probesInFlight -= 1
+                if failed:
+                    self.trip(now, "trial call failed")
+                else:
+                    self.probesPassed += 1
+                    if self.probesPassed >= self.halfOpenProbes:
+                        self.state = self.closed
+                        self.calls.clear()  # start the window fresh so the old failures don't reopen it
+                        log.warning("Circuit for %s closed", self.name)
+                return
+
+            if self.state == self.closed and len(self.calls) >= self.minCalls:
+                failures = sum(1 for c in self.calls if c[1])
+                slow = sum(1 for c in self.calls if c[2] > self.slowSeconds)
+                if failures >= self.errorRate * len(self.calls):
+                    self.trip(now, "%d of %d calls failed" % (failures, len(self.calls)))
+                elif slow >= self.slowRate * len(self.calls):
+                    self.trip(now, "%d of %d calls were slower than %.1f seconds" % (slow, len(self.calls), self.slowSeconds))
+
+    def trip(self, now, reason):
+        self.state = self.opened
+        self.openedAt = now
+        log.error("Circuit for %s opened: %s", self.name, reason)
+
+    def prune(self, now):
+        cutoff = now - self.windowSeconds
+        while self.calls and self.calls[0][0] < cutoff:
+            self.calls.popleft()
+
+    def snapshot(self):
+        with self.lock:
+            self.prune(time.time())
+            n = len(self.calls)
+            failures = sum(1 for c in self.calls if c[1])
+            latency = sum(c[2] for c in self.calls)
+            return {
+                'state': self.state,
+                'calls': n,
+                'errorRate': float(failures) / n if n else 0.0,
+                'averageLatency': latency / n if n else 0.0
+            }
+
+
+breakers = {}  # operation (lowercase) -> WpCircuitBreaker
+breakersLock = threading.Lock()
+
+
+def getBreaker(operation):
+    ''' Return the breaker for an operation, creating it on first use '''
+    op = operation.lower()
+    breaker = breakers.get(op)
+    if breaker is None:
+        with breakersLock:
+            breaker = breakers.setdefault(op, WpCircuitBreaker(op))
+    return breaker
+
+
+def configureBreaker(operation, **settings):
+    ''' Override any of the WpCircuitBreaker settings for one operation, e.g. configureBreaker("Charge", openSeconds=10) '''
+    breaker = getBreaker(operation)
+    for k, v in settings.iteritems():
+        if not hasattr(WpCircuitBreaker, k):
+            raise AttributeError("WpCircuitBreaker has no setting " + k)
+        setattr(breaker, k, v)
+    return breaker
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+''' These are the functions used to convert request payloads to JSON and responses back to dictionaries.
+    wpTransact() goes through dumps() and loads() here rather than calling the json module directly, so
+    a faster JSON backend is picked up whenever one is installed. The backends are tried in the order
+    listed in codecPreference, and the standard library json module is always available as a fallback.
+
+    loads() takes the raw bytes of the HTTP body (response.content). Decoding straight from bytes skips
+    building the intermediate unicode string that response.text creates, and the character set guessing
+    requests does when the gateway leaves the charset off the Content-Type header.
+
+    Main Functions
+        dumps - convert a payload dictionary to a JSON string
+        loads - convert a JSON response body (bytes) to a dictionary
+        setCodec - use a specific backend by name
+        availableCodecs - names of the backends that can be imported here
+    Global Variables
+        codecPreference - backend names in the order they are tried
+        codec - the WpCodec currently in use
+    Main Classes
+        WpCodec - a JSON backend
+'''
+
+import logging
+import json
+
+from wpexceptions import WpConfigurationError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+codecPreference = ("ujson", "simplejson", "json")
+
+
+class WpCodec(object):
+    '''This is a single JSON backend.
+        Attributes:
+            name - name of the module providing it
+            dumps - function of a dictionary returning a JSON str
+            loads - function of a JSON str (bytes) returning a dictionary. Raises ValueError on bad JSON
+    '''
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+
+def loadCodec(name):
+    ''' Import a backend by name and wrap it in a WpCodec. Returns None if it isn't installed.
+        Not intended for use outside of this module.
+    '''
+    if name == "json":
+        return WpCodec("json", json.dumps, json.loads)
+
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+
+    if name == "ujson":
+        def ujsonDumps(obj):
+            return module.dumps(obj, escape_forward_slashes=False)  # match the stdlib output for urls and dates
+        return WpCodec(name, ujsonDumps, module.loads)
+
+    return WpCodec(name, module.dumps, module.loads)
+
+
+def availableCodecs():
+    ''' Return the names of the backends in codecPreference that can be imported here '''
+    return [name for name in codecPreference if loadCodec(name) is not None]
+
+
+def setCodec(name=None):
+    ''' Use the named backend for every call. With no name, use the first one in codecPreference that is installed.
+        Raises:
+            WpConfigurationError - the named backend is not installed
+    '''
+    global codec
+    for candidate in ((name,) if name else codecPreference):
+        c = loadCodec(candidate)
+        if c is not None:
+            codec = c
+            log.debug("JSON codec: %s", c.name)
+            return c
+    raise WpConfigurationError("JSON codec not installed: " + str(name))
+
+
+def dumps(obj):
+    return codec.dumps(obj)
+
+
+def loads(s):
+    return codec.loads(s)
+
+
+codec = None
+setCodec()
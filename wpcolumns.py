@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+''' These are the functions used to turn lists of transactions into columns for analytics.
+    Totals by card type, settlement status, or day are then a single pass over one or two columns
+    rather than a loop that builds every Transaction object and its nested objects.
+
+    The columns are read straight from the raw response dictionaries, so a search or batch response can
+    be exported without building its Transaction objects at all. Amounts are fixed-point integer cents,
+    so totals are exact.
+
+    wpColumns() needs nothing outside the standard library. wpArray() returns a NumPy structured array
+    and needs numpy, which is optional: everything else here works without it.
+
+    Main Functions
+        wpColumns - dictionary of column name to list of values
+        wpArray - NumPy structured array with one field per column
+        wpTotals - count and total cents of each value of a column
+        cents - convert a dollar amount to integer cents
+    Global Variables
+        arrayType - the NumPy dtype of the array returned by wpArray. Its text columns ("S") are sized to
+                    their longest value in each call, so nothing is cut short
+
+    Columns:
+        transactionId, orderId
+        amount - transactionData.amount (authorizedAmount if missing) in cents. 0 if neither is present
+        creditCardType, transactionType, responseText
+        transactionDate, settlementDate - day as 'YYYY-MM-DD'. None (NaT in the array) if missing
+        batchId - settlementData.batchId. None (-1 in the array) if unsettled
+        settled - True if the transaction has been settled into a batch
+
+    Example:
+        table = wpArray(rp.transactions)
+        byCard = wpTotals(table, "creditCardType")  # {"VISA": (count, cents), ...}
+        unsettled = table["amount"][~table["settled"]].sum()
+'''
+
+import logging
+
+from wpresponseobjects import rawTransactions
+from wpexceptions import WpConfigurationError
+
+try:
+    import numpy
+except ImportError:  # numpy is optional. Only wpArray() needs it
+    numpy = None
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+columnNames = ("transactionId", "orderId", "amount", "creditCardType", "transactionType", "responseText",
+               "transactionDate", "settlementDate", "batchId", "settled")
+
+textColumns = ("orderId", "creditCardType", "transactionType", "responseText")
+
+arrayType = [
+    ("transactionId", "i8"),
+    ("orderId", "S"),
+    ("amount", "i8"),
+    ("creditCardType", "S"),
+    ("transactionType", "S"),
+    ("responseText", "S"),
+    ("transactionDate", "M8[D]"),
+    ("settlementDate", "M8[D]"),
+    ("batchId", "i8"),
+    ("settled", "?"),
+]
+
+
+def cents(amount):
+    ''' Return a dollar amount (float, string, or None) as integer cents, rounded to the nearest cent. None is 0 '''
+    if amount is None:
+        return 0
+    return int(round(float(amount) * 100))
+
+
+def day(timestamp):
+    ''' Return the 'YYYY-MM-DD' day of a gateway timestamp, or None. Not intended for use outside of this module. '''
+    return timestamp[:10] if timestamp else None
+
+
+def encoded(value):
+    ''' Return a text value as a UTF-8 byte string. None is "". Not intended for use outside of this module. '''
+    if value is None:
+        return ""
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return str(value)
+
+
+def wpColumns(transactions):
+    ''' Turn transactions into columns.
+        Input:
+            transactions - a LazyList (such as rp.transactions), or a list of Transaction objects or raw dictionaries
+        Output:
+            dictionary of column name (see columnNames) to a list with one value per transaction
+    '''
+    columns = dict((name, []) for name in columnNames)
+    transactionId = columns["transactionId"].append
+    orderId = columns["orderId"].append
+    amount = columns["amount"].append
+    creditCardType = columns["creditCardType"].append
+    transactionType = columns["transactionType"].append
+    responseText = columns["responseText"].append
+    transactionDate = columns["transactionDate"].append
+    settlementDate = columns["settlementDate"].append
+    batchId = columns["batchId"].append
+    settled = columns["settled"].append
+
+    for d in rawTransactions(transactions):
+        data = d.get("transactionData") or {}
+        settlement = d.get("settlementData") or {}
+        value = data.get("amount")
+        transactionId(d["transactionId"])
+        orderId(d.get("orderId"))
+        amount(cents(value if value is not None else d.get("authorizedAmount")))
+        creditCardType(d.get("creditCardType"))
+        transactionType(d.get("transactionType"))
+        responseText(d.get("responseText"))
+        transactionDate(day(data.get("date")))
+        settlementDate(day(settlement.get("date")))
+        batchId(settlement.get("batchId"))
+        settled(bool(settlement.get("batchId")))
+    return columns
+
+
+def wpArray(transactions):
+    ''' Turn transactions into a NumPy structured array.
+        Input:
+            transactions - as for wpColumns()
+        Output:
+            numpy array of dtype arrayType, one row per transaction. Text is UTF-8 encoded
+        Raises:
+            WpConfigurationError - numpy is not installed
+    '''
+    if numpy is None:
+        raise WpConfigurationError("wpArray needs numpy. Use wpColumns instead")
+
+    columns = wpColumns(transactions)
+    texts = dict((name, [encoded(v) for v in columns[name]]) for name in textColumns)
+    dtype = [(name, "S%d" % max([1] + [len(v) for v in texts[name]])) if name in texts else (name, t) for name, t in arrayType]  # fixed width numpy would silently truncate longer values
+    table = numpy.empty(len(columns["transactionId"]), dtype=dtype)
+    table["transactionId"] = columns["transactionId"]
+    table["amount"] = columns["amount"]
+    table["settled"] = columns["settled"]
+    table["batchId"] = [-1 if b is None else b for b in columns["batchId"]]
+    for name in textColumns:
+        table[name] = texts[name]
+    for name in ("transactionDate", "settlementDate"):
+        table[name] = numpy.array([v or "NaT" for v in columns[name]], dtype="M8[D]")
+    return table
+
+
+def wpTotals(table, by):
+    ''' Count and total the amount of the transactions for each value of a column.
+        Input:
+            table - columns from wpColumns(), or an array from wpArray()
+            by - name of the column to group on, such as "creditCardType", "settled", or "transactionDate"
+        Output:
+            dictionary of column value to (count, total cents). Grouping an array gives the values as numpy
+            converts them, so a date column is keyed by datetime.date rather than 'YYYY-MM-DD'
+    '''
+    if numpy is not None and isinstance(table, numpy.ndarray):
+        keys, index = numpy.unique(table[by], return_inverse=True)
+        counts = numpy.bincount(index, minlength=len(keys))
+        sums = numpy.bincount(index, weights=table["amount"], minlength=len(keys))  # float64 is exact for totals under 2**53 cents
+        return dict((k, (int(c), int(round(t)))) for k, c, t in zip(keys.tolist(), counts, sums))
+
+    totals = {}
+    for key, amount in zip(table[by], table["amount"]):
+        count, total = totals.get(key, (0, 0))
+        totals[key] = (count + 1, total + amount)
+    return totals
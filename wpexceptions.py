@@ -77,3 +77,21 @@ class WpInvalidEndpointError(WpTransactionError):  # REST target is invalid
     def __init__(self, m):
         self.message = "Invalid endpoint: " + m
         log.error(self.message)
+
+
+class WpCircuitOpenError(WpTransactionError):  # endpoint is failing, so the call was refused without contacting it
+    def __init__(self, m):
+        self.message = "Circuit open, transaction not attempted: " + m
+        log.error(self.message)
+
+
+class WpScheduleError(Error):  # one or more steps of a WpScheduler run failed
+    def __init__(self, m):
+        self.message = "Scheduled steps failed: " + m
+        log.error(self.message)
+
+
+class WpStoreError(Error):  # a local store file could not be opened, read, or written
+    def __init__(self, m):
+        self.message = "Local store failed: " + m
+        log.error(self.message)
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+''' This is the local index used to stop retries and replays from creating duplicate vault customers.
+
+    A customer's fingerprint is a hash of its normalized name, email address, phone number, and address,
+    taken from a CustomerRequest (or CustomerAndPaymentRequest) and its attached Address. The index maps
+    fingerprints to the customerId the vault assigned, in a SQLite file. Before a create is sent, the index
+    is checked: if the same customer was already created, its customerId is returned and the gateway is
+    never called.
+
+    Normalization: text is lower cased with surrounding and repeated spaces removed, phone numbers keep
+    only their digits, and zip codes keep their first five characters. A request with no name, email,
+    or phone has no fingerprint and is never deduplicated.
+
+    A create that supplies its own customerId has that id in its fingerprint. A retry of the same create
+    is still deduplicated, but a different customer who happens to share the name and address of one
+    already created gets its own id rather than the other's.
+
+    Two creates of the same customer running at once in this process are serialized, so the second waits
+    for the first and gets its customerId rather than creating another.
+
+    The index is off unless WPTotal.fingerprintIndexFile is set. Entries never expire and are not checked
+    against the vault, so a customer deleted outside SNAP is still returned for its fingerprint. Only turn
+    it on where SNAP is the only thing removing customers, or call forgetCustomer() when one is removed.
+
+    Main Functions
+        customerFingerprint - fingerprint of a customer request
+        getFingerprintIndex - return the index at WPTotal.fingerprintIndexFile, opening it on first use
+        closeFingerprintIndex - close that index
+    Main Classes
+        WpFingerprintIndex - a SQLite file of fingerprint to customerId
+
+    Example:
+        cid, created = getFingerprintIndex().findOrCreate(customerFingerprint(cr), lambda: sendCreate(cr))
+'''
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from wptotal import worldpay
+from wpexceptions import WpStoreError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+schema = (
+    "CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, customerId TEXT NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS fingerprintsCustomer ON fingerprints (customerId)",
+)
+
+addressFields = ("line1", "city", "state", "zip", "country")
+
+
+def normalText(value):
+    ''' Lower case with surrounding and repeated spaces removed. Not intended for use outside of this module. '''
+    return " ".join(unicode(value or "").lower().split())
+
+
+def customerFingerprint(request):
+    ''' Return the fingerprint of a CustomerRequest or CustomerAndPaymentRequest, or None if it has no name, email, or phone '''
+    identity = [normalText(request.firstName), normalText(request.lastName), normalText(request.emailAddress),
+                re.sub(r"\D", "", str(request.phoneNumber or ""))]
+    if not any(identity):
+        return None
+    address = request.address or {}
+    parts = identity + [normalText(address.get(name))[:5] if name == "zip" else normalText(address.get(name)) for name in addressFields]
+    if request.customerId:  # the caller chose the id, so only a create of that same id is a duplicate
+        parts.append(u"customerId=" + unicode(request.customerId))
+    return hashlib.sha1(u"\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class WpFingerprintIndex(object):
+    '''This is a SQLite file of customer fingerprints, safe to share between threads.
+        Methods:
+            find(fingerprint) - customerId, or None
+            findOrCreate(fingerprint, create) - customerId of an existing customer, or of one made by create()
+            replace(customerId, fingerprint) - index a customer under a new fingerprint, such as after an update
+            forgetCustomer(customerId) - drop every fingerprint of a customer
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = set()  # fingerprints with a create in flight
+        self.changed = threading.Condition(threading.Lock())  # signalled when a create finishes
+        try:
+            self.db = sqlite3.connect(path, check_same_thread=False)  # every use is serialized by self.lock
+            with self.db:
+                for statement in schema:
+                    self.db.execute(statement)
+        except sqlite3.Error as e:
+            raise WpStoreError(path + ": " + str(e))
+
+    def execute(self, sql, args=()):
+        ''' Run one statement under the lock, inside its own database transaction. Not intended for use outside of this class. '''
+        with self.lock:
+            try:
+                with self.db:
+                    return self.db.execute(sql, args).fetchall()
+            except sqlite3.Error as e:
+                raise WpStoreError(self.path + ": " + str(e))
+
+    def find(self, fingerprint):
+        rows = self.execute("SELECT customerId FROM fingerprints WHERE fingerprint = ?", (fingerprint,))
+        return rows[0][0] if rows else None
+
+    def findOrCreate(self, fingerprint, create):
+        ''' Return the customer with this fingerprint, calling create() to make it only if there isn't one.
+            Input:
+                fingerprint - from customerFingerprint(). None always calls create()
+                create - function that creates the customer and returns its customerId. Its exceptions are passed up
+            Output:
+                (customerId, created) - created is False if an existing customer was returned
+        '''
+        if fingerprint is None:
+            return create(), True
+
+        with self.changed:
+            while fingerprint in self.pending:  # the same customer is being created right now
+                self.changed.wait()
+            cid = self.find(fingerprint)
+            if cid is not None:
+                log.info("Customer %s already created. Fingerprint %s", cid, fingerprint)
+                return cid, False
+            self.pending.add(fingerprint)
+
+        try:
+            cid = create()
+            if cid:
+                self.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)", (fingerprint, str(cid), time.time()))
+        finally:
+            with self.changed:
+                self.pending.discard(fingerprint)
+                self.changed.notify_all()
+        return cid, True
+
+    def replace(self, customerId, fingerprint):
+        self.forgetCustomer(customerId)
+        if fingerprint is not None:
+            self.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)", (fingerprint, str(customerId), time.time()))
+
+    def forgetCustomer(self, customerId):
+        self.execute("DELETE FROM fingerprints WHERE customerId = ?", (str(customerId),))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+fingerprintIndex = None
+indexLock = threading.Lock()  # guards opening and closing fingerprintIndex
+
+
+def getFingerprintIndex():
+    ''' Return the index at WPTotal.fingerprintIndexFile, opening it on first use.
+        Output:
+            WpFingerprintIndex, or None if fingerprintIndexFile is None (deduplication is turned off)
+        Raises:
+            WpStoreError - the file could not be opened
+    '''
+    global fingerprintIndex
+    if fingerprintIndex is None and worldpay.fingerprintIndexFile:
+        with indexLock:
+            if fingerprintIndex is None:
+                fingerprintIndex = WpFingerprintIndex(worldpay.fingerprintIndexFile)
+    return fingerprintIndex
+
+
+def closeFingerprintIndex():
+    global fingerprintIndex
+    with indexLock:
+        if fingerprintIndex is not None:
+            fingerprintIndex.close()
+            fingerprintIndex = None
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+
+''' These are the functions used to load vault customers in bulk, such as when onboarding a merchant.
+
+    wpImportCustomers() streams customers and cards from a CSV or JSON lines file, builds a
+    CustomerAndPaymentRequest for each, and sends them with CreateCustomerAndPayment, at most maxWorkers
+    at a time. The source is read chunkSize rows at a time, so memory use does not grow with the file.
+
+    The job is resumable (see wpcheckpoint.py). Each row's outcome is appended to a results file as soon as
+    it is known, mapping the source row to the customerId and paymentMethodId the vault assigned. A
+    checkpoint is moved past each chunk once every row in it has finished. If the import stops for any
+    reason, running it again with the same files carries on from the checkpoint and skips any row the
+    results file already holds. Rows that failed are recorded with their error and are not retried. Fix
+    them and import them from a new file.
+
+    Source columns (CSV header names, or JSON keys) - all optional except as the gateway requires:
+        id - your own identifier for the row, copied to the results file
+        firstName, lastName, phoneNumber, emailAddress, company, notes, customerId
+        line1, city, state, zip, country - the customer's address
+        cardNumber, cvv, expirationDate - the card
+    Any other column is ignored.
+
+    Results file columns:
+        row, id, status ("created" or "failed"), customerId, paymentMethodId, message
+
+    Main Functions
+        wpImportCustomers - run or resume an import
+        readRecords - stream the rows of a CSV or JSON lines file as dictionaries
+        customerRequest - build the CustomerAndPaymentRequest for one row
+        createCustomer - create the customer and card of one row
+'''
+
+import csv
+import json
+import logging
+import time
+from itertools import islice
+
+from wptotal import wpTransact
+from wpbatch import wpRunBatch
+from wpcheckpoint import WpCheckpoint, WpResultsFile
+from wpauthobjects import Card, Address
+from wpvaultobjects import CustomerAndPaymentRequest
+from wpresponseobjects import CustomerAndPaymentResponseParameters
+from wpexceptions import WpBadResponseError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+customerColumns = ("firstName", "lastName", "phoneNumber", "emailAddress", "company", "notes", "customerId")
+addressColumns = ("line1", "city", "state", "zip", "country")
+cardColumns = {"cardNumber": "number", "cvv": "cvv", "expirationDate": "expirationDate"}
+resultColumns = ("row", "id", "status", "customerId", "paymentMethodId", "message")
+
+
+def readRecords(path):
+    ''' Yield each row of a source file as a dictionary. Files ending in .csv are read as CSV with a header row,
+        anything else as JSON lines (one object per line, blank lines skipped).
+    '''
+    with open(path, 'rU') as f:
+        if path.lower().endswith(".csv"):
+            for record in csv.DictReader(f):
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def customerRequest(record):
+    ''' Return a CustomerAndPaymentRequest built from one source row '''
+    cr = CustomerAndPaymentRequest()
+    for name in customerColumns:
+        if record.get(name):
+            setattr(cr, name, record[name])
+    cr.primary = True
+
+    if any(record.get(name) for name in addressColumns):
+        address = Address()
+        for name in addressColumns:
+            if record.get(name):
+                setattr(address, name, record[name])
+        address.company = cr.company
+        address.phone = cr.phoneNumber
+        cr.attachAddress(address)
+
+    if record.get("cardNumber"):
+        card = Card()
+        for column, name in cardColumns.iteritems():
+            if record.get(column):
+                setattr(card, name, str(record[column]).replace(" ", "") if column == "cardNumber" else record[column])
+        cr.attachCard(card)
+    return cr
+
+
+def createCustomer(row, record):
+    ''' Send CreateCustomerAndPayment for one source row.
+        Output:
+            (customerId, paymentMethodId) assigned by the vault
+        Raises:
+            WpBadResponseError - the gateway refused the customer
+            Exceptions raised by wpTransact()
+    '''
+    rp = CustomerAndPaymentResponseParameters(wpTransact("CreateCustomerAndPayment", customerRequest(record).serialize()))
+    if (rp.responseCode != 1):
+        raise WpBadResponseError("CreateCustomerAndPayment failed for row " + str(row) + ". Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + str(rp.message))
+    return rp.vaultCustomer.customerId, rp.vaultCustomer.primaryPaymentMethodId
+
+
+def importRow(row, record, results):
+    ''' Create one customer and record the outcome. Not intended for use outside of this module.
+        Output:
+            True if the customer was created
+    '''
+    result = {"row": row, "id": record.get("id")}
+    try:
+        cid, pid = createCustomer(row, record)
+        result.update(status="created", customerId=cid, paymentMethodId=pid)
+    except Exception as e:
+        result.update(status="failed", message=getattr(e, "message", None) or str(e))
+    try:
+        results.write(result)
+    except Exception as e:  # the customer exists, so say where it went before the import stops
+        log.error("Could not record row %s: %s. Result: %s", row, e, result)
+        raise
+    return result["status"] == "created"
+
+
+def wpImportCustomers(source, resultsPath, checkpointPath=None, chunkSize=100, maxWorkers=None):
+    ''' Import, or resume importing, vault customers and their cards.
+        Input:
+            source - CSV or JSON lines file of customers (see the module notes for its columns)
+            resultsPath - CSV file the outcome of every row is appended to
+            checkpointPath - file progress is saved to. Defaults to resultsPath + ".checkpoint"
+            chunkSize - rows read and sent per chunk. The checkpoint moves once per chunk
+            maxWorkers - most CreateCustomerAndPayment calls in flight at once. Defaults to WPTotal.batchWorkers
+        Output:
+            (created, failed, skipped) - counts for this run. skipped rows were already in the results file
+        Raises:
+            WpStoreError - the checkpoint or results file could not be read or written. The rows of the chunk
+                           that were recorded are skipped when the import is run again
+    '''
+    checkpoint = WpCheckpoint(checkpointPath or resultsPath + ".checkpoint")
+    if checkpoint.complete:
+        log.info("Import of %s is already complete", source)
+        return 0, 0, 0
+
+    results = WpResultsFile(resultsPath, resultColumns)
+    t = time.time()
+    created = failed = skipped = 0
+    position = checkpoint.position
+    records = islice(readRecords(source), position, None)
+    try:
+        while True:
+            chunk = list(islice(records, chunkSize))
+            if not chunk:
+                break
+            calls = []
+            for i, record in enumerate(chunk):
+                row = position + i + 1  # rows are numbered from 1, not counting a header
+                if row in results.done:
+                    skipped += 1
+                else:
+                    calls.append((importRow, (row, record, results)))
+            outcomes = wpRunBatch(calls, maxWorkers)
+            created += outcomes.count(True)
+            failed += outcomes.count(False)
+            errors = [e for e in outcomes if isinstance(e, Exception)]  # importRow only raises if its result wasn't recorded
+            if errors:
+                raise errors[0]  # leave the checkpoint where it is so a rerun looks at the chunk again
+            position += len(chunk)
+            checkpoint.save(position)
+            log.info("Import %s: %d rows done. %d created, %d failed this run", source, position, created, failed)
+        checkpoint.finish()
+    finally:
+        results.close()
+
+    log.info("Import %s complete: %d created, %d failed, %d skipped in %.2f seconds", source, created, failed, skipped, time.time() - t)
+    return created, failed, skipped
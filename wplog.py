@@ -0,0 +1,36 @@
+#!/usr/bin/python
+
+''' These are the helpers used to keep logging cheap when it is turned down.
+    The logging module only converts its arguments to strings if the message is actually emitted,
+    so passing lazyPformat(obj) instead of pformat(obj) means the pretty-printing is skipped entirely
+    unless the log level lets the message through.
+
+    Main Functions
+        lazyPformat - wrap an object so it is pretty-printed only if the log message is emitted
+    Main Classes
+        LazyPformat - the wrapper returned by lazyPformat
+
+    Example:
+        log.info(">>>Response>>> \\n%s", lazyPformat(rp, indent=1))
+'''
+
+from pprint import pformat
+
+
+class LazyPformat(object):
+    '''This holds an object and pretty-prints it when, and only if, it is converted to a string'''
+    __slots__ = ('obj', 'indent')
+
+    def __init__(self, obj, indent):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        return pformat(self.obj, indent=self.indent)
+
+    __repr__ = __str__
+
+
+def lazyPformat(obj, indent=1):
+    ''' Return a stand in for pformat(obj, indent) to pass as a log argument '''
+    return LazyPformat(obj, indent)
@@ -0,0 +1,383 @@
+#!/usr/bin/python
+
+''' These are the functions used to forecast the charges of recurring, installment, and variable payment plans
+    locally, without calling the gateway.
+
+    A plan is projected from its own definition: a RecurringPaymentPlan, InstallmentPaymentPlan, or
+    VariablePaymentPlan request object, or the plan dictionary from a response (such as
+    response["storedRecurringPaymentPlan"] from GetPaymentPlan). The response objects are not enough:
+    RecurringPaymentPlanRO has no amount and InstallmentPaymentPlanRO has no startDate, so passing one
+    raises WpInvalidFunctionCallError. VariablePaymentPlanRO can be used.
+
+    Plans whose active is False are not charged by the gateway and are left out, unless includeInactive
+    is set. The request objects default to active False, so set it on plans built locally.
+
+    wpProjectPlans() projects many plans at once with NumPy. The plans are read once to pull out their
+    schedules, then every occurrence of every plan is generated as whole array operations, so 100,000
+    plans over several years take seconds. It needs numpy, which is optional. planOccurrences() does the
+    same for one plan in plain Python.
+
+    Schedule rules:
+        cycleType - daily, weekly, biweekly, monthly, quarterly, semiannually, or annually (case, spaces,
+                    dashes and underscores are ignored)
+        frequency - charge every frequency cycles. 0 is taken as 1
+        dayOfTheWeek - weekly cycles: 1 (Sunday) to 7 (Saturday). 0 uses the weekday of the start date
+        dayOfTheMonth - monthly and longer cycles: 1 to 31, moved back to the last day of shorter months.
+                        0 uses the day of the start date
+        month - annual cycles: 1 to 12. Empty or 0 uses the month of the start date
+        startDate - the first charge is the first matching day on or after it
+        endDate - recurring plans: no charges after it. Empty runs forever
+        numberOfPayments - installment plans: the number of charges
+    Installment amounts are installmentAmount each, or (totalAmount - balloonAmount) / numberOfPayments
+    if installmentAmount is empty, with any remainder of the division added as remainderAmount. The
+    balloon and the remainder are added to the FIRST or LAST (the default) payment as the plan says.
+    Variable plans charge each of their scheduledPayments that isn't paid, on its scheduledDate
+    (paymentDate if there is no scheduledDate).
+
+    Main Functions
+        wpProjectPlans - every charge of many plans between two dates, as a NumPy structured array
+        wpForecast - count and total cents of projected charges per day, month, or year
+        planOccurrences - every charge of one plan between two dates, without numpy
+        planDate - read a gateway or request object date
+    Global Variables
+        projectionType - the NumPy dtype of the array returned by wpProjectPlans
+
+    Columns:
+        plan - index of the plan in the list passed in
+        planId - the plan's planId. 0 if it has none
+        date - day of the charge
+        amount - in cents
+        payment - number of the charge within its plan, counting from 1 at the plan's first charge
+
+    Example:
+        table = wpProjectPlans(plans, datetime.date(2018, 1, 1), datetime.date(2020, 12, 31))
+        byMonth = wpForecast(table, "M")  # {datetime.date(2018, 1, 1): (count, cents), ...}
+'''
+
+import datetime
+import logging
+
+from wpcolumns import cents
+from wpexceptions import WpConfigurationError, WpInvalidFunctionCallError
+
+try:
+    import numpy
+except ImportError:  # numpy is optional. Only wpProjectPlans() and wpForecast() need it
+    numpy = None
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+projectionType = [
+    ("plan", "i4"),
+    ("planId", "i8"),
+    ("date", "M8[D]"),
+    ("amount", "i8"),
+    ("payment", "i4"),
+]
+
+dayCycles = {"daily": 1, "weekly": 7, "biweekly": 14}  # cycle length in days
+monthCycles = {"monthly": 1, "quarterly": 3, "semiannually": 6, "annually": 12, "yearly": 12}  # cycle length in months
+
+epoch = datetime.date(1970, 1, 1)  # day 0, a Thursday
+lastDay = datetime.date(9999, 12, 31)
+
+
+def planDate(value):
+    ''' Return a date given as 'MM/DD/YYYY' (as in the request objects), 'YYYY-MM-DD...' (as in responses), or a date.
+        Empty values are None.
+    '''
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = value.strip()
+    if "/" in value:
+        month, day, year = value.split("/")
+        return datetime.date(int(year), int(month), int(day))
+    return datetime.date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+
+
+def field(plan, name):
+    ''' A field of a plan object or dictionary, or None. Not intended for use outside of this module. '''
+    if isinstance(plan, dict):
+        return plan.get(name)
+    return getattr(plan, name, None)
+
+
+def hasField(plan, name):
+    ''' Not intended for use outside of this module. '''
+    if isinstance(plan, dict):
+        return name in plan
+    try:
+        getattr(plan, name)
+    except AttributeError:
+        return False
+    return True
+
+
+def required(plan, name, i):
+    ''' A field a plan must have. Not intended for use outside of this module. '''
+    if not hasField(plan, name):
+        raise WpInvalidFunctionCallError("plan " + str(i) + " has no " + name + " field. Project the plan dictionary from the response, not " + type(plan).__name__)
+    return field(plan, name)
+
+
+def inactive(plan):
+    ''' Not intended for use outside of this module. '''
+    return field(plan, "active") is False
+
+
+def cycle(plan, i):
+    ''' Return (days, months) of one cycle of a plan. One of them is 0. Not intended for use outside of this module. '''
+    name = (field(plan, "cycleType") or "").lower()
+    for c in " -_":
+        name = name.replace(c, "")
+    if name in dayCycles:
+        return dayCycles[name], 0
+    if name in monthCycles:
+        return 0, monthCycles[name]
+    raise WpInvalidFunctionCallError("plan " + str(i) + " has unknown cycleType " + repr(field(plan, "cycleType")))
+
+
+def installmentAmounts(plan):
+    ''' Return (installment, first extra, last extra) in cents. Not intended for use outside of this module. '''
+    n = int(field(plan, "numberOfPayments") or 0)
+    installment = cents(field(plan, "installmentAmount") or 0)
+    total = cents(field(plan, "totalAmount") or 0)
+    balloon = cents(field(plan, "balloonAmount") or 0)
+    remainder = cents(field(plan, "remainderAmount") or 0)
+    if not installment and total and n:
+        installment = (total - balloon) // n
+        remainder = remainder or total - balloon - installment * n
+    extras = {"FIRST": 0, "LAST": 0}
+    extras["FIRST" if (field(plan, "balloonPaymentAddedTo") or "").upper() == "FIRST" else "LAST"] += balloon
+    addedTo = field(plan, "remainderPaymentAddedTo") or field(plan, "remainderAmountAddedTo") or ""  # the response object uses the second name
+    extras["FIRST" if addedTo.upper() == "FIRST" else "LAST"] += remainder
+    return installment, extras["FIRST"], extras["LAST"]
+
+
+def schedule(plan, i):
+    ''' Pull out what projecting a recurring or installment plan needs. Not intended for use outside of this module.
+        Output:
+            dictionary of days, months, frequency, weekday, day, month, start, end, count, amount, first, last
+    '''
+    start = planDate(required(plan, "startDate", i))
+    if start is None:
+        raise WpInvalidFunctionCallError("plan " + str(i) + " has no startDate")
+    days, months = cycle(plan, i)
+    s = {"days": days, "months": months, "frequency": int(field(plan, "frequency") or 0) or 1,
+         "weekday": int(field(plan, "dayOfTheWeek") or 0), "day": int(field(plan, "dayOfTheMonth") or 0) or start.day,
+         "month": int(field(plan, "month") or 0), "start": start, "end": planDate(field(plan, "endDate")) or lastDay}
+    if hasField(plan, "numberOfPayments"):
+        s["count"] = int(field(plan, "numberOfPayments") or 0)
+        s["amount"], s["first"], s["last"] = installmentAmounts(plan)
+    else:
+        s["count"] = -1  # no limit
+        s["amount"], s["first"], s["last"] = cents(required(plan, "amount", i) or 0), 0, 0
+    return s
+
+
+def monthIndex(d):
+    ''' Months since January 1970. Not intended for use outside of this module. '''
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def firstMonth(s):
+    ''' Month index of the first cycle of a monthly or longer plan. Not intended for use outside of this module. '''
+    m = monthIndex(s["start"])
+    if s["months"] == 12 and 1 <= s["month"] <= 12:
+        m += (s["month"] - 1 - m % 12) % 12  # the first of the plan's months on or after the start
+    return m
+
+
+def firstDay(s):
+    ''' Day of the first charge of a daily or weekly plan. Not intended for use outside of this module. '''
+    start = s["start"]
+    if s["days"] == 1 or not 1 <= s["weekday"] <= 7:
+        return start
+    return start + datetime.timedelta((s["weekday"] - 1 - start.isoweekday() % 7) % 7)  # isoweekday() % 7 is 0 for Sunday
+
+
+def monthDay(m, day):
+    ''' The given day of month index m, moved back to the last day of short months. Not intended for use outside of this module. '''
+    year, month = 1970 + m // 12, m % 12 + 1
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return datetime.date(year, month, min(day, (following - datetime.timedelta(1)).day))
+
+
+def variableCharges(plan):
+    ''' Yield (date, cents, payment) of the unpaid scheduled payments of a variable plan. Not intended for use outside of this module. '''
+    for n, payment in enumerate(field(plan, "scheduledPayments") or []):
+        if field(payment, "paid"):
+            continue
+        day = planDate(field(payment, "scheduledDate") or field(payment, "paymentDate"))
+        if day is not None:
+            yield day, cents(field(payment, "amount") or 0), n + 1
+
+
+def planOccurrences(plan, start, end, i=0, includeInactive=False):
+    ''' Return every charge of one plan between two dates, without numpy.
+        Input:
+            plan - request object or response dictionary of a recurring, installment, or variable plan
+            start, end - first and last day to include (dates or 'MM/DD/YYYY')
+            i - position of the plan, used in error messages
+            includeInactive - project the plan even if its active is False
+        Output:
+            list of (date, cents, payment) in date order. Empty for an inactive plan
+        Raises:
+            WpInvalidFunctionCallError - the plan has no startDate or amount field, or an unknown cycleType
+    '''
+    start, end = planDate(start), planDate(end)
+    if inactive(plan) and not includeInactive:
+        return []
+    if hasField(plan, "scheduledPayments"):
+        return sorted(c for c in variableCharges(plan) if start <= c[0] <= end)
+
+    s = schedule(plan, i)
+    last = min(end, s["end"])
+    charges = []
+    k = 0
+    payment = 1
+    while s["count"] < 0 or payment <= s["count"]:
+        if s["days"]:
+            day = firstDay(s) + datetime.timedelta(k * s["days"] * s["frequency"])
+        else:
+            day = monthDay(firstMonth(s) + k * s["months"] * s["frequency"], s["day"])
+        k += 1
+        if day > last:
+            break
+        if day < s["start"]:  # the first cycle's day fell before the plan started
+            continue
+        if day >= start:
+            amount = s["amount"] + (s["first"] if payment == 1 else 0) + (s["last"] if payment == s["count"] else 0)
+            charges.append((day, amount, payment))
+        payment += 1
+    return charges
+
+
+def dayMonths(days):
+    ''' Month index of each day since 1970-01-01. Not intended for use outside of this module. '''
+    return days.astype("M8[D]").astype("M8[M]").astype("i8")
+
+
+def chargeDays(months, day):
+    ''' Day since 1970-01-01 of the given day of each month index, moved back to the last day of short months.
+        Not intended for use outside of this module.
+    '''
+    first = months.astype("M8[M]").astype("M8[D]").astype("i8")
+    length = (months + 1).astype("M8[M]").astype("M8[D]").astype("i8") - first
+    return first + numpy.minimum(day, length) - 1
+
+
+def wpProjectPlans(plans, start=None, end=None, includeInactive=False):
+    ''' Project every charge of many plans.
+        Input:
+            plans - list of request objects or response dictionaries of recurring, installment, and variable plans
+            start - first day to include (a date or 'MM/DD/YYYY'). Defaults to today
+            end - last day to include. Defaults to a year after start
+            includeInactive - also project plans whose active is False
+        Output:
+            numpy array of dtype projectionType, one row per charge, in date order
+        Raises:
+            WpConfigurationError - numpy is not installed
+            WpInvalidFunctionCallError - a plan has no startDate or amount field, or an unknown cycleType
+    '''
+    if numpy is None:
+        raise WpConfigurationError("wpProjectPlans needs numpy. Use planOccurrences instead")
+
+    start = planDate(start) or datetime.date.today()
+    end = planDate(end) or start + datetime.timedelta(365)
+    windowStart = (start - epoch).days
+
+    # 1. Read each plan once. Variable plans are explicit lists of charges already
+    columns = dict((name, []) for name in ("index", "planId", "days", "months", "frequency", "day", "first",
+                                           "start", "end", "count", "amount", "firstExtra", "lastExtra"))
+    explicit = []
+    for i, plan in enumerate(plans):
+        if inactive(plan) and not includeInactive:
+            continue
+        planId = int(field(plan, "planId") or 0)
+        if hasField(plan, "scheduledPayments"):
+            explicit.extend((i, planId, (day - epoch).days, amount, payment) for day, amount, payment in variableCharges(plan)
+                            if start <= day <= end)
+            continue
+        s = schedule(plan, i)
+        columns["index"].append(i)
+        columns["planId"].append(planId)
+        columns["days"].append(s["days"])
+        columns["months"].append(s["months"])
+        columns["frequency"].append(s["frequency"])
+        columns["day"].append(s["day"])
+        columns["first"].append((firstDay(s) - epoch).days if s["days"] else firstMonth(s))
+        columns["start"].append((s["start"] - epoch).days)
+        columns["end"].append((min(s["end"], end) - epoch).days)
+        columns["count"].append(s["count"])
+        columns["amount"].append(s["amount"])
+        columns["firstExtra"].append(s["first"])
+        columns["lastExtra"].append(s["last"])
+    c = dict((name, numpy.array(values, dtype="i8")) for name, values in columns.iteritems())
+
+    # 2. For each plan, the day of its first cycle and whether that day fell before the plan started
+    step = c["frequency"] * numpy.where(c["days"] > 0, c["days"], c["months"])
+    monthly = c["months"] > 0
+    firstCharge = numpy.where(monthly, chargeDays(c["first"], c["day"]), c["first"])
+    skipped = (firstCharge < c["start"]).astype("i8")  # only possible for monthly plans. That cycle is not a payment
+
+    # 3. The range of cycles k that can fall in the window, by day for daily plans and by month for monthly ones
+    low = numpy.maximum(c["start"], windowStart)
+    high = c["end"]
+    lowUnit = numpy.where(monthly, dayMonths(low), low)
+    highUnit = numpy.where(monthly, dayMonths(high), high)
+    kFirst = numpy.maximum(0, numpy.floor_divide(lowUnit - c["first"], step))
+    kLast = numpy.floor_divide(highUnit - c["first"], step)
+    limited = c["count"] >= 0
+    kLast = numpy.where(limited, numpy.minimum(kLast, c["count"] - 1 + skipped), kLast)
+    counts = numpy.maximum(0, kLast - kFirst + 1)
+
+    # 4. One row per cycle of every plan, then the day of each
+    total = int(counts.sum())
+    p = numpy.repeat(numpy.arange(len(counts)), counts)
+    k = kFirst[p] + numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    unit = c["first"][p] + k * step[p]
+    isMonthly = monthly[p]
+    days = numpy.where(isMonthly, chargeDays(numpy.where(isMonthly, unit, 0), c["day"][p]), unit)
+    payment = k + 1 - skipped[p]
+    keep = (days >= low[p]) & (days <= high[p]) & (payment >= 1)
+    p, days, payment = p[keep], days[keep], payment[keep]
+    amount = c["amount"][p] + numpy.where(payment == 1, c["firstExtra"][p], 0) + numpy.where(payment == c["count"][p], c["lastExtra"][p], 0)
+
+    index, planId = c["index"][p], c["planId"][p]
+    if explicit:
+        e = numpy.array(explicit, dtype="i8")
+        index, planId, days, amount, payment = [numpy.concatenate((a, e[:, j])) for j, a in enumerate((index, planId, days, amount, payment))]
+
+    order = numpy.argsort(days * max(len(plans), 1) + index)  # by date, then plan, as one key. Far faster than sorting the structured array
+    table = numpy.empty(len(order), dtype=projectionType)
+    table["plan"] = index[order]
+    table["planId"] = planId[order]
+    table["date"] = days[order].astype("M8[D]")
+    table["amount"] = amount[order]
+    table["payment"] = payment[order]
+    log.info("Projected %d charges of %d plans from %s to %s", len(table), len(plans), start, end)
+    return table
+
+
+def wpForecast(table, period="M"):
+    ''' Count and total the projected charges per period.
+        Input:
+            table - array from wpProjectPlans()
+            period - "D" (day), "M" (month), or "Y" (year)
+        Output:
+            dictionary of the first day of each period (datetime.date) to (count, total cents)
+        Raises:
+            WpConfigurationError - numpy is not installed
+    '''
+    if numpy is None:
+        raise WpConfigurationError("wpForecast needs numpy")
+
+    keys, index = numpy.unique(table["date"].astype("M8[" + period + "]"), return_inverse=True)
+    counts = numpy.bincount(index, minlength=len(keys))
+    sums = numpy.bincount(index, weights=table["amount"], minlength=len(keys))  # float64 is exact for totals under 2**53 cents
+    return dict((k, (int(c), int(round(t)))) for k, c, t in zip(keys.astype("M8[D]").tolist(), counts, sums))
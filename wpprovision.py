@@ -0,0 +1,337 @@
+#!/usr/bin/python
+
+''' These are the functions used to set up vault customers and their payment plans in bulk, such as when
+    migrating subscriptions from another processor.
+
+    Each source row is one customer with a card and one recurring or installment plan. Provisioning a row
+    takes two calls, CreateCustomerAndPayment and then CreateRecurringPaymentPlan (or
+    CreateInstallmentPaymentPlan) for the customer and card it returned, as in snap.enactFullScript. The
+    two stages run as a pipeline, each with its own workers: as soon as a row's customer exists, its plan
+    is queued for the plan workers while the customer workers carry on with the next rows.
+
+    The job is resumable in the same way as wpimport.py (see wpcheckpoint.py). The source is read chunkSize
+    rows at a time and the checkpoint moves past a chunk once every row in it has finished both stages.
+    Each row's progress is appended to a results file as it happens: a "customer" line with the customerId
+    and paymentMethodId once the customer is created, then a "created" line that adds the planId, or a
+    "failed" line with the error. Running again with the same files carries on from the checkpoint.
+
+    A customer is never created twice. If a plan call times out, can't connect, or finds the circuit open,
+    the row is left at "customer". If the gateway refuses the plan, the row is "failed" with its customerId.
+    Either way the checkpoint stays before that row, and the next run with the same files only creates
+    its plan, for the customer already made. To fix a refused plan, correct its plan columns in the source
+    and run again. Rows that are "created" are skipped. Rows that failed before their customer was created
+    are not retried. Fix them and provision them from a new file.
+
+    A create plan call is not safe to repeat: one that timed out may still have gone through. So before
+    a resumed row's plan is sent, the customer's plans are read back with GetCustomer and compared with
+    the row (see existingPlans). If exactly one matches, the row is recorded as "created" with its planId
+    and nothing is sent. If none match, the plan is created. If more than one matches, the row is recorded
+    as "unknown" and later runs skip it. Check that customer's plans in the vault and remove any duplicate.
+
+    Source columns (CSV header names, or JSON keys):
+        the customer and card columns of wpimport.py (id, firstName, lastName, ..., cardNumber, cvv, expirationDate)
+        planType - "recurring" (the default) or "installment"
+        cycleType, frequency, dayOfTheMonth, dayOfTheWeek, month, startDate - the schedule
+        amount, endDate, maxRetries - recurring plans
+        numberOfPayments, installmentAmount, totalAmount, balloonAmount, balloonPaymentAddedTo,
+            remainderAmount, remainderPaymentAddedTo - installment plans
+        planNotes - the plan's notes (notes is the customer's)
+        active - the plan is created inactive if this is 0, false, or no
+    Any other column is ignored. A row's plan is checked before its customer is created, so a row with an
+    unknown planType or a number that won't parse fails without creating anything.
+
+    Results file columns:
+        row, id, status ("customer", "created", "failed", or "unknown"), customerId, paymentMethodId, planId, message
+
+    Main Functions
+        wpProvisionPlans - run or resume provisioning
+        planRequest - build the plan request for one row
+        createPlan - create the plan of one row for a customer
+        existingPlans - planIds of a customer's plans that match a row
+'''
+
+import logging
+import threading
+import time
+from itertools import islice
+
+from wptotal import worldpay, wpTransact
+from wpvaultcache import vaultCache
+from wpprojection import planDate
+from wpasync import WpWorkerPool
+from wpcheckpoint import WpCheckpoint, WpResultsFile
+from wpimport import readRecords, createCustomer
+from wprecurringobjects import RecurringPaymentPlan, RecurringPaymentPlanRequest, InstallmentPaymentPlan, InstallmentPaymentPlanRequest
+from wpresponseobjects import RecurringPaymentPlanResponseParameters, InstallmentPaymentPlanResponseParameters
+from wpretry import retryableErrors
+from wpexceptions import WpBadResponseError, WpCircuitOpenError, WpInvalidFunctionCallError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+transientErrors = retryableErrors + (WpCircuitOpenError,)  # the plan may go through on the next run
+planTypes = {  # planType: (plan class, request class, operation, response class)
+    "recurring": (RecurringPaymentPlan, RecurringPaymentPlanRequest, "CreateRecurringPaymentPlan", RecurringPaymentPlanResponseParameters),
+    "installment": (InstallmentPaymentPlan, InstallmentPaymentPlanRequest, "CreateInstallmentPaymentPlan", InstallmentPaymentPlanResponseParameters),
+}
+intColumns = ("frequency", "dayOfTheMonth", "dayOfTheWeek", "month", "maxRetries", "numberOfPayments")
+floatColumns = ("amount", "installmentAmount", "totalAmount", "balloonAmount", "remainderAmount")
+textColumns = ("cycleType", "startDate", "endDate", "balloonPaymentAddedTo", "remainderPaymentAddedTo")
+resultColumns = ("row", "id", "status", "customerId", "paymentMethodId", "planId", "message")
+planLists = {"recurring": "recurringPaymentPlans", "installment": "installmentPaymentPlans"}  # where GetCustomer lists each type
+dateFields = ("startDate", "endDate")
+
+
+def planType(record):
+    ''' Return the planTypes entry of a row. Not intended for use outside of this module. '''
+    name = (record.get("planType") or "recurring").strip().lower()
+    if name not in planTypes:
+        raise WpInvalidFunctionCallError("unknown planType " + record.get("planType"))
+    return planTypes[name]
+
+
+def planRequest(record, cid, pid):
+    ''' Return the RecurringPaymentPlanRequest or InstallmentPaymentPlanRequest for one source row.
+        Input:
+            record - dictionary of source columns
+            cid, pid - the customer and the payment method the plan charges
+        Raises:
+            WpInvalidFunctionCallError - unknown planType
+            ValueError - a number column doesn't parse
+    '''
+    planClass, requestClass = planType(record)[:2]
+    plan = planClass()
+    for names, convert in ((intColumns, int), (floatColumns, float), (textColumns, None)):
+        for name in names:
+            value = record.get(name)
+            if value not in (None, "") and name in planClass.__slots__:
+                setattr(plan, name, convert(value) if convert else value)
+    if record.get("planNotes"):
+        plan.notes = record["planNotes"]
+    plan.active = str(record.get("active", "")).strip().lower() not in ("0", "false", "no")
+    plan.primaryPaymentMethodId = pid
+
+    request = requestClass()
+    request.customerId = cid
+    request.attachPlan(plan)
+    return request
+
+
+def createPlan(row, record, cid, pid):
+    ''' Send the create plan call for one source row.
+        Output:
+            planId assigned by the gateway
+        Raises:
+            WpBadResponseError - the gateway refused the plan
+            Exceptions raised by planRequest() and wpTransact()
+    '''
+    operation, responseClass = planType(record)[2:]
+    try:
+        rp = responseClass(wpTransact(operation, planRequest(record, cid, pid).serialize(), cid))
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
+    if (rp.responseCode != 1):
+        raise WpBadResponseError(operation + " failed for row " + str(row) + ". Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + str(rp.message))
+    return rp.planId
+
+
+def sameValue(name, wanted, found):
+    ''' True if a plan field read back from the vault agrees with the one the row asks for. Not intended for use outside of this module. '''
+    if name in dateFields:
+        return planDate(wanted) == planDate(found)
+    if isinstance(wanted, bool) or isinstance(found, bool):
+        return bool(wanted) == bool(found)
+    if isinstance(wanted, (int, long, float)):
+        try:
+            return abs(float(wanted) - float(found)) < 0.005
+        except (TypeError, ValueError):
+            return False
+    return unicode(wanted).strip().lower() == unicode(found).strip().lower()
+
+
+def existingPlans(row, record, cid, pid):
+    ''' Read a customer's plans back from the gateway and return those that match a source row.
+        A plan matches if every field the row sets agrees with the plan's own value, where the vault
+        reports one. Fields the vault leaves out are not compared, so a match errs towards "already there".
+        Output:
+            list of planIds
+        Raises:
+            WpBadResponseError - GetCustomer failed
+            Exceptions raised by planRequest() and wpTransact()
+    '''
+    wanted = planRequest(record, cid, pid).plan
+    wanted["active"] = wanted.get("active", False)  # serialize() leaves False out
+    response = wpTransact("GetCustomer", "", cid)  # not through the vault cache, which may predate the plan
+    if response.get("responseCode") != 1:
+        raise WpBadResponseError("GetCustomer failed for row " + str(row) + ". Result: " + str(response.get("result")) + " Response Code: " + str(response.get("responseCode")) + " Message: " + str(response.get("message")))
+    name = (record.get("planType") or "recurring").strip().lower()
+    plans = (response.get("vaultCustomer") or {}).get(planLists[name]) or []
+    return [plan.get("planId") for plan in plans
+            if plan.get("planId") and all(plan.get(k) is None or sameValue(k, v, plan[k]) for k, v in wanted.iteritems() if k != "userDefinedFields")]
+
+
+class Pipeline(object):
+    '''This runs the customer and plan stages of each row on their own workers and counts the rows still in them.
+        Not intended for use outside of this module.
+    '''
+
+    def __init__(self, results, customerWorkers, planWorkers):
+        self.results = results
+        self.customers = WpWorkerPool(customerWorkers)
+        self.plans = WpWorkerPool(planWorkers)
+        self.finished = threading.Condition(threading.Lock())
+        self.inFlight = 0
+        self.created = 0
+        self.failed = 0
+        self.pending = 0  # rows whose customer exists but whose plan does not. The next run creates their plans
+        self.errors = []  # results that could not be written
+
+    def start(self, row, record, previous=None):
+        ''' Provision a row. previous is its last line in the results file, if any '''
+        with self.finished:
+            self.inFlight += 1
+        if previous and previous.get("customerId"):  # an earlier run created the customer, and may have created the plan
+            self.plans.submit(self.resumeStage, row, record, previous["customerId"], previous.get("paymentMethodId"))
+        else:
+            self.customers.submit(self.customerStage, row, record)
+
+    def customerStage(self, row, record):
+        result = {"row": row, "id": record.get("id")}
+        try:
+            planRequest(record, "", "")  # refuse a bad plan before creating its customer
+            cid, pid = createCustomer(row, record)
+        except Exception as e:
+            self.finish(result, e)
+            return
+        result.update(status="customer", customerId=cid, paymentMethodId=pid)
+        self.record(result)  # from here on a resumed run only creates the plan
+        self.plans.submit(self.planStage, row, record, cid, pid)  # the customer exists even if it couldn't be recorded
+
+    def resumeStage(self, row, record, cid, pid):
+        ''' Create the plan of a row an earlier run left without one, unless the earlier call went through after all '''
+        result = {"row": row, "id": record.get("id"), "customerId": cid, "paymentMethodId": pid}
+        try:
+            found = existingPlans(row, record, cid, pid)
+        except transientErrors as e:
+            log.warning("Plans of row %s not read, will be retried: %s", row, e)
+            self.finish(result, e, transient=True)
+            return
+        except Exception as e:
+            self.finish(result, e)
+            return
+        if len(found) == 1:
+            log.info("Row %s already has plan %s", row, found[0])
+            result.update(status="created", planId=found[0], message="plan found on the customer")
+            self.finish(result)
+        elif found:
+            self.finish(result, "plans " + ", ".join(str(p) for p in found) + " on the customer all match this row. Remove the duplicates in the vault", unknown=True)
+        else:
+            self.planStage(row, record, cid, pid)
+
+    def planStage(self, row, record, cid, pid):
+        result = {"row": row, "id": record.get("id"), "customerId": cid, "paymentMethodId": pid}
+        try:
+            result.update(status="created", planId=createPlan(row, record, cid, pid))
+        except transientErrors as e:  # leave the row at "customer" for the next run
+            log.warning("Plan for row %s not created, will be retried: %s", row, e)
+            self.finish(result, e, transient=True)
+            return
+        except Exception as e:
+            self.finish(result, e)
+            return
+        self.finish(result)
+
+    def record(self, result):
+        ''' Append a result, keeping any error for wpProvisionPlans to raise. Not intended for use outside of this class. '''
+        try:
+            self.results.write(result)
+        except Exception as e:
+            log.error("Could not record row %s: %s", result["row"], e)
+            self.errors.append(e)
+
+    def finish(self, result, error=None, transient=False, unknown=False):
+        ''' Record how a row ended. error is an exception or message. A transient failure isn't recorded, so the row
+            stays at "customer". An unknown one is recorded as "unknown" and left for the operator.
+        '''
+        try:
+            if error is not None:
+                result.update(status="unknown" if unknown else "failed", message=getattr(error, "message", None) or str(error))
+            if not transient:
+                self.record(result)
+        finally:
+            with self.finished:
+                if error is None:
+                    self.created += 1
+                else:
+                    self.failed += 1
+                    if result.get("customerId") and not unknown:
+                        self.pending += 1
+                self.inFlight -= 1
+                self.finished.notify_all()
+
+    def wait(self):
+        ''' Block until every row started has finished both stages '''
+        with self.finished:
+            while self.inFlight:
+                self.finished.wait()
+
+    def close(self):
+        self.customers.shutdown()
+        self.plans.shutdown()
+
+
+def wpProvisionPlans(source, resultsPath, checkpointPath=None, chunkSize=100, customerWorkers=None, planWorkers=None):
+    ''' Create, or resume creating, vault customers and a payment plan for each.
+        Input:
+            source - CSV or JSON lines file of customers and plans (see the module notes for its columns)
+            resultsPath - CSV file the progress of every row is appended to
+            checkpointPath - file progress is saved to. Defaults to resultsPath + ".checkpoint"
+            chunkSize - rows read per chunk. The checkpoint moves once per chunk
+            customerWorkers - most CreateCustomerAndPayment calls in flight at once. Defaults to WPTotal.batchWorkers
+            planWorkers - most create plan calls in flight at once. Defaults to WPTotal.batchWorkers
+        Output:
+            (created, failed, skipped, pending) - counts for this run. skipped rows were already finished in the
+            results file. pending rows have a customer but no plan yet (they are also counted in failed); run
+            again to create their plans. Rows found to have more than one matching plan are "unknown" and
+            counted in failed
+        Raises:
+            WpStoreError - the checkpoint or results file could not be read or written
+    '''
+    checkpoint = WpCheckpoint(checkpointPath or resultsPath + ".checkpoint")
+    if checkpoint.complete:
+        log.info("Provisioning of %s is already complete", source)
+        return 0, 0, 0, 0
+
+    results = WpResultsFile(resultsPath, resultColumns)
+    pipeline = Pipeline(results, customerWorkers or worldpay.batchWorkers, planWorkers or worldpay.batchWorkers)
+    t = time.time()
+    skipped = 0
+    position = checkpoint.position
+    records = islice(readRecords(source), position, None)
+    try:
+        while True:
+            chunk = list(islice(records, chunkSize))
+            if not chunk:
+                break
+            for i, record in enumerate(chunk):
+                row = position + i + 1  # rows are numbered from 1, not counting a header
+                previous = results.done.get(row)
+                status = previous and previous.get("status")
+                if status in ("created", "unknown") or (status == "failed" and not previous.get("customerId")):
+                    skipped += 1
+                else:
+                    pipeline.start(row, record, previous)
+            pipeline.wait()
+            if pipeline.errors:
+                raise pipeline.errors[0]  # leave the checkpoint where it is so the chunk is looked at again
+            position += len(chunk)
+            if not pipeline.pending:  # the next run must come back to any row still waiting for its plan
+                checkpoint.save(position)
+            log.info("Provision %s: %d rows done. %d created, %d failed, %d waiting for a plan this run", source, position, pipeline.created, pipeline.failed, pipeline.pending)
+        if not pipeline.pending:
+            checkpoint.finish()
+    finally:
+        pipeline.close()
+        results.close()
+
+    log.info("Provision %s complete: %d created, %d failed, %d skipped, %d waiting for a plan in %.2f seconds", source, pipeline.created, pipeline.failed, skipped, pipeline.pending, time.time() - t)
+    return pipeline.created, pipeline.failed, skipped, pipeline.pending
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+
+''' These are the functions used to reconcile a settlement batch against our own ledger.
+
+    The batch comes from doGetBatch or doGetBatchById (a BatchResponseParameters, or just its transactions).
+    The ledger is a CSV file or a SQLite table. Both sides are turned into columns first: the batch through
+    wpColumns(), which never builds Transaction objects, and the ledger with one pass of the csv reader or
+    one query. They are then matched with a hash join on transactionId or orderId: the ledger is indexed in
+    a dictionary once and each batch row is a single lookup. Amounts are compared and totalled as integer
+    cents, so a 100,000 transaction batch reconciles in well under a second and no rounding can hide a difference.
+
+    Every row falls into one of:
+        matched - in both, same amount
+        mismatched - in both, different amount
+        missing - in the ledger but not in the batch
+        extra - in the batch but not in the ledger
+        unkeyed - has no value in the key column, on either side. These are never matched
+    A key that appears more than once in the ledger is listed in duplicates. Its first row is the one matched.
+
+    Main Functions
+        wpReconcile - reconcile a batch against a ledger
+        readLedger - read a ledger from a .csv file or a SQLite database
+        readLedgerCSV / readLedgerSQLite - the two kinds of ledger
+    Main Classes
+        WpReconciliation - the result
+
+    Example:
+        result = wpReconcile(rp, readLedger("ledger.csv"))
+        if not result.balanced():
+            print result.summary()
+'''
+
+import csv
+import logging
+import sqlite3
+import time
+
+from wpcolumns import wpColumns, cents
+from wpresponseobjects import BatchResponseParameters
+from wpexceptions import WpInvalidFunctionCallError, WpStoreError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+ledgerQuery = "SELECT transactionId, orderId, amount FROM ledger"  # default query for a SQLite ledger
+
+
+def readLedgerCSV(path, idColumn="transactionId", orderColumn="orderId", amountColumn="amount"):
+    ''' Read a ledger from a CSV file whose first row holds the column names.
+        Input:
+            path - the CSV file
+            idColumn, orderColumn, amountColumn - names of the columns holding the transaction id, order id,
+                and amount in dollars. The order column may be missing from the file
+        Output:
+            ledger columns: dictionary of "transactionId", "orderId" and "amount" (cents) lists
+        Raises:
+            WpInvalidFunctionCallError - the file has no id or amount column
+    '''
+    ledger = {"transactionId": [], "orderId": [], "amount": []}
+    with open(path, 'rU') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if idColumn not in header or amountColumn not in header:
+            raise WpInvalidFunctionCallError("ledger " + path + " needs " + idColumn + " and " + amountColumn + " columns")
+        i = header.index(idColumn)
+        a = header.index(amountColumn)
+        o = header.index(orderColumn) if orderColumn in header else None
+        for row in reader:
+            if not row:
+                continue
+            ledger["transactionId"].append(row[i])
+            ledger["orderId"].append(row[o] if o is not None else None)
+            ledger["amount"].append(cents(row[a] or None))
+    return ledger
+
+
+def readLedgerSQLite(path, query=ledgerQuery, args=()):
+    ''' Read a ledger from a SQLite database.
+        Input:
+            path - the database file
+            query - SELECT returning transactionId, orderId, amount (dollars) in that order
+            args - parameters for the query, such as a batch id
+        Output:
+            ledger columns, as for readLedgerCSV()
+        Raises:
+            WpStoreError - the database could not be read
+    '''
+    try:
+        db = sqlite3.connect(path)
+        try:
+            rows = db.execute(query, args).fetchall()
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        raise WpStoreError(path + ": " + str(e))
+    return {"transactionId": [r[0] for r in rows], "orderId": [r[1] for r in rows], "amount": [cents(r[2]) for r in rows]}
+
+
+def readLedger(path, **kwargs):
+    ''' Read a ledger, choosing the reader by file extension: .csv for CSV, anything else for SQLite.
+        Keyword arguments are passed on to the reader.
+    '''
+    if path.lower().endswith(".csv"):
+        return readLedgerCSV(path, **kwargs)
+    return readLedgerSQLite(path, **kwargs)
+
+
+def joinKey(value):
+    ''' Return the unicode string the join compares, so 1234 from the gateway matches "1234" from a CSV, and UTF-8 bytes
+        from a CSV match the same text decoded from JSON or SQLite. Not intended for use outside of this module.
+    '''
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    return unicode(value)
+
+
+class WpReconciliation(object):
+    '''This is the result of a reconciliation. Amounts are integer cents.
+        Attributes:
+            key - the column that was joined on
+            matched - number of rows in both with the same amount
+            mismatched - list of (key, ledger cents, batch cents)
+            missing - list of (key, cents) in the ledger but not in the batch
+            extra - list of (key, cents) in the batch but not in the ledger
+            duplicates - list of keys found more than once in the ledger
+            unkeyed - list of ("ledger" or "batch", cents) for rows with an empty key column
+            batchTotal, ledgerTotal - total of every row on each side
+            matchedTotal - total of the matched rows
+        Methods:
+            balanced() - True if nothing was flagged and the totals agree
+            summary() - one line per flagged row, after a line of counts
+    '''
+
+    def __init__(self, key):
+        self.key = key
+        self.matched = 0
+        self.mismatched = []
+        self.missing = []
+        self.extra = []
+        self.duplicates = []
+        self.unkeyed = []
+        self.batchTotal = 0
+        self.ledgerTotal = 0
+        self.matchedTotal = 0
+
+    def balanced(self):
+        return not (self.mismatched or self.missing or self.extra or self.duplicates or self.unkeyed) and self.batchTotal == self.ledgerTotal
+
+    def summary(self):
+        lines = ["Reconciled on %s: %d matched, %d mismatched, %d missing, %d extra, %d duplicated, %d unkeyed. Batch $%.2f Ledger $%.2f" % (
+            self.key, self.matched, len(self.mismatched), len(self.missing), len(self.extra), len(self.duplicates),
+            len(self.unkeyed), self.batchTotal / 100.0, self.ledgerTotal / 100.0)]
+        for k, ledgerCents, batchCents in self.mismatched:
+            lines.append("  mismatched %s: ledger $%.2f batch $%.2f" % (k, ledgerCents / 100.0, batchCents / 100.0))
+        for k, amount in self.missing:
+            lines.append("  missing %s: $%.2f" % (k, amount / 100.0))
+        for k, amount in self.extra:
+            lines.append("  extra %s: $%.2f" % (k, amount / 100.0))
+        for k in self.duplicates:
+            lines.append("  duplicated in ledger %s" % k)
+        for side, amount in self.unkeyed:
+            lines.append("  no %s in %s: $%.2f" % (self.key, side, amount / 100.0))
+        return "\n".join(lines)
+
+
+def wpReconcile(batch, ledger, key="transactionId"):
+    ''' Reconcile a settlement batch against a ledger.
+        Input:
+            batch - BatchResponseParameters, or its transactions (see wpColumns for what is accepted)
+            ledger - ledger columns from readLedger(), readLedgerCSV(), or readLedgerSQLite()
+            key - "transactionId" or "orderId"
+        Output:
+            WpReconciliation
+        Raises:
+            WpInvalidFunctionCallError - key is not one of the two join columns
+    '''
+    if key not in ("transactionId", "orderId"):
+        raise WpInvalidFunctionCallError("wpReconcile key must be transactionId or orderId, not " + str(key))
+
+    t = time.time()
+    transactions = batch.transactions if isinstance(batch, BatchResponseParameters) else batch
+    columns = wpColumns(transactions)
+    result = WpReconciliation(key)
+
+    # build side: index the ledger once
+    index = {}
+    ledgerKeys = [joinKey(k) for k in ledger[key]]
+    ledgerAmounts = ledger["amount"]
+    for i, k in enumerate(ledgerKeys):
+        if k is None:  # nothing to join on, so it can neither match nor be a duplicate
+            result.unkeyed.append(("ledger", ledgerAmounts[i]))
+        elif k in index:
+            result.duplicates.append(k)
+        else:
+            index[k] = i
+    result.ledgerTotal = sum(ledgerAmounts)
+
+    # probe side: one lookup per batch row
+    used = set()
+    batchAmounts = columns["amount"]
+    for k, amount in zip(columns[key], batchAmounts):
+        k = joinKey(k)
+        if k is None:
+            result.unkeyed.append(("batch", amount))
+            continue
+        i = index.get(k)
+        if i is None or i in used:
+            result.extra.append((k, amount))
+            continue
+        used.add(i)
+        if ledgerAmounts[i] == amount:
+            result.matched += 1
+            result.matchedTotal += amount
+        else:
+            result.mismatched.append((k, ledgerAmounts[i], amount))
+    result.batchTotal = sum(batchAmounts)
+
+    if len(used) < len(index):
+        result.missing = [(k, ledgerAmounts[i]) for k, i in index.iteritems() if i not in used]
+        result.missing.sort()
+
+    log.info("Reconciled %d batch rows against %d ledger rows in %.2f seconds: %d matched, %d mismatched, %d missing, %d extra, %d unkeyed",
+             len(batchAmounts), len(ledgerAmounts), time.time() - t, result.matched, len(result.mismatched), len(result.missing), len(result.extra), len(result.unkeyed))
+    return result
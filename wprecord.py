@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+''' This is the base class used by all of the request objects.
+    A request object lists its fields once, in order, as (name, default) pairs in the class attribute
+    'fields'. When the class is created, WpRecordType uses that spec to
+        - set __slots__, so instances carry no per instance __dict__ and a misspelled attribute raises
+          AttributeError instead of being silently dropped from the request
+        - generate __init__, which sets every field to its default (a fresh {} or [] for containers)
+        - generate serializeFields, which builds the request dictionary in a single pass, leaving out
+          any field with an empty value
+    The generated code is compiled once per class, not once per call.
+
+    Main Classes
+        WpRecord - derive request objects from this and fill in 'fields'
+        WpRecordType - the metaclass that does the generation
+
+    Example:
+        class VatData(WpRecord):
+            fields = (
+                ("purchaserVatNumber", ""),
+                ("merchantVatNumber", ""),
+                ("taxRate", 0.0)
+            )
+'''
+
+import logging
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+literalTypes = (str, unicode, int, long, float, bool, type(None))  # defaults of these types are written into the generated code
+
+
+class WpRecordType(type):
+    '''This metaclass turns the 'fields' spec of a WpRecord subclass into slots, __init__, and serializeFields'''
+
+    def __new__(mcs, name, bases, ns):
+        spec = ns.get('fields')
+        if spec is not None:
+            names = [f[0] for f in spec]
+            if len(set(names)) != len(names):
+                raise TypeError(name + " lists a field more than once")
+            ns['__slots__'] = tuple(names)
+            initFields, serializeFields = compileFields(name, spec)
+            ns['initFields'] = initFields
+            ns['serializeFields'] = serializeFields
+            if '__init__' not in ns:
+                ns['__init__'] = initFields
+            if 'serialize' not in ns:
+                ns['serialize'] = serializeFields
+        return type.__new__(mcs, name, bases, ns)
+
+
+def compileFields(className, spec):
+    ''' Generate the source of the initializer and serializer for a field spec and compile it.
+        Not intended for use outside of this module.
+        Output:
+            (initFields, serializeFields) functions
+    '''
+    defaults = tuple(f[1] for f in spec)
+    init = ["def initFields(self):", "    log.debug(%r)" % (className + " class:")]
+    ser = ["def serializeFields(self):", "    d = {}"]
+    for i, (name, default) in enumerate(spec):
+        if type(default) in (dict, list) and not default:
+            init.append("    self.%s = %s" % (name, "{}" if type(default) is dict else "[]"))  # never share a container between instances
+        elif type(default) in literalTypes:
+            init.append("    self.%s = %r" % (name, default))
+        else:
+            init.append("    self.%s = defaults[%d]" % (name, i))
+        ser.append("    v = self.%s" % name)
+        ser.append("    if v:")  # Remove any keys that have an empty value
+        ser.append("        d[%r] = v" % name)
+    ser.append("    return d")
+
+    namespace = {'defaults': defaults, 'log': log}
+    source = "\n".join(init) + "\n\n" + "\n".join(ser) + "\n"
+    exec compile(source, "<" + className + " fields>", "exec") in namespace
+    return namespace['initFields'], namespace['serializeFields']
+
+
+class WpRecord(object):
+    '''This is the base class of the request objects. Subclasses set 'fields' to a tuple of (name, default) pairs.
+        Methods:
+            initFields() - set every field back to its default. Used as __init__ unless the class defines its own
+            serializeFields() - dictionary of every non empty field. Used as serialize() unless the class defines its own
+    '''
+    __metaclass__ = WpRecordType
+    __slots__ = ()
@@ -14,6 +14,9 @@
     Notes:
         If a data element is not found,the member object will contain None.
         Some variable names end in RO. This stands for Response Object and is used avoid namespace clash with a similar name in the request object namespace
+        The constructors only pretty-print the response into the log when DEBUG logging is enabled
+        The transactions list of batch and transaction reporting responses, and the nested objects of a Transaction,
+        are built from the response dictionary the first time they are read (see LazyList and LazyObject)
 '''
 import logging
 from pprint import pformat
@@ -22,11 +25,83 @@ from pprint import pformat
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
 
+class LazyObject(object):
+    '''This is an attribute that builds a nested Response Object from the owner's raw dictionary the first
+        time it is read, then caches it on the instance. It is None if the key was not in the response or was null.
+            key - the key in the raw dictionary, also the attribute name
+            className - name of the Response Object class in this module to build
+    '''
+
+    def __init__(self, key, className):
+        self.key = key
+        self.className = className
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        raw = obj.raw
+        if raw is not None and raw.get(self.key) is not None:
+            value = globals()[self.className](raw[self.key])  # tunnel down
+        else:
+            value = None
+        obj.__dict__[self.key] = value  # from now on the instance attribute is found first
+        return value
+
+
+class LazyList(object):
+    '''This is a read-only list of Response Objects built from a list of raw dictionaries.
+        An element is only built the first time it is read and is cached after that, so the cost of a
+        large batch or search response depends on how many of its records are actually used.
+            items - list of raw dictionaries from the response. None is treated as empty
+            className - name of the Response Object class in this module to build
+    '''
+
+    def __init__(self, items, className):
+        self.items = items or []
+        self.className = className
+        self.built = [None] * len(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self.items)))]
+        value = self.built[i]
+        if value is None:
+            value = self.built[i] = globals()[self.className](self.items[i])
+        return value
+
+    def __iter__(self):
+        for i in xrange(len(self.items)):
+            yield self[i]
+
+    def __repr__(self):
+        return "<LazyList of %d %s, %d built>" % (len(self.items), self.className, len(self.built) - self.built.count(None))
+
+
+def rawTransactions(transactions):
+    ''' Return the raw dictionaries behind a list of transactions without building any Transaction objects.
+        Input:
+            transactions - a LazyList, or any iterable of Transaction objects and raw dictionaries
+        Output:
+            list of raw dictionaries, leaving out any without a transactionId
+    '''
+    items = transactions.items if isinstance(transactions, LazyList) else transactions
+    raw = []
+    for t in items or ():
+        d = t.raw if isinstance(t, Transaction) else t
+        if d and d.get("transactionId") is not None:
+            raw.append(d)
+    return raw
+
+
 class ResponseParameters(object):
     '''This is the base class for all of the other response objects'''
 
     def __init__(self, d={}):
-        log.debug("ResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):  # don't pretty-print unless it will be logged
+            log.debug("ResponseParameters class: %s", pformat(d, indent=1))
 
         # self.result = d.setdefault("result", None)
         self.result = d.setdefault("result", None)
@@ -43,7 +118,8 @@ class AuthResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after get batch, get batch by id, and close batch operations'''
 
     def __init__(self, d={}):
-        log.debug("AuthResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("AuthResponseParameters class: %s", pformat(d, indent=1))
 
         if 'transaction' in d:
             self.transaction = Transaction(d['transaction'])  # tunnel down
@@ -61,7 +137,8 @@ class BatchResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after get batch, get batch by id, and close batch operations'''
 
     def __init__(self, d={}):
-        log.debug("BatchResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("BatchResponseParameters class: %s", pformat(d, indent=1))
 
         self.batchCount = d.setdefault("batchCount", None)
         self.batchId = d.setdefault("batchId", None)
@@ -74,11 +151,8 @@ class BatchResponseParameters(ResponseParameters):
         else:
             self.transaction = []
 
-        self.transactions = []
-        if d['transactions'] is not None:
-            for i, k in enumerate(d["transactions"]):  # iterate through the one or more transaction records
-                log.debug("Enumerate tranactions: i=%d, k=%s", i, pformat(k, indent=1))
-                self.transactions.append(Transaction(k))
+        # each Transaction is only built when it is first read (see LazyList)
+        self.transactions = LazyList(d["transactions"], 'Transaction')
 
         if 'emvResponse' in d:  # This was mislabelled in the original !!docx!!
             self.emvResponse = d.setdefault("emvResponse", None)
@@ -91,7 +165,8 @@ class TokenResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a create token operation'''
 
     def __init__(self, d={}):
-        log.debug("TokenResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("TokenResponseParameters class: %s", pformat(d, indent=1))
 
         self.customerId = d.setdefault("customerId", None)
         self.token = d.setdefault("token", None)
@@ -108,7 +183,8 @@ class CustomerResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a create, update or get customer operations'''
 
     def __init__(self, d={}):
-        log.debug("CustomerResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("CustomerResponseParameters class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
 
         if 'vaultCustomer' in d:
@@ -123,7 +199,8 @@ class PaymentAccountResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a create, update, get, or delete payment account operations'''
 
     def __init__(self, d={}):
-        log.debug("PaymentAccountResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("PaymentAccountResponseParameters class: %s", pformat(d, indent=1))
         # in the original !!docx!! but not seen in JSON self.customerId = d.setdefault("customerId", None)
 
         if 'vaultPaymentMethod' in d:
@@ -143,7 +220,8 @@ class CustomerAndPaymentResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Customer and Payment operation'''
 
     def __init__(self, d={}):
-        log.debug("CustomerAndPaymentResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("CustomerAndPaymentResponseParameters class: %s", pformat(d, indent=1))
         # This is in the original !!docx!! but doesn't show on the JSON stream self.customerId = d.setdefault("customerId", None)
 
         self.accountMessage = d.setdefault("accountMessage", None)  # These weren't in the original !!docx!!
@@ -175,7 +253,8 @@ class RecurringPaymentPlanResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Recurring Payment operation'''
 
     def __init__(self, d={}):
-        log.debug("RecurringPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("RecurringPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.planId = d.setdefault("planId", None)
 
@@ -191,7 +270,8 @@ class InstallmentPaymentPlanResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Recurring Payment operation'''
 
     def __init__(self, d={}):
-        log.debug("InstallmentPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("InstallmentPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.planId = d.setdefault("planId", None)
 
@@ -207,7 +287,8 @@ class VariablePaymentPlanResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Recurring Payment operation'''
 
     def __init__(self, d={}):
-        log.debug("VariablePaymentPlanResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("VariablePaymentPlanResponseParameters class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.planId = d.setdefault("planId", None)
 
@@ -223,7 +304,8 @@ class GetPaymentPlanResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Recurring Payment operation'''
 
     def __init__(self, d={}):
-        log.debug("GetPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("GetPaymentPlanResponseParameters class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.planId = d.setdefault("planId", None)
         self.planType = "Unknown"
@@ -253,18 +335,16 @@ class TransactionReportingResponseParameters(ResponseParameters):
     '''This is the class that will be filled in after performing a Search/Retrieve/Update Transaction'''
 
     def __init__(self, d={}):
-        log.debug("TransactionReportingResponseParameters class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("TransactionReportingResponseParameters class: %s", pformat(d, indent=1))
         self.ipAddress = d.setdefault("ipAddress", None)  # only provided in Update Transaction
         if 'transaction' in d:
             self.transaction = Transaction(d['transaction'])  # tunnel down
         else:
             self.transaction = None
 
-        self.transactions = []
-        if 'transactions' in d:
-            for i, k in enumerate(d["transactions"]):  # iterate through the one or more transaction records
-                log.debug("Enumerate tranactions: i=%d, k=%s", i, pformat(k, indent=1))
-                self.transactions.append(Transaction(k))
+        # each Transaction is only built when it is first read (see LazyList)
+        self.transactions = LazyList(d.get("transactions"), 'Transaction')
 
         super(TransactionReportingResponseParameters, self).__init__(d)  # init the base class
 
@@ -278,10 +358,18 @@ class TransactionReportingResponseParameters(ResponseParameters):
 
 
 class Transaction(object):
+    # The nested objects are built from the raw dictionary the first time they are read
+    billAddress = LazyObject('billAddress', 'AddressRO')
+    transactionData = LazyObject('transactionData', 'TransactionData')
+    settlementData = LazyObject('settlementData', 'SettlementData')
+    vaultData = LazyObject('vaultData', 'VaultData')
+
     def __init__(self, d={}):
+        self.raw = d
         if d is None:
             return
-        log.debug("Transaction class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Transaction class: %s", pformat(d, indent=1))
 
         self.customerId = d.setdefault("customerId", None)  # not in original !!docx!!
         self.emailReceipt = d.setdefault("emailReceipt", None)  # not in original !!docx!!
@@ -332,26 +420,6 @@ class Transaction(object):
         self.additionalAmount = d.setdefault('additionalAmount', None)
         self.method = d.setdefault('method', None)
 
-        if 'billAddress' in d:
-            self.billAddress = AddressRO(d['billAddress'])  # tunnel down
-        else:
-            self.billAddress = None
-
-        if 'transactionData' in d:
-            self.transactionData = TransactionData(d["transactionData"])  # tunnel down
-        else:
-            self.transactionData = None
-
-        if 'settlementData' in d:
-            self.settlementData = SettlementData(d['settlementData'])  # tunnel down
-        else:
-            self.settlementData = None
-
-        if 'vaultData' in d:
-            self.vaultData = VaultData(d["vaultData"])  # tunnel down
-        else:
-            self.vaultData = None
-
         ''' The following fields show up in the json but are not in the !!docsx!! for Transaction
         additionalData1
         additionalData2
@@ -370,7 +438,8 @@ class TransactionData(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("TransactionData class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("TransactionData class: %s", pformat(d, indent=1))
         self.date = d.setdefault("date", None)
         self.amount = d.setdefault("amount", None)
 
@@ -379,34 +448,35 @@ class SettlementData(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("SettlementData class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("SettlementData class: %s", pformat(d, indent=1))
         self.date = d.setdefault("date", None)
         self.amount = d.setdefault("amount", None)
         self.batchId = d.setdefault("batchId", None)
 
 
 class VaultData(object):
+    token = LazyObject('token', 'Token')
+
     def __init__(self, d={}):
+        self.raw = d
         if d is None:
             return
-        log.debug("VaultData class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("VaultData class: %s", pformat(d, indent=1))
         self.company = d.setdefault("company", None)
         self.firstName = d.setdefault("firstName", None)
         self.lastName = d.setdefault("lastName", None)
         self.email = d.setdefault("email", None)
         self.phone = d.setdefault("phone", None)
 
-        if 'token' in d:
-            self.token = Token(d["token"])  # tunnel down
-        else:
-            self.token = None
-
 
 class VaultCustomer(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("VaultCustomer class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("VaultCustomer class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.firstName = d.setdefault("firstName", None)
         self.lastName = d.setdefault("lastName", None)
@@ -425,31 +495,36 @@ class VaultCustomer(object):
         self.variablePaymentPlans = []
         if d['variablePaymentPlans'] is not None:
             for i, k in enumerate(d["variablePaymentPlans"]):  # iterate through the one or more payment plan records
-                log.debug("Enumerate variable payment plans: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate variable payment plans: i=%d, k=%s", i, pformat(k, indent=1))
                 self.variablePaymentPlans.append(VariablePaymentPlanRO(k))
 
         self.recurringPaymentPlans = []
         if d['recurringPaymentPlans'] is not None:
             for i, k in enumerate(d["recurringPaymentPlans"]):  # iterate through the one or more payment plan records
-                log.debug("Enumerate recurring payment plans: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate recurring payment plans: i=%d, k=%s", i, pformat(k, indent=1))
                 self.recurringPaymentPlans.append(RecurringPaymentPlanRO(k))
 
         self.installmentPaymentPlans = []
         if d['installmentPaymentPlans'] is not None:
             for i, k in enumerate(d["installmentPaymentPlans"]):  # iterate through the one or more payment plan records
-                log.debug("Enumerate installment payment plans: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate installment payment plans: i=%d, k=%s", i, pformat(k, indent=1))
                 self.installmentPaymentPlans.append(InstallmentPaymentPlanRO(k))
 
         self.userDefinedFields = []
         if d['userDefinedFields'] is not None:
             for i, k in enumerate(d["userDefinedFields"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.userDefinedFields.append(UserDefinedFieldRO(k))
 
         self.paymentMethods = []
         if d['paymentMethods'] is not None:
             for i, k in enumerate(d["paymentMethods"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate paymentMethod fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate paymentMethod fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.paymentMethods.append(PaymentMethod(k))
 
 
@@ -461,7 +536,8 @@ class VaultCustomerAndPayment(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("VaultCustomerAndPayment class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("VaultCustomerAndPayment class: %s", pformat(d, indent=1))
         if 'vaultCustomer' in d:
             self.vaultCustomer = VaultCustomer(d["vaultCustomer"])  # tunnel down
         if 'vaultPaymentMethod' in d:
@@ -499,7 +575,8 @@ class VaultPaymentMethod(object):
         self.userDefinedFields = []
         if d['userDefinedFields'] is not None:
             for i, k in enumerate(d["userDefinedFields"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.userDefinedFields.append(UserDefinedFieldRO(k))
 
 
@@ -528,7 +605,8 @@ class PaymentMethod(object):
         self.userDefinedFields = []
         if d['userDefinedFields'] is not None:
             for i, k in enumerate(d["userDefinedFields"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.userDefinedFields.append(UserDefinedFieldRO(k))
 
 
@@ -554,13 +632,15 @@ class VariablePaymentPlanRO(object):
         self.scheduledPayments = []
         if d['scheduledPayments'] is not None:
             for i, k in enumerate(d["scheduledPayments"]):  # iterate through the one or more payment plan records
-                log.debug("Enumerate scheduled payments: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate scheduled payments: i=%d, k=%s", i, pformat(k, indent=1))
                 self.scheduledPayments.append(ScheduledPaymentRO(k))
 
         self.userDefinedFields = []
         if d['userDefinedFields'] is not None:
             for i, k in enumerate(d["userDefinedFields"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.userDefinedFields.append(UserDefinedFieldRO(k))
 
 
@@ -602,7 +682,8 @@ class RecurringPaymentPlanRO(object):
         self.userDefinedFields = []
         if 'userDefinedFields' in d:
             for i, k in enumerate(d["userDefinedFields"]):  # iterate through the one or more user defined record
-                log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Enumerate user defined fields: i=%d, k=%s", i, pformat(k, indent=1))
                 self.userDefinedFields.append(UserDefinedFieldRO(k))
 
 
@@ -630,7 +711,8 @@ class Token(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("Token class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Token class: %s", pformat(d, indent=1))
         self.customerId = d.setdefault("customerId", None)
         self.paymentMethodId = d.setdefault("paymentMethodId", None)
         self.paymentType = d.setdefault("paymentType", None)
@@ -640,7 +722,8 @@ class AddressRO(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("AddressRO class: %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("AddressRO class: %s", pformat(d, indent=1))
         self.line1 = d.setdefault('line1', None)
         self.city = d.setdefault('city', None)
         self.state = d.setdefault('state', None)
@@ -651,10 +734,14 @@ class AddressRO(object):
 
 
 class MaskedCard(object):
+    address = LazyObject('address', 'AddressRO')
+
     def __init__(self, d={}):
+        self.raw = d
         if d is None:
             return
-        log.debug("MaskedCard class %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("MaskedCard class %s", pformat(d, indent=1))
         self.company = d.setdefault('company', None)
         self.creditCardType = d.setdefault('creditCardType', None)
         self.email = d.setdefault('email', None)
@@ -664,25 +751,22 @@ class MaskedCard(object):
         self.lastFourDigits = d.setdefault('lastFourDigits', None)
         self.maskedNumber = d.setdefault('maskedNumber', None)
 
-        if 'address' in d:
-            self.address = AddressRO(d['address'])  # tunnel down
-        else:
-            self.address = None
-
 
 class UserDefinedFieldRO(object):
     # FIX This object needs some research - leave blank for now.
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("UDF Response class %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("UDF Response class %s", pformat(d, indent=1))
 
 
 class CheckRO(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("CheckRO class %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("CheckRO class %s", pformat(d, indent=1))
         self.accountType = d.setdefault('accountType', None)
         self.checkType = d.setdefault('checkType', None)
         self.routingNumber = d.setdefault('routingNumber', None)
@@ -705,7 +789,8 @@ class EmvResponse(object):
     def __init__(self, d={}):
         if d is None:
             return
-        log.debug("EmvResponse class %s", pformat(d, indent=1))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("EmvResponse class %s", pformat(d, indent=1))
         self.issuerauthenticationdata = d.setdefault('issuerauthenticationdata', None)
         self.issuerscripttemplateE1 = d.setdefault('issuerscripttemplateE1', None)
         self.issuerscripttemplateE2 = d.setdefault('issuerscripttemplateE2', None)
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+
+''' These are the classes used to retry transactions that fail for transient reasons.
+    wpTransact() hands each HTTP call to retryCall(). A call that times out or cannot connect is
+    retried with exponential backoff and full jitter until the operation's policy runs out of
+    attempts or time budget.
+
+    A POST that creates something (Charge, Authorize, CreateCustomer, ...) is only retried when the
+    payload carries a client generated key (see idempotencyKeys), so the gateway can recognise a
+    replay instead of charging twice. Use newOrderId() to generate one. Gets, puts, deletes, and
+    read-only posts such as SearchTransactions are always retried.
+
+    Every call is recorded as a WpRetryRecord so retried successes can be told apart from first try
+    successes. lastRetryRecord() returns the record of the most recent call made on the current thread
+    and retryStats keeps running totals.
+
+    Main Functions
+        retryCall - run a call under the retry policy for its operation. Used by wpTransact()
+        setRetryPolicy / getRetryPolicy - per operation policies
+        isIdempotent - decide whether a call is safe to repeat
+        newOrderId - generate a client idempotency key for orderId
+        lastRetryRecord - the record of the last call made on this thread
+    Global Variables
+        defaultRetryPolicy - used for any operation without its own policy
+        retryStats - running totals of first try successes, retried successes, and failures
+    Main Classes
+        WpRetryPolicy, WpRetryRecord, WpAttempt
+'''
+
+import logging
+import random
+import threading
+import time
+import uuid
+
+from wpexceptions import WpTimeoutError, WpConnectionError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+retryableErrors = (WpTimeoutError, WpConnectionError)  # transient failures. Anything else is raised immediately
+readOnlyPosts = frozenset(["searchtransactions"])  # posts that don't change anything on the gateway
+idempotencyKeys = ("orderId",)  # payload fields that identify a replayed request to the gateway
+
+
+class WpRetryPolicy(object):
+    '''This defines how hard to try a single operation.
+        Attributes:
+            maxAttempts - total attempts including the first. 1 disables retries
+            baseDelay - seconds to wait before the first retry. Doubles on every retry
+            maxDelay - cap on the wait between attempts
+            budget - seconds after the first attempt started beyond which no new attempt is started
+            jitter - if True, wait a random time between 0 and the backoff (full jitter) so that callers don't retry in lock step
+    '''
+
+    def __init__(self, maxAttempts=3, baseDelay=0.5, maxDelay=5.0, budget=45.0, jitter=True):
+        self.maxAttempts = maxAttempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.budget = budget
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        '''seconds to wait after the given (1 based) failed attempt'''
+        backoff = min(self.maxDelay, self.baseDelay * (2 ** (attempt - 1)))
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+
+class WpAttempt(object):
+    '''This is one try of a call.
+        Attributes:
+            number - 1 for the first attempt
+            elapsed - seconds the attempt took
+            error - message of the exception raised, or None if it succeeded
+    '''
+
+    def __init__(self, number, elapsed, error=None):
+        self.number = number
+        self.elapsed = elapsed
+        self.error = error
+
+
+class WpRetryRecord(object):
+    '''This is the history of a single call.
+        Attributes:
+            operation - name of the operation
+            idempotent - True if the call was allowed to retry
+            attempts - list of WpAttempt
+            succeeded - True if the last attempt succeeded
+            retried - True if more than one attempt was made
+    '''
+
+    def __init__(self, operation, idempotent):
+        self.operation = operation
+        self.idempotent = idempotent
+        self.attempts = []
+        self.succeeded = False
+
+    @property
+    def retried(self):
+        return len(self.attempts) > 1
+
+
+defaultRetryPolicy = WpRetryPolicy()
+retryPolicies = {}  # operation (lowercase) -> WpRetryPolicy
+retryStats = {'firstTry': 0, 'retried': 0, 'failed': 0}
+statsLock = threading.Lock()
+local = threading.local()
+
+
+def setRetryPolicy(operation, policy):
+    ''' Use a specific policy for an operation. Pass None to go back to defaultRetryPolicy '''
+    if policy is None:
+        retryPolicies.pop(operation.lower(), None)
+    else:
+        retryPolicies[operation.lower()] = policy
+
+
+def getRetryPolicy(operation):
+    return retryPolicies.get(operation.lower(), defaultRetryPolicy)
+
+
+def newOrderId():
+    ''' Generate a unique client side key. Assign it to orderId before the first attempt of a charge or auth '''
+    return uuid.uuid4().hex
+
+
+def isIdempotent(operation, isPost, payload):
+    ''' Return True if repeating this call cannot create a second transaction.
+        Input:
+            operation - name of the operation
+            isPost - True if the call is an HTTP POST
+            payload - the dictionary being sent
+    '''
+    if not isPost or operation.lower() in readOnlyPosts:
+        return True
+    if payload:
+        for key in idempotencyKeys:
+            if payload.get(key):
+                return True
+    return False
+
+
+def lastRetryRecord():
+    ''' Return the WpRetryRecord of the most recent call made on the current thread, or None '''
+    return getattr(local, 'record', None)
+
+
+def retryCall(operation, idempotent, fn):
+    ''' Call fn() and retry it on transient errors according to the operation's policy.
+        Input:
+            operation - name of the operation. Selects the policy
+            idempotent - False means fn is only ever called once
+            fn - the call to make. Takes no arguments
+        Output:
+            the return value of fn
+        Raises:
+            the last exception raised by fn. It carries the WpRetryRecord in its retryRecord attribute
+    '''
+    policy = getRetryPolicy(operation)
+    record = WpRetryRecord(operation, idempotent)
+    local.record = record
+    maxAttempts = policy.maxAttempts if idempotent else 1
+    started = time.time()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        t = time.time()
+        try:
+            ret = fn()
+        except retryableErrors as e:
+            record.attempts.append(WpAttempt(attempt, time.time() - t, e.message))
+            wait = policy.delay(attempt)
+            if attempt >= maxAttempts or (time.time() - started) + wait > policy.budget:
+                if not idempotent:
+                    log.warning("%s not retried. Add an %s to make it safe to repeat", operation, " or ".join(idempotencyKeys))
+                record.succeeded = False
+                countCall(record)
+                e.retryRecord = record
+                raise
+            log.warning("%s attempt %d failed (%s). Retrying in %.2f seconds", operation, attempt, e.message, wait)
+            time.sleep(wait)
+        except Exception as e:  # not transient - don't retry
+            record.attempts.append(WpAttempt(attempt, time.time() - t, getattr(e, 'message', str(e))))
+            countCall(record)
+            e.retryRecord = record
+            raise
+        else:
+            record.attempts.append(WpAttempt(attempt, time.time() - t))
+            record.succeeded = True
+            countCall(record)
+            if record.retried:
+                log.info("%s succeeded after %d attempts", operation, attempt)
+            return ret
+
+
+def countCall(record):
+    with statsLock:
+        if not record.succeeded:
+            retryStats['failed'] += 1
+        elif record.retried:
+            retryStats['retried'] += 1
+        else:
+            retryStats['firstTry'] += 1
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+
+''' These are the classes used to run a multi-step transaction script as a dependency graph.
+    Each step declares the values it consumes (for example a transaction id or customer id) and the
+    value it produces. The scheduler starts every step whose inputs are available, runs independent
+    steps in parallel, and hands each produced value to the steps that consume it. If a step fails,
+    only the steps that depend on it (directly or indirectly) are skipped. Everything else still runs.
+
+    Main Classes
+        WpScheduler - holds the steps and runs them
+        WpStep - a single step in the graph. Created by WpScheduler.add()
+        WpScheduleResult - the outcome of WpScheduler.run()
+
+    Example:
+        s = WpScheduler()
+        s.add("auth", doAuth, produces="authTid")
+        s.add("capture", doPriorAuthCapture, consumes=["authTid"], produces="captureTid")
+        s.add("void", lambda t: doVoid(t[0]), consumes=["captureTid"])
+        result = s.run()
+'''
+
+import logging
+import sys
+from Queue import Queue
+
+from wpasync import WpWorkerPool
+from wpexceptions import WpInvalidFunctionCallError
+from wptotal import worldpay
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+class WpStep(object):
+    '''This is a single step in a schedule. You do not need to create these directly. Use WpScheduler.add()
+        Attributes:
+            name - unique name of the step
+            fn - function called to perform the step. It is passed the consumed values, in order, as positional arguments
+            consumes - list of value names this step needs
+            produces - name of the value the return of fn is stored under, or None
+            after - list of step names that must finish first even though no value is passed between them
+            state - one of WpStep.pending, running, succeeded, failed, skipped
+    '''
+
+    pending = "PENDING"  # Constants - do not change
+    running = "RUNNING"
+    succeeded = "SUCCEEDED"
+    failed = "FAILED"
+    skipped = "SKIPPED"
+
+    def __init__(self, name, fn, consumes=(), produces=None, after=()):
+        self.name = name
+        self.fn = fn
+        self.consumes = list(consumes)
+        self.produces = produces
+        self.after = list(after)
+        self.state = self.pending
+        self.upstream = set()  # names of the steps this step waits on
+        self.downstream = set()  # names of the steps waiting on this step
+
+
+class WpScheduleResult(object):
+    '''This is the outcome of a schedule run.
+        Attributes:
+            values - dictionary of every value produced, by value name
+            states - dictionary of the final state of every step, by step name
+            errors - dictionary of the exception raised by every failed step, by step name
+            skipped - list of steps that were not run because something they depend on failed
+            ok - True if every step succeeded
+    '''
+
+    def __init__(self, steps, values, errors):
+        self.values = values
+        self.errors = errors
+        self.states = dict((name, step.state) for name, step in steps.iteritems())
+        self.skipped = [name for name, step in steps.iteritems() if step.state == WpStep.skipped]
+        self.ok = not errors and not self.skipped
+
+
+class WpScheduler(object):
+    '''This class holds the steps of a script and runs them in dependency order.
+        Methods:
+            add(name, fn, consumes, produces, after) - add a step
+            run() - validate the graph, run every step, and return a WpScheduleResult
+    '''
+
+    def __init__(self, maxWorkers=None):
+        self.maxWorkers = maxWorkers or worldpay.batchWorkers  # most steps allowed to run at once
+        self.steps = {}
+        self.order = []  # steps in the order they were added. Ready steps are started in this order
+
+    def add(self, name, fn, consumes=(), produces=None, after=()):
+        ''' Add a step to the schedule.
+            Input:
+                name - unique name of the step
+                fn - function that performs the step. Called with the consumed values as positional arguments
+                consumes - list of value names the step needs. Each must be produced by exactly one other step
+                produces - optional name to store the return of fn under
+                after - optional list of step names that must finish before this one starts
+            Output:
+                the new WpStep
+            Raises:
+                WpInvalidFunctionCallError - the name is already used
+        '''
+        if name in self.steps:
+            raise WpInvalidFunctionCallError("WpScheduler.add duplicate step name: " + name)
+        step = WpStep(name, fn, consumes, produces, after)
+        self.steps[name] = step
+        self.order.append(step)
+        return step
+
+    def link(self):
+        '''Resolve consumes/after into step to step edges and check the graph is runnable'''
+        producers = {}
+        for step in self.order:
+            if step.produces is not None:
+                if step.produces in producers:
+                    raise WpInvalidFunctionCallError("WpScheduler value " + step.produces + " produced by both " + producers[step.produces] + " and " + step.name)
+                producers[step.produces] = step.name
+
+        for step in self.order:
+            for value in step.consumes:
+                if value not in producers:
+                    raise WpInvalidFunctionCallError("WpScheduler step " + step.name + " consumes " + value + " which no step produces")
+                step.upstream.add(producers[value])
+            for name in step.after:
+                if name not in self.steps:
+                    raise WpInvalidFunctionCallError("WpScheduler step " + step.name + " runs after unknown step " + name)
+                step.upstream.add(name)
+            for name in step.upstream:
+                self.steps[name].downstream.add(step.name)
+
+        # Kahn's algorithm - if we can't visit every step there is a cycle
+        waiting = dict((step.name, len(step.upstream)) for step in self.order)
+        ready = [name for name, n in waiting.iteritems() if n == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for d in self.steps[name].downstream:
+                waiting[d] -= 1
+                if waiting[d] == 0:
+                    ready.append(d)
+        if visited != len(self.order):
+            cycle = sorted(name for name, n in waiting.iteritems() if n > 0)
+            raise WpInvalidFunctionCallError("WpScheduler has a dependency cycle between: " + ", ".join(cycle))
+
+    def run(self):
+        ''' Run every step. Independent steps run in parallel, up to maxWorkers at a time.
+            Output:
+                WpScheduleResult
+            Raises:
+                WpInvalidFunctionCallError - the graph has a missing producer, unknown step, or cycle
+                Exceptions raised by the steps themselves are captured in the result, not raised
+        '''
+        self.link()
+
+        values = {}
+        errors = {}
+        waiting = dict((step.name, len(step.upstream)) for step in self.order)
+        finished = Queue()  # workers report (step, value, excInfo) here as they complete
+        pool = WpWorkerPool(max(1, min(self.maxWorkers, len(self.order))))
+        outstanding = [0]
+
+        def start(step):
+            step.state = WpStep.running
+            args = [values[v] for v in step.consumes]
+            log.info("Starting step %s", step.name)
+            outstanding[0] += 1
+            future = pool.submit(step.fn, *args)
+            future.addDoneCallback(lambda f: finished.put((step, f)))
+
+        def skip(step, cause):
+            # mark everything downstream of a failed step as skipped
+            for name in step.downstream:
+                d = self.steps[name]
+                if d.state == WpStep.pending:
+                    d.state = WpStep.skipped
+                    log.info("Skipping step %s. It depends on %s", d.name, cause)
+                    skip(d, cause)
+
+        try:
+            for step in self.order:
+                if waiting[step.name] == 0:
+                    start(step)
+
+            while outstanding[0]:
+                step, future = finished.get()
+                outstanding[0] -= 1
+                try:
+                    value = future.result()
+                except Exception:
+                    step.state = WpStep.failed
+                    errors[step.name] = sys.exc_info()[1]
+                    log.error("Step %s failed: %s", step.name, getattr(errors[step.name], 'message', errors[step.name]))
+                    skip(step, step.name)
+                    continue
+
+                step.state = WpStep.succeeded
+                if step.produces is not None:
+                    values[step.produces] = value
+                log.info("Finished step %s", step.name)
+
+                for d in self.order:  # start anything that is now ready, in the order it was added
+                    if d.name in step.downstream and d.state == WpStep.pending:
+                        waiting[d.name] -= 1
+                        if waiting[d.name] == 0:
+                            start(d)
+        finally:
+            pool.shutdown()
+
+        return WpScheduleResult(self.steps, values, errors)
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+
+''' These are the functions used to search long date ranges of transactions without pulling the
+    whole range into memory in one response.
+
+    wpSearchTransactions() is a generator. It walks the range in sub-windows, sends one
+    SearchTransactions call per window, and yields the Transaction objects of each window as it
+    arrives. Only one window's response is held at a time. The window size adapts as it goes:
+        - a window that returns more than maxTransactions, or takes longer than maxSeconds,
+          makes the following windows proportionally smaller
+        - a window that times out is split in half and tried again
+        - windows that come back small and quick let the following windows grow, up to maxDays
+    Windows are whole days, since that is the resolution of startDate and endDate. A single day is
+    never split, even if it is over the limits.
+
+    wpSearchTransactionsSharded() trades memory for wall time instead. It splits the range into shards,
+    searches them all concurrently, and returns one list merged into time order with duplicates removed.
+    SearchTransactions is reporting traffic (see wpthrottle.py), which by default allows 4 calls in flight
+    and 5 a second. Asking for more shards or workers than that only queues them. To run more at once,
+    raise the limits first, for example configureTrafficClass("reporting", rate=10, maxInFlight=8).
+
+    Main Functions
+        wpSearchTransactions - yield every transaction in a date range
+        wpSearchTransactionsSharded - search a date range in concurrent shards and merge the results
+        shardDates - split a date range into contiguous windows
+        searchWindow - make one SearchTransactions call for a date range
+        searchDate - format a date the way SearchTransactionsRequest expects
+'''
+
+import datetime
+import logging
+import time
+
+from wptotal import worldpay, wpTransact
+from wpbatch import wpRunBatch
+from wptransactionreportingobjects import SearchTransactionsRequest
+from wpresponseobjects import TransactionReportingResponseParameters, LazyList
+from wpexceptions import WpBadResponseError, WpTimeoutError, WpInvalidFunctionCallError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+oneDay = datetime.timedelta(days=1)
+
+
+def searchDate(d):
+    ''' Return a date as the M/D/YYYY string used by SearchTransactionsRequest '''
+    return str(d.month) + "/" + str(d.day) + "/" + str(d.year)
+
+
+def searchWindow(start, stop, criteria=None):
+    ''' Make one SearchTransactions call.
+        Input:
+            start, stop - first and last day to search (datetime.date), inclusive
+            criteria - optional SearchTransactionsRequest holding any other search fields (customerId, amount, ...).
+                       Its startDate and endDate are ignored and it is not modified
+        Output:
+            TransactionReportingResponseParameters
+        Raises:
+            WpBadResponseError
+            Exceptions raised by wpTransact()
+    '''
+    st = SearchTransactionsRequest()
+    if criteria is not None:
+        for name in SearchTransactionsRequest.__slots__:
+            setattr(st, name, getattr(criteria, name))
+    st.startDate = searchDate(start)
+    st.endDate = searchDate(stop)
+
+    rp = TransactionReportingResponseParameters(wpTransact("SearchTransactions", st.serialize()))
+    if (rp.responseCode != 1):  # response from Worldpay indicates failure
+        errMsg = "SearchTransactions failed. Range: " + st.startDate + " - " + st.endDate + " Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + str(rp.message)
+        raise WpBadResponseError(errMsg)
+    return rp
+
+
+def wpSearchTransactions(start, end, criteria=None, windowDays=7, maxDays=31, maxTransactions=500, maxSeconds=10.0):
+    ''' Yield every transaction between two dates, one window at a time.
+        Input:
+            start, end - first and last day of the range (datetime.date), inclusive
+            criteria - optional SearchTransactionsRequest holding any other search fields
+            windowDays - number of days in the first window
+            maxDays - largest window ever used
+            maxTransactions - a window returning more than this shrinks the next one
+            maxSeconds - a window taking longer than this shrinks the next one
+        Output:
+            generator of Transaction objects, in window order
+        Raises:
+            WpInvalidFunctionCallError - end is before start
+            WpTimeoutError - a single day window timed out
+            WpBadResponseError and exceptions raised by wpTransact()
+    '''
+    if end < start:
+        raise WpInvalidFunctionCallError("wpSearchTransactions end date is before start date")
+
+    days = max(1, min(windowDays, maxDays))
+    day = start
+    windows = 0
+    total = 0
+    while day <= end:
+        stop = min(end, day + oneDay * (days - 1))
+        t = time.time()
+        try:
+            rp = searchWindow(day, stop, criteria)
+        except WpTimeoutError:
+            span = (stop - day).days + 1
+            if span == 1:
+                raise
+            days = span // 2
+            log.warning("Search %s - %s timed out. Retrying with %d day windows", searchDate(day), searchDate(stop), days)
+            continue
+        elapsed = time.time() - t
+
+        n = len(rp.transactions)
+        windows += 1
+        total += n
+        log.info("Search %s - %s: %d transactions in %.2f seconds", searchDate(day), searchDate(stop), n, elapsed)
+
+        # size the next window from how dense and how slow this one was
+        span = (stop - day).days + 1
+        if n > maxTransactions or elapsed > maxSeconds:
+            scale = min(float(maxTransactions) / max(n, 1), maxSeconds / max(elapsed, 0.001))
+            days = max(1, int(span * scale))
+        elif n < maxTransactions / 4 and elapsed < maxSeconds / 4:
+            days = min(maxDays, max(days, span) * 2)
+
+        day = stop + oneDay
+        for transaction in rp.transactions:
+            yield transaction
+        rp = None  # let the window go before the next one is fetched
+
+    log.info("Search %s - %s complete: %d transactions in %d windows", searchDate(start), searchDate(end), total, windows)
+
+
+def shardDates(start, end, shards):
+    ''' Split the days from start to end (inclusive) into at most shards contiguous (first, last) windows of nearly equal size '''
+    days = (end - start).days + 1
+    shards = max(1, min(shards, days))
+    windows = []
+    first = start
+    for i in xrange(shards):
+        size = days // shards + (1 if i < days % shards else 0)
+        last = first + oneDay * (size - 1)
+        windows.append((first, last))
+        first = last + oneDay
+    return windows
+
+
+def transactionOrder(d):
+    '''Sort key of a raw transaction dictionary: transaction time, then id. Not intended for use outside of this module.'''
+    data = d.get("transactionData") or {}
+    return (data.get("date") or "", d.get("transactionId"))
+
+
+def wpSearchTransactionsSharded(start, end, criteria=None, shards=None, maxWorkers=None):
+    ''' Search a date range as several concurrent SearchTransactions calls and merge the results.
+        Input:
+            start, end - first and last day of the range (datetime.date), inclusive
+            criteria - optional SearchTransactionsRequest holding any other search fields
+            shards - number of windows to split the range into. Defaults to WPTotal.batchWorkers
+            maxWorkers - most shards in flight at once. Defaults to WPTotal.batchWorkers.
+                         The reporting traffic class (see wpthrottle.py) holds this to its own maxInFlight, 4 by default
+        Output:
+            read-only list of Transaction objects in time order, each transactionId appearing once.
+            A transaction is only built when it is read (see LazyList)
+        Raises:
+            WpInvalidFunctionCallError - end is before start
+            the exception of the first shard that failed. Every shard is allowed to finish first
+    '''
+    if end < start:
+        raise WpInvalidFunctionCallError("wpSearchTransactionsSharded end date is before start date")
+
+    windows = shardDates(start, end, shards or worldpay.batchWorkers)
+    t = time.time()
+    results = wpRunBatch([(searchWindow, (first, last, criteria)) for first, last in windows], maxWorkers)
+
+    merged = []
+    seen = set()
+    duplicates = 0
+    for (first, last), rp in zip(windows, results):
+        if isinstance(rp, Exception):
+            log.error("Search shard %s - %s failed", searchDate(first), searchDate(last))
+            raise rp
+        for d in rp.transactions.items:  # merge the raw dictionaries. No Transaction is built here
+            tid = d.get("transactionId")
+            if tid is not None:
+                if tid in seen:  # the same transaction reported by both windows at a boundary
+                    duplicates += 1
+                    continue
+                seen.add(tid)
+            merged.append(d)
+
+    merged.sort(key=transactionOrder)
+    log.info("Sharded search %s - %s: %d transactions (%d duplicates dropped) from %d shards in %.2f seconds",
+             searchDate(start), searchDate(end), len(merged), duplicates, len(windows), time.time() - t)
+    return LazyList(merged, "Transaction")
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+''' These are the functions used to keep the local transaction store current without re-searching the
+    whole reporting window on every run.
+
+    wpSyncTransactions() saves a high-water mark in the store after each run: the date and
+    transactionId of the newest transaction seen. The next run only searches from that date on.
+    SearchTransactions works in whole days, and a transaction can still change after it was first seen
+    (it settles, or arrives late), so each run starts overlapDays before the mark. Transactions in the
+    overlap that are already stored unchanged are skipped, and changed ones are replaced.
+
+    The mark is only moved once a run has finished, so a run that fails part way is simply repeated
+    from the old mark the next time.
+
+    Main Functions
+        wpSyncTransactions - fetch the transactions newer than the high-water mark into the store
+'''
+
+import datetime
+import logging
+import time
+
+from wpsearch import wpSearchTransactions, searchDate
+from wptransactionstore import getTransactionStore
+from wpexceptions import WpInvalidFunctionCallError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+def markDay(mark):
+    ''' Return the day of a high-water mark, or None if its date can't be read. Not intended for use outside of this module. '''
+    try:
+        return datetime.datetime.strptime(mark["date"][:10], "%Y-%m-%d").date()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def wpSyncTransactions(name="transactions", criteria=None, store=None, overlapDays=1, initialDays=30, today=None):
+    ''' Bring the transaction store up to date with the gateway.
+        Input:
+            name - name the high-water mark is saved under. Use a different name for each set of criteria
+            criteria - optional SearchTransactionsRequest holding any other search fields
+            store - WpTransactionStore to fill. Defaults to getTransactionStore()
+            overlapDays - days before the mark searched again to pick up late arrivals and updates
+            initialDays - days searched on the first run, when there is no mark yet
+            today - last day to search. Defaults to today
+        Output:
+            (added, changed) - number of transactions new to the store, and number that had changed
+        Raises:
+            WpInvalidFunctionCallError - there is no store (WPTotal.transactionStoreFile is None)
+            Exceptions raised by wpSearchTransactions()
+    '''
+    if store is None:
+        store = getTransactionStore()
+    if store is None:
+        raise WpInvalidFunctionCallError("wpSyncTransactions needs a transaction store")
+
+    end = today or datetime.date.today()
+    mark = store.getMark(name)
+    day = markDay(mark) if mark else None
+    if day is None:
+        start = end - datetime.timedelta(days=initialDays)
+    else:
+        start = min(end, day - datetime.timedelta(days=overlapDays))
+    log.info("Sync %s: %s - %s. Mark: %s", name, searchDate(start), searchDate(end), mark)
+
+    t = time.time()
+    high = (mark["date"], mark["transactionId"]) if day is not None else None
+    added = changed = seen = 0
+    pending = []
+    for transaction in wpSearchTransactions(start, end, criteria):
+        seen += 1
+        data = transaction.transactionData
+        if data is None:  # still stored, but it can't move the mark
+            log.warning("Sync %s: transaction %s has no transactionData", name, transaction.transactionId)
+        else:
+            key = (data.date, transaction.transactionId)
+            if key[0] and (high is None or key > high):
+                high = key
+        pending.append(transaction)
+        if len(pending) >= 500:  # write in chunks rather than one row at a time
+            a, c = store.putChanged(pending)
+            added, changed = added + a, changed + c
+            pending = []
+    a, c = store.putChanged(pending)
+    added, changed = added + a, changed + c
+
+    if high is not None:
+        store.setMark(name, {"date": high[0], "transactionId": high[1], "synced": time.time()})
+    log.info("Sync %s complete: %d seen, %d added, %d changed in %.2f seconds. Mark: %s",
+             name, seen, added, changed, time.time() - t, high)
+    return added, changed
@@ -5,6 +5,7 @@
 '''
 
 import logging
+import threading
 from random import randint
 from csv import DictReader
 
@@ -17,50 +18,71 @@ class TestDatabase(object):
     ''' Read the test data file
         Objects:
             count - number of record read in from the file
-            current - index to the current record in the data array (not needed externally)
+            current - index to the current record in the data array (not needed externally). Each thread has its own
+            last - index of the record picked most recently on any thread. reread() returns it
         Methods:
             next() - get the next sequential record. If already at the end, start over at the beginning
             previous() - get the previous sequential record. If already at the beginning, return tto the last record.
             random() - Return a random record from the file. This does not advance the index therefore next() and previous() are unaffected
+            reread() - get the record picked most recently, even if it was picked on another thread
             getXXX() - get methods for each field of the dictionary
 
     '''
     def __init__(self):
+        self.local = threading.local()  # each thread gets its own current record so concurrent doXXX calls don't mix data
+        self.lock = threading.Lock()  # guards internalIndex and last, which every thread shares
+        self.last = 0  # the record picked most recently on any thread, so an update on a worker thread rereads what a create used
         self.current = 0  # this is the index into the current dictionary record
         self.internalIndex = 0  # this is used esclusively for next() and previous() so that random doesn't reset their index - not for external consumption
         with open(worldpay.testDataFileName, 'rU') as csvfile:
             self.db = list(DictReader(csvfile))
         self.count = len(self.db)
 
-    def next(self):
-        if (self.internalIndex >= self.count - 1):  # if we hit the end of the list, start back at the beginning
-            self.internalIndex = 0
-        else:
-            self.internalIndex += 1
+    @property
+    def current(self):
+        return getattr(self.local, 'current', 0)
+
+    @current.setter
+    def current(self, index):
+        self.local.current = index
+
+    def pick(self, index):
+        ''' Make index the current record of this thread and the last one picked. Not intended for use outside of this class. '''
+        self.current = index
+        self.last = index
 
-        self.current = self.internalIndex  # align the current record to the same as the internal sequential pointer
+    def next(self):
+        with self.lock:
+            if (self.internalIndex >= self.count - 1):  # if we hit the end of the list, start back at the beginning
+                self.internalIndex = 0
+            else:
+                self.internalIndex += 1
+            self.pick(self.internalIndex)  # align the current record to the same as the internal sequential pointer
         d = self.db[self.current]
         log.debug("Next test record (%d): %s", self.current, str(d))
         return d
 
     def previous(self):
-        if (self.internalIndex <= 0):  # if we hit the beginning of the list, loop back to the end
-            self.internalIndex = self.count - 1
-        else:
-            self.internalIndex -= 1
-
-        self.current = self.internalIndex  # align the current record to the same as the internal sequential pointer
+        with self.lock:
+            if (self.internalIndex <= 0):  # if we hit the beginning of the list, loop back to the end
+                self.internalIndex = self.count - 1
+            else:
+                self.internalIndex -= 1
+            self.pick(self.internalIndex)  # align the current record to the same as the internal sequential pointer
         d = self.db[self.current]  # if we were already at the beginning simply return the 1st element rather than fail
         log.debug("Previous test record (%d): %s", self.current, str(d))
         return d
 
     def reread(self):
+        with self.lock:
+            self.current = self.last  # the create this follows may have run on another thread
         d = self.db[self.current]
         log.debug("Current test record (%d): %s", self.current, str(d))
         return d
 
     def random(self):
-        self.current = randint(0, self.count - 1)
+        with self.lock:
+            self.pick(randint(0, self.count - 1))
         d = self.db[self.current]
         log.debug("Random test record (%d): %s", self.current, str(d))
         return d
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+
+''' These are the classes used to pace the calls made to the gateway so that bulk jobs don't get the
+    merchant's credentials throttled while live checkout traffic is running.
+
+    Every operation belongs to a traffic class (payments, vault, or reporting). Each class has its own
+    token bucket rate limit and maximum calls in flight, and all classes also share a global bucket and
+    in-flight limit for the credentials. The global capacity is handed out by priority. A lower priority
+    class never takes global capacity while a higher priority call is waiting for it, and it may not use
+    the last globalReserve slots or tokens. That way Authorize and Charge always find room ahead of
+    background SearchTransactions and GetCustomer work.
+
+    The class limits apply whatever worker count a bulk job asks for. wpSearchTransactionsSharded()
+    and wpGetBatches() are reporting traffic, so by default they get at most 4 calls in flight however
+    many workers they are given. Raise the class with configureTrafficClass() to let them run wider.
+
+    Main Functions
+        configureTrafficClass - change the limits of a traffic class
+    Global Variables
+        governor - the WpGovernor used by wpTransact()
+        trafficClasses - the traffic classes by name
+        operationClasses - the traffic class name of every operation
+    Main Classes
+        WpGovernor - grants permission to make a call
+        WpTrafficClass - limits and priority of a group of operations
+        WpTokenBucket - rate limiter
+'''
+
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+class WpTokenBucket(object):
+    '''This is a token bucket rate limiter. It is not thread safe on its own. WpGovernor holds the lock.
+        rate - tokens added per second. None means unlimited
+        burst - most tokens the bucket can hold
+    '''
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst or 0)
+        self.stamp = time.time()
+
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def has(self, n):
+        return self.rate is None or self.tokens >= n
+
+    def take(self):
+        if self.rate is not None:
+            self.tokens -= 1
+
+    def timeUntil(self, n):
+        '''seconds until the bucket holds n tokens'''
+        if self.rate is None or self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+
+class WpTrafficClass(object):
+    '''This is a group of operations that share limits.
+        name - name of the class
+        priority - 0 is the highest. Lower priority classes yield global capacity to higher ones
+        rate - calls per second allowed for the class. None means no class limit
+        burst - calls that may be made at once after an idle period
+        maxInFlight - most calls of this class running at once. None means no class limit
+    '''
+
+    def __init__(self, name, priority, rate=None, burst=None, maxInFlight=None):
+        self.name = name
+        self.priority = priority
+        self.bucket = WpTokenBucket(rate, burst if burst is not None else rate)
+        self.maxInFlight = maxInFlight
+        self.inFlight = 0
+
+    def ready(self, now):
+        '''True if the class limits allow one more call'''
+        self.bucket.refill(now)
+        return self.bucket.has(1) and (self.maxInFlight is None or self.inFlight < self.maxInFlight)
+
+
+trafficClasses = {
+    "payments": WpTrafficClass("payments", 0),  # live checkout traffic. Only the global limits apply
+    "vault": WpTrafficClass("vault", 1, rate=20, burst=20, maxInFlight=8),
+    "reporting": WpTrafficClass("reporting", 2, rate=5, burst=5, maxInFlight=4),
+}
+
+operationClasses = {
+    "authorize": "payments",
+    "priorauthcapture": "payments",
+    "charge": "payments",
+    "credit": "payments",
+    "verify": "payments",
+    "refund": "payments",
+    "void": "payments",
+    "createtoken": "payments",
+    "closebatch": "payments",
+    "getbatch": "reporting",
+    "getbatchbyid": "reporting",
+    "searchtransactions": "reporting",
+    "gettransaction": "reporting",
+    "updatetransaction": "reporting",
+    # Everything else (customers, payment accounts, payment plans) is vault traffic
+}
+
+
+class WpGovernor(object):
+    '''This grants permission to make a call, waiting as needed until the limits allow it.
+        Settings:
+            globalRate / globalBurst - calls per second shared by all classes
+            globalMaxInFlight - most calls running at once across all classes
+            globalReserve - slots and tokens only the highest priority class may use
+        Methods:
+            call(operation, fn) - wait for capacity, run fn(), and release the capacity
+    '''
+
+    def __init__(self, globalRate=50, globalBurst=50, globalMaxInFlight=32, globalReserve=4):
+        self.bucket = WpTokenBucket(globalRate, globalBurst)
+        self.maxInFlight = globalMaxInFlight
+        self.reserve = globalReserve
+        self.inFlight = 0
+        self.waiting = {}  # priority -> number of calls that passed their class limits and now wait on global capacity
+        self.cond = threading.Condition()
+
+    def classFor(self, operation):
+        return trafficClasses[operationClasses.get(operation.lower(), "vault")]
+
+    def call(self, operation, fn):
+        tc = self.classFor(operation)
+        self.acquire(tc)
+        try:
+            return fn()
+        finally:
+            self.release(tc)
+
+    def acquire(self, tc):
+        queued = False  # True while this call is counted in self.waiting
+        started = time.time()
+        with self.cond:
+            try:
+                while True:
+                    now = time.time()
+                    wait = None
+                    if not tc.ready(now):
+                        if queued:  # we're blocked on our own class, so don't hold up lower priorities
+                            self.unqueue(tc)
+                            queued = False
+                        wait = tc.bucket.timeUntil(1) or None
+                    else:
+                        if not queued:
+                            self.waiting[tc.priority] = self.waiting.get(tc.priority, 0) + 1
+                            queued = True
+                        reserve = self.reserve if tc.priority > 0 else 0
+                        self.bucket.refill(now)
+                        ahead = any(n for p, n in self.waiting.iteritems() if p < tc.priority)
+                        if not ahead and self.inFlight < self.maxInFlight - reserve and self.bucket.has(1 + reserve):
+                            self.bucket.take()
+                            tc.bucket.take()
+                            self.inFlight += 1
+                            tc.inFlight += 1
+                            break
+                        if not ahead:
+                            wait = self.bucket.timeUntil(1 + reserve) or None
+                    self.cond.wait(wait)
+            finally:
+                if queued:
+                    self.unqueue(tc)
+
+        waited = time.time() - started
+        if waited > 0.5:
+            log.info("%s call waited %.2f seconds for capacity", tc.name, waited)
+
+    def unqueue(self, tc):
+        self.waiting[tc.priority] -= 1
+        self.cond.notify_all()  # a lower priority call may now be allowed through
+
+    def release(self, tc):
+        with self.cond:
+            self.inFlight -= 1
+            tc.inFlight -= 1
+            self.cond.notify_all()
+
+
+governor = WpGovernor()
+
+
+def configureTrafficClass(name, rate=None, burst=None, maxInFlight=None, priority=None):
+    ''' Change the limits of a traffic class. rate and maxInFlight of None remove that limit.
+        A class name that doesn't exist yet is created. Map operations to it through operationClasses.
+    '''
+    with governor.cond:
+        tc = trafficClasses.get(name)
+        if tc is None:
+            tc = trafficClasses[name] = WpTrafficClass(name, priority if priority is not None else 1)
+        if priority is not None:
+            tc.priority = priority
+        tc.bucket = WpTokenBucket(rate, burst if burst is not None else rate)
+        tc.maxInFlight = maxInFlight
+        governor.cond.notify_all()
+    return tc
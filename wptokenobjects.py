@@ -5,42 +5,34 @@
 
     Main Classes
         TokenRequest - used for creating a token
+
+    The fields of each class are declared in 'fields' and serialized by WpRecord (see wprecord.py)
 '''
 
 import logging
 
 from wptotal import worldpay
+from wprecord import WpRecord
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
 
-class TokenRequest(object):
+class TokenRequest(WpRecord):
     '''This is the class to use for creating tokens for both card and check
     '''
-
-    def __init__(self):
-        log.debug("TokenRequest class:")
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
-        self.publicKey = ""
-        self.card = {}  # call attachCard to fill this in
-        # Optional
-        self.addToVault = False  # set to True if you want to store the token in the vaulr
-        self.customerId = ""  # if not set, the tokenization call will return one
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
+        ("publicKey", ""),  # supplied by serialize. No need to fill this in
+        ("addToVault", False),  # set to True if you want to store the token in the vaulr
+        ("customerId", ""),  # if not set, the tokenization call will return one
+        ("card", {})  # call attachCard to fill this in
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId
         self.publicKey = worldpay.publicKey
-        s = {
-            "developerApplication": self.developerApplication,
-            "publicKey": self.publicKey,
-            "addToVault": self.addToVault,
-            "customerId": self.customerId,
-            "card": self.card
-        }
-
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an emoty value
-        return d
+        return self.serializeFields()
 
     def attachCard(self, c):
         '''attach a Card object to this object. C is the Card object'''
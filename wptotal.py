@@ -10,16 +10,24 @@
                 It is accessed through the singleton 'worldpay'. Most of the time you will
                 only need access to devAppId to fill in a transaction request.
         WPTarget - local to module. This class defines the url endpoints and access method
+        WpRoute - local to module. One precompiled endpoint of the routing table
 '''
 
 import requests
 import logging
 import os.path
+import threading
+from requests.adapters import HTTPAdapter
 from base64 import b64encode
 from pprint import pformat
-from json import dumps, loads
+from wplog import lazyPformat
+from collections import namedtuple
 from time import localtime, strftime
 from wpexceptions import WpTimeoutError, WpConnectionError, WpTooManyRedirectsError, WpJSONError, WpHTTPError, WpInvalidEndpointError, WpConfigurationError
+from wpcodec import dumps, loads
+from wpretry import retryCall, isIdempotent
+from wpcircuit import getBreaker
+from wpthrottle import governor
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
@@ -39,14 +47,24 @@ class WPTotal:
     httpProxy = 'http://10.1.1.91'  # Change to your HTTP proxy - Only used if -p option at cmdline
     httpsProxy = 'https://10.1.1.91'  # Change to your HTTPS proxy - Only used if -p option at cmdline
     timeout = 20  # Timeout for all http calls
+    poolConnections = 2  # Number of distinct hosts to keep a connection pool for
+    poolSize = 10  # Maximum number of keep-alive connections held open per host. Raise this for heavily threaded callers
+    asyncWorkers = 10  # Number of worker threads servicing non-blocking calls made through wpasync. Keep this at or below poolSize
+    batchWorkers = 8  # Default number of calls a wpbatch batch keeps in flight at once. Keep this at or below poolSize
     logFileName = 'log.txt'  # Where to send the log entries
     credentialsFile = 'me.local'  # If this file exists, read credentials for merchantId, merchantKey, and publicKey
     errorLogDirectory = 'errorlogs'  # subdirectory to place error logs in
     testDataFileName = 'testdata.csv'
+    vaultCacheSize = 1000  # Most customer and payment account responses kept by wpvaultcache. 0 turns the cache off
+    vaultCacheSeconds = 300  # How long a cached vault response is used before it is fetched again
+    writeBehindSeconds = 2.0  # How long wpwritebehind collects changes to a customer or payment account before sending them as one update
+    writeBehindJournal = None  # SQLite file queued vault updates are kept in until sent (see wpwritebehind.py). None keeps them in memory only
+    fingerprintIndexFile = None  # SQLite file of customers already created, such as 'vaultfingerprints.db' (see wpfingerprint.py). None, the default, turns deduplication off
+    transactionStoreFile = None  # SQLite file of transactions seen in responses, such as 'transactions.db' (see wptransactionstore.py). None, the default, turns it off
     doubleSecretProbation = None  # This is a file that is opened for special debugging behaviors. set on the command line. Not for general consumption
     hostPrefix = {
-        "DEMO": "https://gwapi.demo.securenet.com/api/Payments/",
-        "IPC": "localhost:8081/api/Payments/"
+        "DEMO": "https://gwapi.demo.securenet.com/api/",
+        "IPC": "http://localhost:8081/api/"
     }
     integrationType = {
         "DEMO": 0,
@@ -57,6 +75,8 @@ class WPTotal:
     proxies = {}  # this will either be nil or the proxy depending on -p option
     httpHeader = {}  # this is the HTTP header that should be included in all REST posts
     devAppId = {}  # used in all of the REST post calls
+    session = None  # pooled keep-alive HTTP session. Created on first use by getSession()
+    sessionLock = threading.Lock()  # guards creation and teardown of the session
 
     # Class methods
     def __init__(self):
@@ -81,10 +101,63 @@ class WPTotal:
             'http': self.httpProxy,
             'https': self.httpsProxy
         }
+        self.closeSession()  # proxies are bound to the session, so force a rebuild on the next call
         return
 
     def disableProxies(self):
         self.proxies = {}
+        self.closeSession()  # proxies are bound to the session, so force a rebuild on the next call
+        return
+
+    def getSession(self):
+        '''Return the pooled keep-alive session used by wpTransact. The session is built on first use
+            with httpHeader and proxies bound to it, so every call reuses open TCP/TLS connections
+            rather than paying for a new handshake to the gateway.
+        '''
+        session = self.session
+        if session is None:
+            with self.sessionLock:
+                if self.session is None:
+                    self.session = self.createSession()
+                session = self.session
+        return session
+
+    def createSession(self):
+        '''Build a new requests Session using the current pool size, header, and proxy settings'''
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.poolConnections, pool_maxsize=self.poolSize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.httpHeader)
+        session.proxies.update(self.proxies)
+        log.debug("Created HTTP session. Pool connections: %d Pool size: %d", self.poolConnections, self.poolSize)
+        return session
+
+    def setPoolSize(self, size, connections=None):
+        '''Change the number of keep-alive connections held per host (and optionally the number of hosts).
+            The current session is closed and a new one is built on the next call.
+        '''
+        self.poolSize = size
+        if connections is not None:
+            self.poolConnections = connections
+        self.closeSession()
+        return
+
+    def closeSession(self):
+        '''Close the pooled session and all of its open connections'''
+        with self.sessionLock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+        return
+
+    def setHost(self, host):
+        '''Switch environments ("DEMO" or "IPC"). Recompiles the endpoint routing table for the new host'''
+        if host not in self.hostPrefix:
+            raise WpConfigurationError("unknown host " + str(host))
+        self.host = host
+        self.devAppId = {'developerId': self.devId, 'version': self.appVersion, 'integrationType': self.integrationType.get(self.host)}
+        WPTarget.compileRoutes(host)
         return
 
     def validateConfiguration(self):
@@ -96,16 +169,59 @@ class WPTotal:
             raise WpConfigurationError("publicKey not set")
 
         log.debug("merchantId:%s merchantKey:%s publicKey:%s", self.merchantId, self.merchantKey, self.publicKey)
-        log.debug("HTTP header used for this session:\n%s", pformat(self.httpHeader, indent=1))
+        log.debug("HTTP header used for this session:\n%s", lazyPformat(self.httpHeader, indent=1))
         return
 
 
 worldpay = WPTotal()  # base object for communicating with server
 
 
+class WpRoute(namedtuple('WpRoute', 'operation method verb template paramCount')):
+    '''This is the immutable, precompiled description of one API endpoint.
+        operation - canonical operation name
+        method - wpPost, wpGet, wpPut, or wpDelete
+        verb - HTTP verb string handed to the session
+        template - full url with %s in place of each path parameter
+        paramCount - number of path parameters (0, 1, or 2) the url requires
+    '''
+    __slots__ = ()
+
+    def url(self, p1=None, p2=None):
+        '''Fill in the path parameters and return the endpoint. Extra parameters are ignored.
+            Raises:
+                WpInvalidEndpointError - a required parameter is missing or contains a character that would change the path
+        '''
+        n = self.paramCount
+        if n == 0:
+            return self.template
+        if n == 1:
+            return self.template % (pathParameter(self.operation, p1, p1, p2),)
+        return self.template % (pathParameter(self.operation, p1, p1, p2), pathParameter(self.operation, p2, p1, p2))
+
+
+def pathParameter(operation, p, p1, p2):
+    '''Validate a single path parameter and return it as a string. Not intended for use outside of this module.'''
+    if p is not None:
+        s = str(p)
+        if s and not invalidPathCharacters.intersection(s):
+            return s
+    errMsg = "Operation: " + operation
+    if p1 is not None:
+        errMsg += " p1: " + str(p1)
+        if p2 is not None:
+            errMsg += " p2: " + str(p2)
+    log.error("Invalid endpoint. %s", errMsg)
+    raise WpInvalidEndpointError(errMsg)
+
+
+invalidPathCharacters = frozenset("/?#")  # any of these in an id would change the meaning of the url
+
+
 class WPTarget:
     '''This module local class is used to associate the proper endpoint URI with the operation name
-        The main call is getURL(). It is not intended to be called outside of this module.
+        The routing table is compiled once, when the module is imported, into an immutable WpRoute per
+        operation. Call route() to look one up and WpRoute.url() to fill in its path parameters.
+        Call compileRoutes() again if the host is changed (WPTotal.setHost does this for you).
     '''
 
     wpPost = 1  # Constants - do not change
@@ -113,16 +229,17 @@ class WPTarget:
     wpDelete = 3
     wpPut = 4
 
-    method = 0  # wpPost, wpGet, wpDelete, or wpPut
+    verbs = {wpPost: "POST", wpGet: "GET", wpPut: "PUT", wpDelete: "DELETE"}
 
-    # This is the translation dictionary. While all operationsare in lowercase, any case will work on invocation.
+    # This is the translation table. Paths are relative to WPTotal.hostPrefix for the current host.
+    # XXX and YYY mark the first and second path parameters. Any case of the operation name will work on invocation.
     url = {
         # SecureNet Credit Card Present
-        "authorize": (worldpay.hostPrefix.get(worldpay.host) + "Authorize", wpPost),
-        "priorauthcapture": ("https://gwapi.demo.securenet.com/api/Payments/Capture", wpPost),
-        "charge": ("https://gwapi.demo.securenet.com/api/Payments/Charge", wpPost),
-        "credit": ("https://gwapi.demo.securenet.com/api/Payments/Credit", wpPost),
-        "verify": ("https://gwapi.demo.securenet.com/api/Payments/Verify", wpPost),
+        "Authorize": ("Payments/Authorize", wpPost),
+        "PriorAuthCapture": ("Payments/Capture", wpPost),
+        "Charge": ("Payments/Charge", wpPost),
+        "Credit": ("Payments/Credit", wpPost),
+        "Verify": ("Payments/Verify", wpPost),
 
         # SecureNet Credit Card Not Present
         # All payments on this page use the same Credit Card Present transactions
@@ -131,50 +248,84 @@ class WPTarget:
         # All payments on this page use the "charge" transaction
 
         # SecureNet Settlement page
-        "closebatch": ("https://gwapi.demo.securenet.com/api/Batches/Close", wpPost),
-        "getbatchbyid": ("https://gwapi.demo.securenet.com/api/Batches/XXX", wpGet),
-        "getbatch": ("https://gwapi.demo.securenet.com/api/Batches/Current", wpGet),
+        "CloseBatch": ("Batches/Close", wpPost),
+        "GetBatchById": ("Batches/XXX", wpGet),
+        "GetBatch": ("Batches/Current", wpGet),
 
         # SecureNet Credits page
         # All payments on this page use the "credit" transaction
 
         # SecureNet Refunds page
-        "refund": ("https://gwapi.demo.securenet.com/api/Payments/Refund", wpPost),
+        "Refund": ("Payments/Refund", wpPost),
 
         # SecureNet Voids page
-        "void": ("https://gwapi.demo.securenet.com/api/Payments/Void", wpPost),
+        "Void": ("Payments/Void", wpPost),
 
         # SecureNet Tokenization page
-        "createtoken": ("https://gwapi.demo.securenet.com/api/PreVault/Card", wpPost),
+        "CreateToken": ("PreVault/Card", wpPost),
 
         # SecureNet Vault page
-        "createcustomer": ("https://gwapi.demo.securenet.com/api/Customers", wpPost),
-        "getcustomer": ("https://gwapi.demo.securenet.com/api/Customers/XXX", wpGet),
-        "updatecustomer": ("https://gwapi.demo.securenet.com/api/Customers/XXX", wpPut),
-        "createpaymentaccount": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentMethod", wpPost),
-        "getpaymentaccount": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentMethod/YYY", wpGet),
-        "updatepaymentaccount": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentMethod/YYY", wpPut),
-        "deletepaymentaccount": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentMethod/YYY", wpDelete),
-        "createcustomerandpayment": ("https://gwapi.demo.securenet.com/api/Customers/Payments", wpPost),
-        "updatecustomerandpayment": ("https://gwapi.demo.securenet.com/api/Customers/XXX/Payments", wpPut),
+        "CreateCustomer": ("Customers", wpPost),
+        "GetCustomer": ("Customers/XXX", wpGet),
+        "UpdateCustomer": ("Customers/XXX", wpPut),
+        "CreatePaymentAccount": ("Customers/XXX/PaymentMethod", wpPost),
+        "GetPaymentAccount": ("Customers/XXX/PaymentMethod/YYY", wpGet),
+        "UpdatePaymentAccount": ("Customers/XXX/PaymentMethod/YYY", wpPut),
+        "DeletePaymentAccount": ("Customers/XXX/PaymentMethod/YYY", wpDelete),
+        "CreateCustomerAndPayment": ("Customers/Payments", wpPost),
+        "UpdateCustomerAndPayment": ("Customers/XXX/Payments", wpPut),
 
         # SecureNet Recurring Billing page
-        "createrecurringpaymentplan": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentSchedules/recurring", wpPost),
-        "updaterecurringpaymentplan": ("https://gwapi.demo.securenet.com/api/customers/XXX/PaymentSchedules/recurring/YYY", wpPut),
-        "createinstallmentpaymentplan": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentSchedules/Installment", wpPost),
-        "updateinstallmentpaymentplan": ("https://gwapi.demo.securenet.com/api/customers/XXX/PaymentSchedules/installment/YYY", wpPut),
-        "createvariablepaymentplan": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentSchedules/Variable", wpPost),
-        "updatevariablepaymentplan": ("https://gwapi.demo.securenet.com/api/customers/XXX/PaymentSchedules/variable/YYY", wpPut),
-        "getpaymentplan": ("https://gwapi.demo.securenet.com/api/Customers/XXX/PaymentSchedules/YYY", wpGet),
+        "CreateRecurringPaymentPlan": ("Customers/XXX/PaymentSchedules/recurring", wpPost),
+        "UpdateRecurringPaymentPlan": ("customers/XXX/PaymentSchedules/recurring/YYY", wpPut),
+        "CreateInstallmentPaymentPlan": ("Customers/XXX/PaymentSchedules/Installment", wpPost),
+        "UpdateInstallmentPaymentPlan": ("customers/XXX/PaymentSchedules/installment/YYY", wpPut),
+        "CreateVariablePaymentPlan": ("Customers/XXX/PaymentSchedules/Variable", wpPost),
+        "UpdateVariablePaymentPlan": ("customers/XXX/PaymentSchedules/variable/YYY", wpPut),
+        "GetPaymentPlan": ("Customers/XXX/PaymentSchedules/YYY", wpGet),
 
         # SecureNet Transaction Reporting and Management Page
-        "searchtransactions": ("https://gwapi.demo.securenet.com/api/Transactions/Search", wpPost),
-        "gettransaction": ("https://gwapi.demo.securenet.com/api/Transactions/XXX", wpGet),
-        "updatetransaction": ("https://gwapi.demo.securenet.com/api/transactions/XXX", wpPut),
+        "SearchTransactions": ("Transactions/Search", wpPost),
+        "GetTransaction": ("Transactions/XXX", wpGet),
+        "UpdateTransaction": ("transactions/XXX", wpPut),
     }
 
-    def __init__(self):
-        pass
+    routes = {}  # compiled table. Indexed by both the canonical and the lowercase operation name
+
+    @classmethod
+    def compileRoutes(cls, host):
+        '''Build the routing table for a host ("DEMO" or "IPC"). Called once at import.'''
+        prefix = worldpay.hostPrefix.get(host)
+        if prefix is None:
+            raise WpConfigurationError("unknown host " + str(host))
+        routes = {}
+        for op, (path, method) in cls.url.iteritems():
+            if "YYY" in path:
+                paramCount = 2
+            elif "XXX" in path:
+                paramCount = 1
+            else:
+                paramCount = 0
+            template = prefix + path.replace("%", "%%").replace("XXX", "%s").replace("YYY", "%s")
+            route = WpRoute(op, method, cls.verbs[method], template, paramCount)
+            routes[op] = route
+            routes[op.lower()] = route
+        cls.routes = routes  # swap in the whole table at once so concurrent lookups never see a partial one
+        log.debug("Compiled %d routes for host %s", len(cls.url), host)
+
+    @classmethod
+    def route(cls, o):
+        '''Return the WpRoute for an operation name in any case.
+            Raises:
+                WpInvalidEndpointError
+        '''
+        routes = cls.routes
+        route = routes.get(o)
+        if route is None:
+            route = routes.get(o.lower())
+            if route is None:
+                raise WpInvalidEndpointError("Operation: " + o.lower())
+        return route
 
     def getURL(self, o, p1=None, p2=None):
         '''This will retrieve the API endpoint. It uses variable args,
@@ -189,66 +340,22 @@ class WPTarget:
                 WPInvalidEndpointError
             This function is not intended for use outside of this moduel.
         '''
+        return self.route(o).url(p1, p2)
+
 
-        op = o.lower()  # op is the operation requested, in a string, formed to lowercase just to avoid calling errors
-
-        validRequest = op in self.url  # test to make sure it is in the supported operations list
-        if validRequest is False:
-            errMsg = "Operation: " + op
-            if p1 is not None:
-                errMsg += " p1: " + str(p1)
-                if p2 is not None:
-                    errMsg += " p2: " + str(p2)
-            raise WpInvalidEndpointError(errMsg)
-        else:
-            a = self.url[op]
-            t = a[0]  # This is the target url
-            self.method = a[1]  # this specifies the type of transaction
-            method = ""
-            if self.method == self.wpGet:
-                method = "Get"
-            if self.method == self.wpPost:
-                method = "Post"
-            if self.method == self.wpPut:
-                method = "Put"
-            if self.method == self.wpDelete:
-                method = "Delete"
-            log.debug("Method: %s Url: %s", method, t)
-
-        endpoint = ""
-
-        if t.find("YYY") >= 0:
-            if (p1 is not None) and (p2 is not None):
-                s = t.replace('XXX', p1)
-                endpoint = s.replace('YYY', p2)
-
-        elif t.find("XXX") >= 0:
-            if p1 is not None:  # We'll ignore any p2 if provided
-                endpoint = t.replace('XXX', str(p1))
-        else:
-            endpoint = t
-
-        log.debug("translated url lookup: %s", endpoint)
-
-        if endpoint == "":
-            errMsg = "Operation: " + op
-            if p1 is not None:
-                errMsg = errMsg + " p1: " + p1
-                if p2 is not None:
-                    errMsg = errMsg + " p2: " + p2
-            log.error("Invalid endpoint. %s", errMsg)
-            raise WpInvalidEndpointError(errMsg)
-        else:
-            return endpoint
+WPTarget.compileRoutes(worldpay.host)
 
 
 def wpTransact(operation, payload, *args):
     ''' This function makes the REST call. Input and output are dictionary objects.
         input:
-            operation = String that identifies the operation (see 'url' above)
+            operation = String that identifies the operation (see WPTarget.url above)
             payload = Dictionary that represents the data to be sent to the operation endpoint
         returns:
             Dictionary of the response
+        Timeouts and connection errors are retried under the operation's policy in wpretry.py.
+        Posts that create a transaction are only retried if the payload carries an orderId.
+        Each operation is guarded by a circuit breaker (see wpcircuit.py) and paced by its traffic class (see wpthrottle.py).
         raise:
             WpInvalidEndpoint
             WpTimeoutError
@@ -256,11 +363,12 @@ def wpTransact(operation, payload, *args):
             WpTooManyRedirectsError
             WpHTTPError
             WpJSONError
+            WpCircuitOpenError
     '''
-    target = WPTarget()  # API endpoint class
+    route = WPTarget.route(operation)  # precompiled endpoint for this operation
 
     if len(payload):
-        transactionJSON = dumps(payload)  # Convert payload dictionary to JSON
+        transactionJSON = dumps(payload)  # Convert payload dictionary to JSON with the fastest installed codec
     else:  # some transactions don't have a payload
         transactionJSON = ""
 
@@ -274,59 +382,60 @@ def wpTransact(operation, payload, *args):
         p1 = None
         p2 = None
 
-    # Get the registered endpoint
-    try:
-        url = target.getURL(operation, p1, p2)
-    except:
-        raise
+    # Fill in the registered endpoint
+    url = route.url(p1, p2)
 
     log.info(">>>>>>>>>>>>>>>>>>> %s %s >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>", operation, strftime("%T", localtime()))
-    log.info(">>>Payload>>> \n%s\n", pformat(payload, indent=1))
+    log.info(">>>Payload>>> \n%s\n", lazyPformat(payload, indent=1))
     log.info(">>>Target>>> \n%s", url)
 
-    log.info(">>>HTTP header>>> \n%s", pformat(worldpay.httpHeader, indent=1))
+    log.info(">>>HTTP header>>> \n%s", lazyPformat(worldpay.httpHeader, indent=1))
 
-    # Make the API call
+    session = worldpay.getSession()  # pooled keep-alive session. Header and proxies are already bound to it
+
+    # Make the API call. Transient failures are retried if the call is safe to repeat (see wpretry.py)
     log.debug("JSON Request: \n%s\n", transactionJSON)
-    try:
-        if target.method == target.wpPost:  # is a post operation
-            log.info(">>>Post>>>")
-            responseJSON = requests.post(url, headers=worldpay.httpHeader, data=transactionJSON, proxies=worldpay.proxies, timeout=worldpay.timeout)
-        elif target.method == target.wpGet:  # it is a get operation
-            log.info(">>>Get>>>")
-            responseJSON = requests.get(url, headers=worldpay.httpHeader, data=transactionJSON, proxies=worldpay.proxies, timeout=worldpay.timeout)
-        elif target.method == target.wpPut:  # it is an update operation
-            log.info(">>>Put>>>")
-            responseJSON = requests.put(url, headers=worldpay.httpHeader, data=transactionJSON, proxies=worldpay.proxies, timeout=worldpay.timeout)
-        elif target.method == target.wpDelete:  # it is a get operation
-            log.info(">>>Delete>>>")
-            responseJSON = requests.delete(url, headers=worldpay.httpHeader, data=transactionJSON, proxies=worldpay.proxies, timeout=worldpay.timeout)
-        else:
-            errMsg = "Operation: " + operation
-            if p1 is not None:
-                errMsg = errMsg + " p1: " + p1
-            if p2 is not None:
-                errMsg = errMsg + " p2: " + p2
-            raise WpInvalidEndpointError(errMsg)
-
-        responseJSON.raise_for_status  # make anything other than a 200 cause an exception
-
-    except requests.exceptions.Timeout:
-        raise WpTimeoutError(operation)
-
-    except requests.exceptions.ConnectionError:
-        raise WpConnectionError(operation)
-
-    except requests.exceptions.TooManyRedirects:
-        raise WpTooManyRedirectsError(operation)
-
-    except requests.exceptions.HTTPError as e:
-        raise WpHTTPError(e)
-
-    log.debug("JSON Response: \n%s\n", responseJSON.text)
+
+    def send():
+        try:
+            log.info(">>>%s>>>", route.verb)
+            responseJSON = session.request(route.verb, url, data=transactionJSON, timeout=worldpay.timeout)
+
+            responseJSON.raise_for_status  # make anything other than a 200 cause an exception
+            return responseJSON
+
+        except requests.exceptions.Timeout:
+            raise WpTimeoutError(operation)
+
+        except requests.exceptions.ConnectionError:
+            raise WpConnectionError(operation)
+
+        except requests.exceptions.TooManyRedirects:
+            raise WpTooManyRedirectsError(operation)
+
+        except requests.exceptions.HTTPError as e:
+            raise WpHTTPError(e)
+
+        except (requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema, requests.exceptions.InvalidURL) as e:
+            raise WpInvalidEndpointError(operation + " " + url + ": " + str(e))  # check hostPrefix for the host in use
+
+        except requests.exceptions.RequestException as e:  # anything else requests raises, so callers only see Wp exceptions
+            raise WpConnectionError(operation + ": " + str(e))
+
+    def serverError(response):  # a 5xx means the gateway itself is in trouble and counts against its circuit
+        return response.status_code >= 500
+
+    breaker = getBreaker(operation)  # fails fast with WpCircuitOpenError while the endpoint is unhealthy
+    idempotent = isIdempotent(operation, route.method == WPTarget.wpPost, payload)
+    responseJSON = retryCall(operation, idempotent, lambda: governor.call(operation, lambda: breaker.call(send, serverError)))
+
+    log.debug("JSON Response: \n%s\n", responseJSON.content)
     if (responseJSON.status_code == requests.codes.ok):  # If result is good, convert to Dict and return
-        ret = loads(responseJSON.text)
-        log.info(">>>Response>>> \n%s\n", pformat(ret, indent=1))
+        try:
+            ret = loads(responseJSON.content)  # decode straight from the body bytes (see wpcodec.py)
+        except ValueError:
+            raise WpJSONError("Response to " + operation + " is not valid JSON")
+        log.info(">>>Response>>> \n%s\n", lazyPformat(ret, indent=1))
 
         if worldpay.doubleSecretProbation is not None:  # For now, if requested, dump return headers to a special file
             h = '*' * 20 + operation + '*' * 20 + '\n'
@@ -7,78 +7,55 @@
         SearchTransactionsRequest - find transactions meeting provided criteria
         GetTransactionRequest - Retrieve an individual transaction by its transaction id
         UpdateTransactionRequest - Update an existing transaction
+
+    The fields of each class are declared in 'fields' and serialized by WpRecord (see wprecord.py)
 '''
 
 import logging
 
 from wptotal import worldpay
+from wprecord import WpRecord
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
 
-class SearchTransactionsRequest(object):
+class SearchTransactionsRequest(WpRecord):
     '''This is the main class to be used when performing a search transaction'''
-
-    def __init__(self):
-        log.debug("SearchTransactionsRequest class:")
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
         # Conditional
-        self.startDate = ""
-        self.endDate = ""
+        ("startDate", ""),
+        ("endDate", ""),
         # Optional
-        self.transactionId = 0
-        self.orderId = 0.0  # Fix - is this really decimal or should it be number?
-        self.amount = 0.0
-        self.customerId = ""
+        ("transactionId", 0),
+        ("orderId", 0.0),  # Fix - is this really decimal or should it be number?
+        ("amount", 0.0),
+        ("customerId", "")
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId  # This always needs to be added
-        s = {
-            "developerApplication": self.developerApplication,
-            "startDate": self.startDate,
-            "endDate": self.endDate,
-            "transactionId": self.transactionId,
-            "orderId": self.orderId,
-            "amount": self.amount,
-            "customerId": self.customerId
-
-        }
+        return self.serializeFields()
 
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an empty value
-        return d
 
-
-class UpdateTransactionRequest(object):
+class UpdateTransactionRequest(WpRecord):
     '''This is the main class to be used when updating a transaction'''
-
-    def __init__(self):
-        log.debug("UpdateTransactionRequest class:")
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
-        self.referenceTransactionId = 0
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
+        ("referenceTransactionId", 0),
         # Conditional
-        self.signatureImage = ""  # !!Doc!! say array of bytes, but suspect it is reaaly a binary blob - fix
-        self.email = ""
-        self.emailReceipt = False
-        self.levelTwoData = {}
-        self.levelThreeData = {}
+        ("signatureImage", ""),  # !!Doc!! say array of bytes, but suspect it is reaaly a binary blob - fix
+        ("email", ""),
+        ("emailReceipt", False),
+        ("levelTwoData", {}),
+        ("levelThreeData", {})
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId  # This always needs to be added
-        s = {
-            "developerApplication": self.developerApplication,
-            "developerApplication": self.developerApplication,
-            "referenceTransactionId": self.referenceTransactionId,
-            "levelTwoData": self.levelTwoData,
-            "levelThreeData": self.levelThreeData,
-            "signatureImage": self.signatureImage,
-            "email": self.email,
-            "emailReceipt": self.emailReceipt,
-        }
-
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an empty value
-        return d
+        return self.serializeFields()
 
     def attachLevelTwoData(self, ltd):
         ''' attach a LevelTwoData object to the current object. ltd is the LevelThreeData object'''
@@ -0,0 +1,302 @@
+#!/usr/bin/python
+
+''' This is the local index of transactions, kept in a SQLite file (stdlib sqlite3).
+    Search, get, and batch responses are written into it as they arrive, so support dashboards and
+    refund tooling can look transactions up locally instead of calling the gateway each time.
+
+    Each transaction is stored once, keyed by transactionId, as the raw record returned by the gateway
+    plus the columns used to find it: customerId, orderId, batchId, date, and amount.
+
+    Freshness policy:
+        - a settled transaction (settlementData carries a batchId) will not change again,
+          so it is served from the store for as long as it is there
+        - an unsettled transaction is only served if it was fetched within maxAge seconds.
+          After that, get() reports a miss and the caller goes back to the gateway
+        - forget() drops a transaction outright. forgetTransaction() does so on the shared store after
+          anything that changes one: PriorAuthCapture, Void, Refund, and UpdateTransaction
+
+    The store is off unless WPTotal.transactionStoreFile names a file. It holds customer, card, and
+    transaction details, so keep it somewhere only the merchant's own tools can read.
+
+    Closed batches written with putBatch() are remembered, so bulk batch retrieval (see wpbatchhistory.py)
+    can skip the ones it already has. The store also keeps named marks, small JSON values that survive between runs. Incremental sync
+    (see wpsync.py) keeps its high-water mark there.
+
+    Main Functions
+        getTransactionStore - return the store at WPTotal.transactionStoreFile, opening it on first use
+        closeTransactionStore - close that store
+        forgetTransaction - drop a transaction from that store, if it is open
+    Main Classes
+        WpTransactionStore - a SQLite file of transactions
+
+    Example:
+        store = getTransactionStore()
+        store.put(rp.transactions)
+        t = store.get(tid)  # None if it has to come from the gateway
+        refunds = store.find(customerId="5001", start=datetime.date(2017, 9, 1))
+'''
+
+import logging
+import sqlite3
+import threading
+import time
+import datetime
+
+from wpcodec import dumps, loads
+from wptotal import worldpay
+from wpresponseobjects import Transaction, LazyList, rawTransactions
+from wpexceptions import WpStoreError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+schema = (
+    '''CREATE TABLE IF NOT EXISTS transactions (
+        transactionId INTEGER PRIMARY KEY,
+        customerId TEXT,
+        orderId TEXT,
+        batchId INTEGER,
+        date TEXT,
+        amount REAL,
+        settled INTEGER NOT NULL,
+        fetched REAL NOT NULL,
+        record TEXT NOT NULL)''',
+    "CREATE INDEX IF NOT EXISTS transactionsCustomer ON transactions (customerId)",
+    "CREATE INDEX IF NOT EXISTS transactionsOrder ON transactions (orderId)",
+    "CREATE INDEX IF NOT EXISTS transactionsBatch ON transactions (batchId)",
+    "CREATE INDEX IF NOT EXISTS transactionsDate ON transactions (date)",
+    "CREATE INDEX IF NOT EXISTS transactionsAmount ON transactions (amount)",
+    "CREATE TABLE IF NOT EXISTS marks (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS batches (batchId INTEGER PRIMARY KEY, batchCount INTEGER, fetched REAL NOT NULL)",
+)
+
+
+def transactionRow(d, fetched):
+    ''' Return the column values for one raw transaction record. Not intended for use outside of this module. '''
+    data = d.get("transactionData") or {}
+    settlement = d.get("settlementData") or {}
+    batchId = settlement.get("batchId")
+    amount = data.get("amount")
+    if amount is None:
+        amount = d.get("authorizedAmount")
+    customerId = d.get("customerId")
+    orderId = d.get("orderId")
+    return (d["transactionId"],
+            str(customerId) if customerId is not None else None,
+            str(orderId) if orderId is not None else None,
+            batchId, data.get("date"), amount,
+            1 if batchId else 0, fetched, dumps(d))
+
+
+def withoutNone(v):
+    ''' Return a record with its None values dropped, at every level. Building a Transaction fills in None for every
+        missing key, so records are compared this way. Not intended for use outside of this module.
+    '''
+    if isinstance(v, dict):
+        return dict((k, withoutNone(x)) for k, x in v.iteritems() if x is not None)
+    if isinstance(v, list):
+        return [withoutNone(x) for x in v]
+    return v
+
+
+def dayString(day):
+    ''' Return a date as the ISO string the date column is compared with. Not intended for use outside of this module. '''
+    return day.isoformat() if isinstance(day, (datetime.date, datetime.datetime)) else str(day)
+
+
+class WpTransactionStore(object):
+    '''This is a SQLite file of transactions, safe to share between threads.
+        Attributes:
+            path - the SQLite file, or ":memory:"
+            maxAge - seconds an unsettled transaction is served from the store after it was fetched
+    '''
+    maxAge = 300
+
+    def __init__(self, path, maxAge=None):
+        self.path = path
+        if maxAge is not None:
+            self.maxAge = maxAge
+        self.lock = threading.Lock()
+        try:
+            self.db = sqlite3.connect(path, check_same_thread=False)  # every use is serialized by self.lock
+            with self.db:
+                for statement in schema:
+                    self.db.execute(statement)
+        except sqlite3.Error as e:
+            raise WpStoreError(path + ": " + str(e))
+        log.debug("Opened transaction store: %s", path)
+
+    def execute(self, sql, args=(), many=False):
+        ''' Run one statement under the lock, inside its own database transaction. Returns the fetched rows.
+            Not intended for use outside of this class.
+        '''
+        with self.lock:
+            try:
+                with self.db:
+                    if many:
+                        self.db.executemany(sql, args)
+                        return []
+                    return self.db.execute(sql, args).fetchall()
+            except sqlite3.Error as e:
+                raise WpStoreError(self.path + ": " + str(e))
+
+    def put(self, transactions):
+        ''' Add or replace transactions.
+            Input:
+                transactions - iterable of Transaction objects or raw transaction dictionaries
+                               (a LazyList is written without building its Transaction objects)
+            Output:
+                number of transactions written
+        '''
+        now = time.time()
+        rows = [transactionRow(d, now) for d in rawTransactions(transactions)]
+        if rows:
+            self.execute("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows, many=True)
+            log.debug("Stored %d transactions", len(rows))
+        return len(rows)
+
+    def putChanged(self, transactions):
+        ''' Add transactions that aren't stored yet and replace those whose record has changed. Identical ones are left alone.
+            Input:
+                transactions - as for put()
+            Output:
+                (added, changed) counts
+        '''
+        raw = rawTransactions(transactions)
+        stored = {}
+        for i in xrange(0, len(raw), 500):  # stay well under SQLite's limit on query parameters
+            ids = [int(d["transactionId"]) for d in raw[i:i + 500]]
+            sql = "SELECT transactionId, record FROM transactions WHERE transactionId IN (" + ",".join("?" * len(ids)) + ")"
+            stored.update(self.execute(sql, ids))
+
+        added = changed = 0
+        write = []
+        for d in raw:
+            record = stored.get(int(d["transactionId"]))
+            if record is None:
+                added += 1
+            elif withoutNone(loads(record)) != withoutNone(d):
+                changed += 1
+            else:
+                continue
+            write.append(d)
+        self.put(write)
+        return added, changed
+
+    def putBatch(self, rp):
+        ''' Store the transactions of a closed batch, then record the batch itself as stored.
+            Input:
+                rp - BatchResponseParameters from GetBatchById
+            Output:
+                number of transactions written
+        '''
+        n = self.put(rp.transactions)
+        self.execute("INSERT OR REPLACE INTO batches VALUES (?, ?, ?)", (int(rp.batchId), rp.batchCount, time.time()))
+        return n
+
+    def hasBatch(self, batchId):
+        ''' True if the closed batch has been stored with putBatch() '''
+        return bool(self.execute("SELECT 1 FROM batches WHERE batchId = ?", (int(batchId),)))
+
+    def get(self, transactionId):
+        ''' Return a transaction if the store can answer for it.
+            Output:
+                Transaction, or None if it isn't stored, or it is unsettled and older than maxAge
+        '''
+        rows = self.execute("SELECT settled, fetched, record FROM transactions WHERE transactionId = ?", (int(transactionId),))
+        if not rows:
+            return None
+        settled, fetched, record = rows[0]
+        if not settled and time.time() - fetched > self.maxAge:
+            log.debug("Transaction %s is stale", transactionId)
+            return None
+        return Transaction(loads(record))
+
+    def find(self, customerId=None, orderId=None, batchId=None, start=None, end=None, minAmount=None, maxAmount=None):
+        ''' Look transactions up in the store only. Every criterion given must match.
+            Input:
+                customerId, orderId, batchId - exact matches
+                start, end - first and last day of the transaction date (datetime.date), inclusive
+                minAmount, maxAmount - amount range, inclusive
+            Output:
+                read-only list of Transaction objects in time order (see LazyList)
+        '''
+        where = []
+        args = []
+        for column, value in (("customerId", customerId), ("orderId", orderId), ("batchId", batchId)):
+            if value is not None:
+                where.append(column + " = ?")
+                args.append(value if column == "batchId" else str(value))
+        if start is not None:
+            where.append("date >= ?")
+            args.append(dayString(start))
+        if end is not None:
+            where.append("date < ?")  # before the following day, so times on the last day are included
+            args.append(dayString(end + datetime.timedelta(days=1)) if isinstance(end, datetime.date) else dayString(end))
+        if minAmount is not None:
+            where.append("amount >= ?")
+            args.append(minAmount)
+        if maxAmount is not None:
+            where.append("amount <= ?")
+            args.append(maxAmount)
+
+        sql = "SELECT record FROM transactions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY date, transactionId"
+        return LazyList([loads(row[0]) for row in self.execute(sql, args)], 'Transaction')
+
+    def forget(self, transactionId):
+        ''' Drop a transaction so the next get() goes back to the gateway '''
+        self.execute("DELETE FROM transactions WHERE transactionId = ?", (int(transactionId),))
+
+    def getMark(self, name):
+        ''' Return the value saved by setMark(name), or None '''
+        rows = self.execute("SELECT value FROM marks WHERE name = ?", (name,))
+        return loads(rows[0][0]) if rows else None
+
+    def setMark(self, name, value):
+        ''' Save a JSON serializable value under name, replacing any previous one '''
+        self.execute("INSERT OR REPLACE INTO marks VALUES (?, ?)", (name, dumps(value)))
+
+    def count(self):
+        return self.execute("SELECT COUNT(*) FROM transactions")[0][0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+transactionStore = None
+storeLock = threading.Lock()  # guards opening and closing transactionStore
+
+
+def getTransactionStore():
+    ''' Return the store at WPTotal.transactionStoreFile, opening it on first use.
+        Output:
+            WpTransactionStore, or None if transactionStoreFile is None (the store is turned off)
+        Raises:
+            WpStoreError - the file could not be opened
+    '''
+    global transactionStore
+    if transactionStore is None and worldpay.transactionStoreFile:
+        with storeLock:
+            if transactionStore is None:
+                transactionStore = WpTransactionStore(worldpay.transactionStoreFile)
+    return transactionStore
+
+
+def closeTransactionStore():
+    global transactionStore
+    with storeLock:
+        if transactionStore is not None:
+            transactionStore.close()
+            transactionStore = None
+
+
+def forgetTransaction(tid):
+    ''' Drop a transaction from the shared store so the next doGetTransaction goes back to the gateway.
+        Does nothing if the store is turned off.
+    '''
+    store = getTransactionStore()
+    if store is not None:
+        store.forget(tid)
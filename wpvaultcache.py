@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+''' This is the read-through cache for vault customers and payment accounts.
+    A checkout typically reads the same customer's vault record several times in one session. With the
+    cache, only the first GetCustomer or GetPaymentAccount goes to the gateway and the rest are answered locally.
+
+    Entries are the response dictionaries returned by wpTransact(), keyed by customerId for customers and by
+    (customerId, paymentMethodId) for payment accounts. Only successful responses (responseCode 1) are kept.
+    They are held encoded, and every read decodes a fresh copy, so a caller (or a Response Object, which
+    fills in missing keys) can change the dictionary it gets without changing what the next reader sees.
+    An entry expires after ttl seconds, and once the cache holds maxEntries the least recently used entry
+    is dropped to make room.
+
+    Invalidation:
+        Any write to a customer (update, payment account create, update, or delete, payment plan create or
+        update) must call forgetCustomer(cid). That drops the customer and every payment account cached
+        under it, since a customer record lists its payment methods and plans. A read that was already in flight when a write
+        happened is not cached, so it can't put back the data the write replaced.
+
+    Main Functions
+        customerKey / accountKey - the cache keys of a customer and a payment account
+    Global Variables
+        vaultCache - the shared WpVaultCache, sized by WPTotal.vaultCacheSize and WPTotal.vaultCacheSeconds
+    Main Classes
+        WpVaultCache - LRU cache with expiry
+
+    Example:
+        response = vaultCache.read(customerKey(cid), lambda: wpTransact("GetCustomer", "", cid))
+        ...
+        vaultCache.forgetCustomer(cid)  # after UpdateCustomer
+'''
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from wptotal import worldpay
+from wpcodec import dumps, loads
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+
+def customerKey(cid):
+    return ("customer", str(cid))
+
+
+def accountKey(cid, pid):
+    return ("account", str(cid), str(pid))
+
+
+class WpVaultCache(object):
+    '''This is a thread safe LRU cache whose entries expire.
+        Attributes:
+            maxEntries - most entries held. 0 turns the cache off
+            ttl - seconds an entry is served after it was stored
+            hits, misses - counts since the cache was created
+        Methods:
+            read(key, load) - return the cached response for key, or call load() and cache what it returns
+            forgetCustomer(cid) - drop a customer and all of its payment accounts
+            clear() - drop everything
+    '''
+
+    def __init__(self, maxEntries, ttl):
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key: (expires, encoded response), least recently used first
+        self.lock = threading.Lock()
+        self.generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        ''' Return a copy of the cached response for key, or None if it is missing or expired '''
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.entries[key] = entry  # now the most recently used
+            self.hits += 1
+        return loads(entry[1])  # a fresh dictionary for every reader
+
+    def put(self, key, response, generation=None):
+        ''' Cache a response. It is ignored if it failed, or if anything was invalidated since generation was read '''
+        if not self.maxEntries or response.get("responseCode") != 1:
+            return
+        encoded = dumps(response)  # later changes to response don't reach the cache
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.ttl, encoded)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def read(self, key, load):
+        ''' Return the cached response for key. On a miss, call load() for it and cache the result.
+            Exceptions raised by load() are passed up and nothing is cached.
+        '''
+        response = self.get(key)
+        if response is not None:
+            log.debug("Vault cache hit: %s", key)
+            return response
+        generation = self.generation
+        response = load()
+        self.put(key, response, generation)
+        return response
+
+    def forget(self, key):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def forgetCustomer(self, cid):
+        cid = str(cid)
+        with self.lock:
+            self.generation += 1
+            for key in [k for k in self.entries if k[1] == cid]:
+                del self.entries[key]
+        log.debug("Vault cache dropped customer %s", cid)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+vaultCache = WpVaultCache(worldpay.vaultCacheSize, worldpay.vaultCacheSeconds)
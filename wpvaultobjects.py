@@ -9,53 +9,38 @@
         PaymentAccountRequest - used for create, get, update and delete payment account
         CustomerAndPaymentRequest - used for create and update customer and payment account
 
+    The fields of each class are declared in 'fields' and serialized by WpRecord (see wprecord.py)
 '''
 import logging
 
 from wptotal import worldpay
+from wprecord import WpRecord
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
 
-class CustomerRequest(object):
+class CustomerRequest(WpRecord):
     '''This is the class used for create, get and update customer '''
-
-    def __init__(self):
-        log.debug("CustomerRequest class:")
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
-        self.firstName = ""  # optional in Update
-        self.lastName = ""  # optional in Update
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
+        ("firstName", ""),  # optional in Update
+        ("lastName", ""),  # optional in Update
         # Optional
-        self.customerId = ""  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
-        self.phoneNumber = ""
-        self.emailAddress = ""
-        self.sendEmailReceipts = ""
-        self.company = ""
-        self.notes = ""
-        self.customerDuplicateCheckIndicator = 0
-        self.address = {}  # serialized address class
-        self.userDefinedFields = []  # this is an array of UserDefinedField objects
+        ("customerId", ""),  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
+        ("phoneNumber", ""),
+        ("emailAddress", ""),
+        ("sendEmailReceipts", ""),
+        ("company", ""),
+        ("notes", ""),
+        ("customerDuplicateCheckIndicator", 0),
+        ("address", {}),  # serialized address class
+        ("userDefinedFields", [])  # this is an array of UserDefinedField objects
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId  # This always needs to be added
-        s = {
-            'developerApplication': self.developerApplication,
-            'firstName': self.firstName,
-            'lastName': self.lastName,
-            'customerId': self.customerId,
-            'phoneNumber': self.phoneNumber,
-            'emailAddress': self.emailAddress,
-            'sendEmailReceipts': self.sendEmailReceipts,
-            'company': self.company,
-            'notes': self.notes,
-            'customerDuplicateCheckIndicator': self.customerDuplicateCheckIndicator,
-            'address': self.address,
-            'userDefinedFields': self.userDefinedFields
-        }
-
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an empty value
-        return d
+        return self.serializeFields()
 
     def attachUserDefinedField(self, udf):
         ''' add another UserDefinedField to the array. There is a limit of 50 UDFs'''
@@ -66,42 +51,27 @@ class CustomerRequest(object):
         self.address = addr.serialize()
 
 
-class PaymentAccountRequest(object):
+class PaymentAccountRequest(WpRecord):
     '''This is the class used for create, get, update and delete payment account '''
-
-    def __init__(self):
-        log.debug("PaymentAccountRequest class:")
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
-        self.customerId = ""  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
+        ("customerId", ""),  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
         # Optional
-        self.paymentMethodId = ""
-        self.notes = ""
-        self.phone = ""
-        self.primary = ""
-        self.accountDuplicateCheckIndicator = 1
+        ("paymentMethodId", ""),
+        ("notes", ""),
+        ("phone", ""),
+        ("primary", ""),
+        ("accountDuplicateCheckIndicator", 1),
         # Conditional
-        self.card = {}  # serialized Card class
-        self.check = {}  # serialized Check Class
-        self.userDefinedFields = []  # this is an array of UserDefinedField objects
+        ("card", {}),  # serialized Card class
+        ("check", {}),  # serialized Check Class
+        ("userDefinedFields", [])  # this is an array of UserDefinedField objects
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId  # This always needs to be added
-        s = {
-            'developerApplication': self.developerApplication,
-            'customerId': self.customerId,
-            'paymentMethodId': self.paymentMethodId,
-            'notes': self.notes,
-            'phone': self.phone,
-            'primary': self.primary,
-            'accountDuplicateCheckIndicator': self.accountDuplicateCheckIndicator,
-            'card': self.card,
-            'check': self.check,
-            'userDefinedFields': self.userDefinedFields
-        }
-
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an emoty value
-        return d
+        return self.serializeFields()
 
     def attachCard(self, c):
         ''' attach a Card object to the this object. C is the Card object'''
@@ -116,53 +86,32 @@ class PaymentAccountRequest(object):
         self.userDefinedFields.append(udf.serialize())
 
 
-class CustomerAndPaymentRequest(object):
-    def __init__(self):
-        log.debug("CreateCustomerAndPaymentRequest class:")
+class CustomerAndPaymentRequest(WpRecord):
+    fields = (
         # Required
-        self.developerApplication = {}  # supplied by serialize. No need to fill this in
-        self.firstName = ""  # optional in Update
-        self.lastName = ""  # optional in Update
+        ("developerApplication", {}),  # supplied by serialize. No need to fill this in
+        ("firstName", ""),  # optional in Update
+        ("lastName", ""),  # optional in Update
         # Optional
-        self.customerId = ""  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
-        self.phoneNumber = ""
-        self.paymentMethodId = ""
-        self.emailAddress = ""
-        self.primary = ""
-        self.sendEmailReceipts = ""
-        self.company = ""
-        self.notes = ""
-        self.customerDuplicateCheckIndicator = 1
-        self.accountDuplicateCheckIndicator = 1
-        self.card = {}
-        self.check = {}
-        self.address = {}  # serialized address class
-        self.userDefinedFields = []  # this is an array of UserDefinedField objects
+        ("customerId", ""),  # mandatory in Update. Fill this in for Create if you want to manage your own customer ids.
+        ("phoneNumber", ""),
+        ("paymentMethodId", ""),
+        ("emailAddress", ""),
+        ("primary", ""),
+        ("sendEmailReceipts", ""),
+        ("company", ""),
+        ("notes", ""),
+        ("customerDuplicateCheckIndicator", 1),
+        ("accountDuplicateCheckIndicator", 1),
+        ("card", {}),
+        ("check", {}),
+        ("address", {}),  # serialized address class
+        ("userDefinedFields", [])  # this is an array of UserDefinedField objects
+    )
 
     def serialize(self):
         self.developerApplication = worldpay.devAppId  # This always needs to be added
-        s = {
-            'developerApplication': self.developerApplication,
-            'firstName': self.firstName,
-            'lastName': self.lastName,
-            'customerId': self.customerId,
-            'phoneNumber': self.phoneNumber,
-            'paymentMethodId': self.paymentMethodId,
-            'emailAddress': self.emailAddress,
-            'primary': self.primary,
-            'sendEmailReceipts': self.sendEmailReceipts,
-            'company': self.company,
-            'notes': self.notes,
-            'customerDuplicateCheckIndicator': self.customerDuplicateCheckIndicator,
-            'accountDuplicateCheckIndicator': self.accountDuplicateCheckIndicator,
-            'card': self.card,
-            'check': self.check,
-            'address': self.address,
-            'userDefinedFields': self.userDefinedFields
-        }
-
-        d = dict((k, v) for k, v in s.iteritems() if v)  # Remove any keys that have an empty value
-        return d
+        return self.serializeFields()
 
     def attachCard(self, c):
         ''' attach a Card object to this object. C is the Card object'''
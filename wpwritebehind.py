@@ -0,0 +1,310 @@
+#!/usr/bin/python
+
+''' This is the write-behind queue for vault updates.
+
+    A CRM often sends several changes to the same customer within a second or two: the email, then the
+    phone, then the address. Sent directly, each is its own UpdateCustomer call. Queued here instead, the
+    changes to each customer (or payment account) are merged as they arrive, and once window seconds have
+    passed since the first of them, a single UpdateCustomer or UpdatePaymentAccount carrying every changed
+    field is sent. A later change to a field replaces an earlier one.
+
+    Only the queued fields are sent. The Request Objects leave empty fields out of the request, so fields
+    that weren't changed are not touched by the update.
+
+    Durability:
+        Without a journal, queued changes live only in memory and are lost if the process dies before they
+        are sent. With a journal (a SQLite file), every change is committed to it before updateCustomer()
+        or updatePaymentAccount() returns, and it is only removed once the gateway has accepted it. Changes
+        still in the journal are queued again when it is next opened.
+
+    Failures:
+        Timeouts, connection errors, and open circuits keep the change queued, and it is tried again after
+        another window. Any other failure drops the change and records it in failures.
+
+    A successful UpdateCustomer drops the customer from the vault cache and from the fingerprint index
+    (see wpfingerprint.py). The index can't be given the new fingerprint from the changed fields alone.
+
+    Call flush() to send everything queued now, for example before shutting down. close() flushes and
+    stops the queue, and closeWriteBehind() is run at exit for the shared queue.
+
+    Main Functions
+        getWriteBehind - the shared queue, created on first use from WPTotal.writeBehindSeconds and WPTotal.writeBehindJournal
+        closeWriteBehind - flush and close the shared queue
+    Main Classes
+        WpWriteBehind - a coalescing queue of vault updates
+
+    Example:
+        queue = getWriteBehind()
+        queue.updateCustomer(cid, emailAddress="new@example.com")
+        queue.updateCustomer(cid, phoneNumber="512-555-0100")  # sent together with the email change
+        queue.flush()
+'''
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from wptotal import worldpay, wpTransact
+from wpbatch import wpRunBatch
+from wpretry import retryableErrors
+from wpvaultobjects import CustomerRequest, PaymentAccountRequest
+from wpvaultcache import vaultCache
+from wpfingerprint import getFingerprintIndex
+from wpexceptions import WpBadResponseError, WpCircuitOpenError, WpInvalidFunctionCallError, WpStoreError
+
+log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
+
+transientErrors = retryableErrors + (WpCircuitOpenError,)  # worth keeping the change queued for
+reservedFields = ("developerApplication", "customerId", "paymentMethodId")  # set by the queue, not by the caller
+
+
+def fieldValues(requestClass, fields):
+    ''' Check field names against a Request Object and serialize any object values (Address, Card, UserDefinedField).
+        Not intended for use outside of this module.
+    '''
+    values = {}
+    for name, value in fields.iteritems():
+        if name not in requestClass.__slots__ or name in reservedFields:
+            raise WpInvalidFunctionCallError(requestClass.__name__ + " has no updatable field " + name)
+        if hasattr(value, "serialize"):
+            value = value.serialize()
+        elif isinstance(value, list):
+            value = [v.serialize() if hasattr(v, "serialize") else v for v in value]
+        values[name] = value
+    return values
+
+
+def sendUpdate(key, fields):
+    ''' Send one merged update. Not intended for use outside of this module.
+        Input:
+            key - ("customer", cid) or ("account", cid, pid)
+            fields - dictionary of field name to value
+    '''
+    cid = key[1]
+    if key[0] == "customer":
+        request = CustomerRequest()
+        operation, args = "UpdateCustomer", (cid,)
+    else:
+        request = PaymentAccountRequest()
+        request.customerId = cid
+        request.paymentMethodId = key[2]
+        operation, args = "UpdatePaymentAccount", (cid, key[2])
+    for name, value in fields.iteritems():
+        setattr(request, name, value)
+
+    try:
+        response = wpTransact(operation, request.serialize(), *args)
+    finally:  # even a failed call may have changed the customer
+        vaultCache.forgetCustomer(cid)
+    if response.get("responseCode") != 1:
+        raise WpBadResponseError(operation + " failed. " + ":".join(key) + " Result: " + str(response.get("result")) + " Response Code: " + str(response.get("responseCode")) + " Message: " + str(response.get("message")))
+    index = getFingerprintIndex()
+    if index is not None and key[0] == "customer":  # a partial update can't give the new fingerprint, so drop the old one
+        index.forgetCustomer(cid)
+    return len(fields)
+
+
+class WpWriteBehind(object):
+    '''This is a queue that merges vault updates per customer and payment account and sends them in the background.
+        Attributes:
+            window - seconds from the first queued change of a customer or payment account until it is sent
+            journal - SQLite file queued changes are kept in until sent, or None to keep them in memory only
+            failures - list of (key, fields, exception) for changes that were dropped
+            sent - number of updates sent
+        Methods:
+            updateCustomer(cid, **fields) - queue changes to CustomerRequest fields
+            updatePaymentAccount(cid, pid, **fields) - queue changes to PaymentAccountRequest fields
+            pendingCount() - number of customers and payment accounts with changes queued
+            flush() - send everything queued now and wait for it
+            close() - flush, then stop
+    '''
+
+    def __init__(self, window=2.0, journal=None, maxWorkers=None):
+        self.window = window
+        self.journal = journal
+        self.maxWorkers = maxWorkers
+        self.pending = {}  # key: {"fields": {...}, "due": time, "version": n, "sending": version in flight or None}
+        self.changed = threading.Condition(threading.Lock())
+        self.sending = 0  # updates in flight
+        self.flushing = 0  # flush() calls in progress. The background thread stands aside while any are running
+        self.stopped = False
+        self.thread = None
+        self.failures = []
+        self.sent = 0
+        self.db = None
+        if journal:
+            try:
+                self.db = sqlite3.connect(journal, check_same_thread=False)  # only used while holding self.changed
+                with self.db:
+                    self.db.execute("CREATE TABLE IF NOT EXISTS pending (key TEXT PRIMARY KEY, fields TEXT NOT NULL)")
+                rows = self.db.execute("SELECT key, fields FROM pending").fetchall()
+            except sqlite3.Error as e:
+                raise WpStoreError(journal + ": " + str(e))
+            now = time.time()
+            for key, fields in rows:
+                self.pending[tuple(json.loads(key))] = {"fields": json.loads(fields), "due": now, "version": 1, "sending": None}
+            if rows:
+                log.info("Write-behind journal %s: %d queued updates recovered", journal, len(rows))
+                self.start()
+
+    def updateCustomer(self, cid, **fields):
+        self.enqueue(("customer", str(cid)), fieldValues(CustomerRequest, fields))
+
+    def updatePaymentAccount(self, cid, pid, **fields):
+        self.enqueue(("account", str(cid), str(pid)), fieldValues(PaymentAccountRequest, fields))
+
+    def enqueue(self, key, values):
+        ''' Merge changes into the queue. Not intended for use outside of this class. '''
+        if not values:
+            return
+        with self.changed:
+            if self.stopped:
+                raise WpInvalidFunctionCallError("write-behind queue is closed")
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = {"fields": {}, "due": time.time() + self.window, "version": 0, "sending": None}
+            entry["fields"].update(values)
+            entry["version"] += 1
+            self.record(key, entry)
+            self.changed.notify_all()
+        self.start()
+
+    def record(self, key, entry):
+        ''' Write an entry to the journal, or remove it if entry is None. Call with self.changed held. Not intended for use outside of this class. '''
+        if self.db is None:
+            return
+        try:
+            with self.db:
+                if entry is None:
+                    self.db.execute("DELETE FROM pending WHERE key = ?", (json.dumps(key),))
+                else:
+                    self.db.execute("INSERT OR REPLACE INTO pending VALUES (?, ?)", (json.dumps(key), json.dumps(entry["fields"])))
+        except sqlite3.Error as e:
+            raise WpStoreError(self.journal + ": " + str(e))
+
+    def pendingCount(self):
+        with self.changed:
+            return len(self.pending)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.changed:
+            if self.thread is None and not self.stopped:
+                self.thread = threading.Thread(target=self.work, name="wpwritebehind")
+                self.thread.daemon = True  # closeWriteBehind() at exit flushes whatever is left
+                self.thread.start()
+
+    def work(self):
+        ''' Background thread: send each entry once its window has passed. Not intended for use outside of this class. '''
+        while True:
+            with self.changed:
+                while True:
+                    if self.stopped:
+                        return
+                    if not self.flushing:
+                        now = time.time()
+                        due = [e["due"] for e in self.pending.itervalues() if e["sending"] is None]
+                        if due and min(due) <= now:
+                            break
+                        self.changed.wait(min(due) - now if due else None)
+                    else:
+                        self.changed.wait()
+            self.send(lambda entry: entry["due"] <= time.time())
+
+    def send(self, ready):
+        ''' Send every entry that isn't already in flight and for which ready(entry) is true, and wait for the results.
+            Not intended for use outside of this class.
+        '''
+        with self.changed:
+            batch = []
+            for key, entry in self.pending.iteritems():
+                if entry["sending"] is None and ready(entry):
+                    entry["sending"] = entry["version"]
+                    batch.append((key, dict(entry["fields"]), entry["version"]))
+            self.sending += len(batch)
+        if not batch:
+            return
+
+        results = wpRunBatch([(sendUpdate, (key, fields)) for key, fields, version in batch], self.maxWorkers)
+
+        with self.changed:
+            for (key, fields, version), result in zip(batch, results):
+                entry = self.pending[key]
+                entry["sending"] = None
+                if isinstance(result, transientErrors):
+                    entry["due"] = time.time() + self.window  # try again after another window
+                    continue
+                if isinstance(result, Exception):
+                    self.failures.append((key, fields, result))
+                else:
+                    self.sent += 1
+                if entry["version"] == version:  # nothing new arrived while it was in flight
+                    del self.pending[key]
+                    self.record(key, None)
+                else:  # send the newer changes too. Resending the fields already applied is harmless
+                    entry["due"] = time.time() + self.window
+            self.sending -= len(batch)
+            self.changed.notify_all()
+        log.info("Write-behind sent %d updates. %d still queued", len(batch), len(self.pending))
+
+    def flush(self):
+        ''' Send everything queued now, including changes whose window hasn't passed, and wait for it to finish.
+            Output:
+                number of customers and payment accounts still queued (those that failed with a transient error)
+        '''
+        with self.changed:
+            self.flushing += 1
+            while self.sending:  # let a background send in progress finish first
+                self.changed.wait()
+        try:
+            self.send(lambda entry: True)
+        finally:
+            with self.changed:
+                while self.sending:  # the background thread may have claimed entries just before flushing was counted
+                    self.changed.wait()
+                self.flushing -= 1
+                self.changed.notify_all()
+        return self.pendingCount()
+
+    def close(self):
+        ''' Flush, then stop the background thread. Changes still queued stay in the journal, if there is one. '''
+        remaining = self.flush()
+        with self.changed:
+            self.stopped = True
+            self.changed.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.db is not None:
+            self.db.close()
+        if remaining:
+            log.warning("Write-behind closed with %d updates unsent", remaining)
+        return remaining
+
+
+writeBehind = None
+writeBehindLock = threading.Lock()  # guards creating and closing writeBehind
+
+
+def getWriteBehind():
+    ''' Return the shared write-behind queue, creating it on first use '''
+    global writeBehind
+    if writeBehind is None:
+        with writeBehindLock:
+            if writeBehind is None:
+                writeBehind = WpWriteBehind(worldpay.writeBehindSeconds, worldpay.writeBehindJournal)
+    return writeBehind
+
+
+def closeWriteBehind():
+    global writeBehind
+    with writeBehindLock:
+        if writeBehind is not None:
+            writeBehind.close()
+            writeBehind = None
+
+
+atexit.register(closeWriteBehind)  # send whatever is still queued before the interpreter exits
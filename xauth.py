@@ -12,12 +12,14 @@
         doPriorAuthCapture
 '''
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wpauthobjects import AuthorizationRequest, PriorAuthCaptureRequest, Card, Address, PaymentVaultToken, ExtendedInformation, ServiceData
 from wpresponseobjects import AuthResponseParameters
 from wpexceptions import WpBadResponseError, WpInvalidFunctionCallError
 from wptotal import wpTransact
+from wptransactionstore import forgetTransaction
+from wpasync import wpAsync
 from wptestcard import test
 # from beeprint import pp  # This is for an improved print debugger. You can pip install beeprint if you want or just remove the pp() statements
 
@@ -89,12 +91,12 @@ def doPriorAuthCapture(previousTransaction):
     # 2. Send the transaction on a serialized Request Object
     try:
         response = wpTransact("PriorAuthCapture", par.serialize())
-    except:  # pass the exception up
-        raise
+    finally:  # even a failed call may have changed the transaction
+        forgetTransaction(tid)
 
     # 3. Deserialize the result into a Response Object
     rp = AuthResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doPriorAuthCapture failed. TransactionId: " + str(par.transactionId) + " Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -163,7 +165,7 @@ def baseAuthTransaction(withCapture=False, verifyOnly=False):
 
     # 3. Deserialize the result into a Response Object
     rp = AuthResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = operation + " failed. Result: , " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -239,14 +241,18 @@ def doManualAuthTransaction(withCapture=False, verifyOnly=False):
     ar.amount = 10.39
 
     # Build the object relationships
-    log.debug("SD: %s\n", pformat(sd.serialize(), indent=1))
+    if log.isEnabledFor(logging.DEBUG):  # skip the serialize() unless it will be logged
+        log.debug("SD: %s\n", lazyPformat(sd.serialize(), indent=1))
     ei.attachServiceData(sd)
-    log.debug("EI: %s\n", pformat(ei.serialize(), indent=1))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("EI: %s\n", lazyPformat(ei.serialize(), indent=1))
     ar.attachExtendedInformation(ei)
 
-    log.debug("Address: %s\n", pformat(address.serialize(), indent=1))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Address: %s\n", lazyPformat(address.serialize(), indent=1))
     card.attachAddress(address)  # attach the address object
-    log.debug("Card: %s\n", pformat(card.serialize(), indent=1))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Card: %s\n", lazyPformat(card.serialize(), indent=1))
     ar.attachCard(card)  # attach the card object
 
     if withCapture:  # we've overloaded this function as most of the code is the same for Charge, Auth, and verify
@@ -265,7 +271,7 @@ def doManualAuthTransaction(withCapture=False, verifyOnly=False):
 
     # 3. Deserialize the result into a Response Object
     rp = AuthResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = operation + " failed. Result: , " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -316,7 +322,7 @@ def doChargeWithToken(cid, token=""):
         raise
 
     rp = AuthResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = "Charge failed. Result: , " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -328,3 +334,12 @@ def doChargeWithToken(cid, token=""):
     print msg
     log.info(msg)
     return [transactionId, ar.amount]
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doAuthAsync = wpAsync(doAuth)
+doChargeAsync = wpAsync(doCharge)
+doVerifyAsync = wpAsync(doVerify)
+doPriorAuthCaptureAsync = wpAsync(doPriorAuthCapture)
+doManualAuthTransactionAsync = wpAsync(doManualAuthTransaction)
+doChargeWithTokenAsync = wpAsync(doChargeWithToken)
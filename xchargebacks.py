@@ -11,11 +11,13 @@
         doCredit
 '''
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wpauthobjects import AuthorizationRequest, Card
 from wpresponseobjects import AuthResponseParameters
 from wptotal import wpTransact
+from wptransactionstore import forgetTransaction
+from wpasync import wpAsync
 from wptestcard import test
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
@@ -111,19 +113,20 @@ def chargeback(tId, refund=False):
     else:
         op = "Void"
 
-    log.info("%s: %s", op, pformat(ar.serialize(), indent=1))
+    if log.isEnabledFor(logging.INFO):  # skip the serialize() unless it will be logged
+        log.info("%s: %s", op, lazyPformat(ar.serialize(), indent=1))
 
     # 2. Send the transaction on a serialized Request Object
     try:
         response = wpTransact(op, ar.serialize())
-    except:  # pass the exception up. Nothing to do here at the moment
-        raise
+    finally:  # even a failed call may have changed the transaction
+        forgetTransaction(tId)
 
-    log.info("%s Response: %s", op, pformat(response, indent=1))
+    log.info("%s Response: %s", op, lazyPformat(response, indent=1))
 
     # 3. Deserialize the result into a Response Object
     rp = AuthResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = op + " Transaction failed. Result: " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -135,3 +138,9 @@ def chargeback(tId, refund=False):
     print msg
     log.info(msg)
     return rp.responseCode
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doVoidAsync = wpAsync(doVoid)
+doRefundAsync = wpAsync(doRefund)
+doCreditAsync = wpAsync(doCredit)
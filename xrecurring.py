@@ -8,11 +8,12 @@
         doInstallmentPaymentPlan
         doVariablePaymentPlan
         doGetPaymentPlan
+        doProvisionPlans
 '''
 
 import datetime
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wpauthobjects import UserDefinedField
 from wprecurringobjects import RecurringPaymentPlanRequest, InstallmentPaymentPlanRequest, VariablePaymentPlanRequest, GetPaymentPlanRequest
@@ -20,6 +21,9 @@ from wprecurringobjects import RecurringPaymentPlan, ScheduledPayment, VariableP
 from wpresponseobjects import RecurringPaymentPlanResponseParameters, InstallmentPaymentPlanResponseParameters, VariablePaymentPlanResponseParameters, GetPaymentPlanResponseParameters
 from wpexceptions import WpBadResponseError
 from wptotal import wpTransact
+from wpvaultcache import vaultCache
+from wpasync import wpAsync
+from wpprovision import wpProvisionPlans
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
@@ -71,10 +75,12 @@ def doCreateRecurringPaymentPlan(cid):
         response = wpTransact("CreateRecurringPaymentPlan", rec.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = RecurringPaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doCreateRecurringPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -135,10 +141,12 @@ def doUpdateRecurringPaymentPlan(cid, pid):
         response = wpTransact("UpdateRecurringPaymentPlan", rec.serialize(), cid, pid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = RecurringPaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdateRecurringPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -174,8 +182,6 @@ def doCreateInstallmentPaymentPlan(cid):
     plan.balloonPaymentAddedTo = 'FIRST'
     plan.remainderPaymentAddedTo = 'LAST'
     plan.startDate = '9/1/2017'
-    plan.endDate = '10/1/2020'
-    plan.maxRetries = 4
     plan.primaryPaymentMethodId = 1
     plan.notes = 'This is an installment plan'
     plan.active = True
@@ -201,10 +207,12 @@ def doCreateInstallmentPaymentPlan(cid):
         response = wpTransact("CreateInstallmentPaymentPlan", ins.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = InstallmentPaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doCreateInstallmentPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -241,8 +249,6 @@ def doUpdateInstallmentPaymentPlan(cid, pid):
     plan.balloonPaymentAddedTo = 'FIRST'
     plan.remainderPaymentAddedTo = 'LAST'
     plan.startDate = '09/01/2017'
-    plan.endDate = '10/01/2020'
-    plan.maxRetries = 4
     plan.primaryPaymentMethodId = 1
     plan.notes = 'This is an installment plan'
     plan.active = True
@@ -270,10 +276,12 @@ def doUpdateInstallmentPaymentPlan(cid, pid):
         response = wpTransact("UpdateInstallmentPaymentPlan", ins.serialize(), cid, pid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = InstallmentPaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdateInstallmentPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -333,10 +341,12 @@ def doCreateVariablePaymentPlan(cid):
         response = wpTransact("CreateVariablePaymentPlan", var.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = VariablePaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doCreateVariablePayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -397,10 +407,12 @@ def doUpdateVariablePaymentPlan(cid, pid):
         response = wpTransact("UpdateVariablePaymentPlan", var.serialize(), cid, pid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer's plan lists
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = VariablePaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdateVariablePayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -438,7 +450,7 @@ def doGetPaymentPlan(cid, pid):
 
     # 3. Deserialize the result into a Response Object
     rp = GetPaymentPlanResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doGetPaymentPlan failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -449,3 +461,33 @@ def doGetPaymentPlan(cid, pid):
     log.info(msg)
 
     return rp.planId
+
+
+def doProvisionPlans(source, results):
+    '''Create vault customers, their cards, and a payment plan for each in bulk from a CSV or JSON lines file (see wpprovision.py)
+        Running it again with the same files resumes a run that was interrupted.
+        Input:
+            source - file of customers and plans
+            results - CSV file mapping each source row to its customerId, paymentMethodId and planId
+        Output:
+            number of plans created. Rows still waiting for a plan are created by running it again
+        Raises:
+            WpStoreError - the results or checkpoint file could not be used
+    '''
+    created, failed, skipped, pending = wpProvisionPlans(source, results)
+
+    msg = "Provision plans complete. Created: " + str(created) + " Failed: " + str(failed) + " Already done: " + str(skipped) + " Waiting for a plan: " + str(pending)
+    print msg
+    log.info(msg)
+    return created
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doCreateRecurringPaymentPlanAsync = wpAsync(doCreateRecurringPaymentPlan)
+doUpdateRecurringPaymentPlanAsync = wpAsync(doUpdateRecurringPaymentPlan)
+doCreateInstallmentPaymentPlanAsync = wpAsync(doCreateInstallmentPaymentPlan)
+doUpdateInstallmentPaymentPlanAsync = wpAsync(doUpdateInstallmentPaymentPlan)
+doCreateVariablePaymentPlanAsync = wpAsync(doCreateVariablePaymentPlan)
+doUpdateVariablePaymentPlanAsync = wpAsync(doUpdateVariablePaymentPlan)
+doGetPaymentPlanAsync = wpAsync(doGetPaymentPlan)
+doProvisionPlansAsync = wpAsync(doProvisionPlans)
@@ -7,15 +7,21 @@
         doGetBatch
         doGetBatchById
         doCloseBatch
+        doGetBatches
+        doReconcileBatch
 '''
 
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wpsettlementobjects import BatchRequest
 from wpresponseobjects import BatchResponseParameters
+from wpreconcile import wpReconcile, readLedger
+from wpbatchhistory import wpGetBatches
 from wpexceptions import WpBadResponseError
 from wptotal import wpTransact
+from wpasync import wpAsync
+from wptransactionstore import getTransactionStore
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
 
@@ -56,6 +62,52 @@ def doCloseBatch():
     return batchOperation()  # no parameters keys batchOperation to do a close current
 
 
+def doGetBatches(batchIds):
+    '''Retrieve many previously closed batches concurrently into the local transaction store (see wpbatchhistory.py)
+        Batches the store already holds are skipped.
+        Input:
+            batchIds - list or range of batch ids
+        Output:
+            number of transactions retrieved
+        Raises:
+            WpInvalidFunctionCallError - the transaction store is turned off
+    '''
+    def progress(batchId, rp):
+        print "  Batch " + str(batchId) + ": " + str(len(rp.transactions)) + " transactions"
+
+    results = wpGetBatches(batchIds, progress, getTransactionStore())
+
+    failed = [b for b, r in zip(batchIds, results) if isinstance(r, Exception)]
+    count = sum(r for r in results if r is not None and not isinstance(r, Exception))
+    msg = "GetBatches complete. Transactions: " + str(count) + " Skipped: " + str(results.count(None)) + " Failed batches: " + str(failed)
+    print msg
+    log.info(msg)
+    return count
+
+
+def doReconcileBatch(ledgerFile, batchId=0, key="transactionId"):
+    '''Retrieve a batch and reconcile it against our own ledger (see wpreconcile.py)
+        Input:
+            ledgerFile - CSV file, or SQLite database with a ledger table, of transactionId, orderId, amount
+            batchId - id of the batch to retrieve. 0 for the current batch
+            key - "transactionId" or "orderId", the column the two are matched on
+        Output:
+            WpReconciliation
+        Raises:
+            Exceptions raised by wpTransact() and readLedger()
+    '''
+    op, rp = batchResponse(retrieve=True, bId=batchId)
+    result = wpReconcile(rp, readLedger(ledgerFile), key)
+
+    msg = result.summary()
+    print msg
+    log.info(msg)
+    msg = op + " reconciliation " + ("balanced" if result.balanced() else "out of balance") + ". BatchId: " + str(rp.batchId)
+    print msg
+    log.info(msg)
+    return result
+
+
 def batchOperation(retrieve=False, bId=0):
     '''
     This function is the common logic for the three batch calls. No need to call this function directly
@@ -67,9 +119,37 @@ def batchOperation(retrieve=False, bId=0):
         WpBadResponse
         others raised from transact())
     '''
+    op, rp = batchResponse(retrieve, bId)
+
+    # Print out transactions in the batch specified
+    msg = op + " transactions: {"
+    for i in rp.transactions:
+        msg += str(i.transactionId) + "  "
+    msg += "}"
+    print msg
+    log.info(msg)
+
+    msg = op + " transaction successful. BatchId: " + rp.batchId
+    print msg
+    log.info(msg)
+
+    return rp.batchId
+
+
+def batchResponse(retrieve=False, bId=0):
+    '''
+    This function sends one of the three batch calls and checks the result. No need to call this function directly
+    Input: as for batchOperation
+    Output:
+        (operation name, BatchResponseParameters)
+    Raises:
+        WpBadResponse
+        others raised from transact())
+    '''
     # 1. Fill in the Request Object
     cb = BatchRequest()
-    log.debug("batchOperation retrieve: %s, bid: %s Request: %s", retrieve, str(bId), pformat(cb.serialize(), indent=1))
+    if log.isEnabledFor(logging.DEBUG):  # skip the serialize() unless it will be logged
+        log.debug("batchOperation retrieve: %s, bid: %s Request: %s", retrieve, str(bId), lazyPformat(cb.serialize(), indent=1))
 
     # Do the approporate transaction based on arguments
     if retrieve is False:  # close the currently open batch
@@ -93,16 +173,19 @@ def batchOperation(retrieve=False, bId=0):
         errMsg = op + " failed. Batch id: " + str(rp.batchId) + "Result:  +  " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
         raise WpBadResponseError(errMsg)
 
-    # Print out transactions in the batch specified
-    msg = op + " transactions: {"
-    for i in rp.transactions:
-        msg += str(i.transactionId) + "  "
-    msg += "}"
-    print msg
-    log.info(msg)
+    store = getTransactionStore()
+    if store is not None:  # keep the local transaction store current with what the batch holds
+        if op == "GetBatchById":  # a closed batch won't change, so remember that it is stored
+            store.putBatch(rp)
+        else:
+            store.put(rp.transactions)
 
-    msg = op + " transaction successful. BatchId: " + rp.batchId
-    print msg
-    log.info(msg)
+    return op, rp
 
-    return rp.batchId
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doGetBatchAsync = wpAsync(doGetBatch)
+doGetBatchByIdAsync = wpAsync(doGetBatchById)
+doCloseBatchAsync = wpAsync(doCloseBatch)
+doGetBatchesAsync = wpAsync(doGetBatches)
+doReconcileBatchAsync = wpAsync(doReconcileBatch)
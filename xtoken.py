@@ -7,12 +7,13 @@
         doCreateToken
 '''
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wpauthobjects import Card
 from wptokenobjects import TokenRequest
 from wpresponseobjects import TokenResponseParameters
 from wptotal import wpTransact
+from wpasync import wpAsync
 from wptestcard import test
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
@@ -49,7 +50,7 @@ def doCreateToken(cid="", saveToVault=False):
 
     # 3. Deserialize the result into a Response Object
     rp = TokenResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = "CreateToken transaction failed. Result: " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -59,10 +60,14 @@ def doCreateToken(cid="", saveToVault=False):
 
     token = rp.token
 
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     # return the response code
     msg = "CreateToken transaction successful. Token: " + str(token)
     print msg
     log.info(msg)
     return token
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doCreateTokenAsync = wpAsync(doCreateToken)
@@ -5,15 +5,23 @@
 
     The main operations are:
         doSearchTransactions
+        doSyncTransactions
         doGetTransaction
         doUpdateTransaction
+
+    Every transaction these operations see is written to the local transaction store (see wptransactionstore.py),
+    and doGetTransaction answers from the store when it can.
 '''
 
 import datetime
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 
 from wptotal import wpTransact
+from wpsearch import wpSearchTransactions, searchDate
+from wptransactionstore import getTransactionStore, forgetTransaction
+from wpsync import wpSyncTransactions
+from wpasync import wpAsync
 # from wpauthobjects import LevelTwoData
 from wptransactionreportingobjects import SearchTransactionsRequest, UpdateTransactionRequest
 from wpresponseobjects import TransactionReportingResponseParameters
@@ -25,6 +33,9 @@ log = logging.getLogger(__name__)  # this allows the name of the current module
 
 def doSearchTransactions():
     '''Search a transaction based on supplied criteria
+        The range is searched in adaptive windows by wpSearchTransactions() (see wpsearch.py), so
+        transactions are printed as each window arrives and a busy month never comes back as one response.
+        The transactions found are added to the local transaction store.
         Input:
             none
         Output:
@@ -33,44 +44,66 @@ def doSearchTransactions():
             Exceptions raised by wpTransact()
     '''
 
-    # 1. Fill in the Request Object
-    st = SearchTransactionsRequest()
     # Seach to last 30 days.
     stop = datetime.date.today()
     oneMonth = datetime.timedelta(days=30)
     start = stop - oneMonth
 
-    st.startDate = str(start.month) + "/" + str(start.day) + "/" + str(start.year)
-    st.endDate = str(stop.month) + "/" + str(stop.day) + "/" + str(stop.year)
+    log.info("Seach range: %s - %s", searchDate(start), searchDate(stop))
 
-    log.info("Seach range: %s - %s", st.startDate, st.endDate)
+    # 1. Fill in the Request Object with any criteria other than the dates. None for this example
+    st = SearchTransactionsRequest()
 
-    # 2. Send the transaction on a serialized Request Object
-    try:
-        response = wpTransact("SearchTransactions", st.serialize())
-    except:  # pass the exception up. Nothing to do here at the moment
-        raise
+    # 2. Send the transactions and 3. deserialize each window's results as they arrive
+    store = getTransactionStore()
+    found = []
+    count = 0
+    for record in wpSearchTransactions(start, stop, st):
+        if record.transactionData is None:  # still stored, but there is no amount to show
+            log.warning("Transaction %s has no transactionData", record.transactionId)
+            amount = record.authorizedAmount
+        else:
+            amount = record.transactionData.amount
+        msg = "  (" + str(record.creditCardType) + " " + str(record.cardNumber) + "  $" + str(amount)
+        print msg
+        count += 1
+        found.append(record)
+        if store is not None and len(found) >= 500:  # write in chunks rather than one row at a time
+            store.put(found)
+            found = []
+    if store is not None:
+        store.put(found)
+
+    msg = "Search tansactions successful. " + str(count) + " transactions"
+    print msg
+    log.info(msg)
+    return
 
-    rp = TransactionReportingResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
 
-    if (rp.responseCode != 1):  # response from Worldpay indicates failure
-        errMsg = "SearchTransactions failed. Result: , " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
-        raise WpBadResponseError(errMsg)
+def doSyncTransactions():
+    '''Fetch only the transactions that are new or changed since the last sync into the local transaction store
+        The first run pulls the last 30 days. Later runs start from the high-water mark saved in the store (see wpsync.py),
+        so an hourly job costs a delta pull rather than a full search.
+        Input:
+            none
+        Output:
+            none
+        Raises:
+            WpInvalidFunctionCallError - the transaction store is turned off (WPTotal.transactionStoreFile is None)
+            Exceptions raised by wpTransact()
+    '''
+    added, changed = wpSyncTransactions()
 
-    # return the transaction id and amount
-    msg = "Search tansactions successful."
+    msg = "Sync transactions successful. " + str(added) + " new, " + str(changed) + " changed"
     print msg
     log.info(msg)
-
-    for record in rp.transactions:
-        msg = "  (" + record.creditCardType + " " + record.cardNumber + "  $" + str(record.transactionData.amount)
-        print msg
     return
 
 
 def doGetTransaction(tid):
     '''Get a transaction based on transaction id
+        The local transaction store is checked first. A settled transaction, or an unsettled one fetched
+        recently, is read from there without calling the gateway.
         Input:
             tid - transaction id
         Output:
@@ -79,24 +112,33 @@ def doGetTransaction(tid):
             Exceptions raised by wpTransact()
     '''
 
-    # 1. Fill in the Request Object - none required for this operation
-    # 2. Send the transaction
-    try:
-        response = wpTransact("GetTransaction", "", tid)
-    except:  # pass the exception up. Nothing to do here at the moment
-        raise
-
-    # 3. Deserialize the result into a Response Object
-    rp = TransactionReportingResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
-
-    if (rp.responseCode != 1):  # response from Worldpay indicates failure
-        errMsg = "GetTransaction failed. Result: , " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
-        raise WpBadResponseError(errMsg)
-
-    cardNumber = rp.transactions[0].cardNumber
-    cardType = rp.transactions[0].creditCardType
-    amount = str(rp.transactions[0].transactionData.amount)
+    store = getTransactionStore()
+    transaction = store.get(tid) if store is not None else None
+    if transaction is not None:
+        log.info("GetTransaction %s answered from the transaction store", tid)
+    else:
+        # 1. Fill in the Request Object - none required for this operation
+        # 2. Send the transaction
+        try:
+            response = wpTransact("GetTransaction", "", tid)
+        except:  # pass the exception up. Nothing to do here at the moment
+            raise
+
+        # 3. Deserialize the result into a Response Object
+        rp = TransactionReportingResponseParameters(response)
+        log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
+
+        if (rp.responseCode != 1):  # response from Worldpay indicates failure
+            errMsg = "GetTransaction failed. Result: , " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
+            raise WpBadResponseError(errMsg)
+
+        if store is not None:
+            store.put(rp.transactions)
+        transaction = rp.transactions[0]
+
+    cardNumber = transaction.cardNumber
+    cardType = transaction.creditCardType
+    amount = str(transaction.transactionData.amount if transaction.transactionData is not None else transaction.authorizedAmount)
     msg = "Get Transaction successful. (" + cardType + " " + cardNumber + "  $" + amount + ")"
     print msg
     log.info(msg)
@@ -142,15 +184,24 @@ def doUpdateTransaction(tid):
 
     # 3. Deserialize the result into a Response Object
     rp = TransactionReportingResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):  # response from Worldpay indicates failure
         errMsg = "UpdateTransaction failed. Result: , " + rp.result + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
         raise WpBadResponseError(errMsg)
 
+    forgetTransaction(tid)  # the stored copy is out of date now
+
     # return the transaction id and amount
     msg = "Update transaction successful. TransactionId = " + str(rp.transaction.transactionId) + " IP Address: " + str(rp.ipAddress)
     print msg
     log.info(msg)
 
     return
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doSearchTransactionsAsync = wpAsync(doSearchTransactions)
+doSyncTransactionsAsync = wpAsync(doSyncTransactions)
+doGetTransactionAsync = wpAsync(doGetTransaction)
+doUpdateTransactionAsync = wpAsync(doUpdateTransaction)
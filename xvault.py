@@ -13,11 +13,17 @@
         doDeletePaymentAccount
         doCreateCustomerAndPayment
         doUpdateCustomerAndPayment
+        doImportCustomers
+        doQueueCustomerUpdate
 
+    When WPTotal.fingerprintIndexFile is set, doCreateCustomer returns the existing customer instead of
+    creating a duplicate when the same customer was already created (see wpfingerprint.py).
+    doGetCustomer and doGetPaymentAccount read through the vault cache (see wpvaultcache.py).
+    Every operation that changes a customer drops that customer from the cache once the call is made.
 '''
 
 import logging
-from pprint import pformat
+from wplog import lazyPformat
 from datetime import datetime
 
 from wpauthobjects import Card, Address, UserDefinedField
@@ -25,6 +31,11 @@ from wpvaultobjects import CustomerRequest, PaymentAccountRequest, CustomerAndPa
 from wpresponseobjects import CustomerResponseParameters, PaymentAccountResponseParameters, CustomerAndPaymentResponseParameters
 from wpexceptions import WpBadResponseError
 from wptotal import wpTransact
+from wpasync import wpAsync
+from wpvaultcache import vaultCache, customerKey, accountKey
+from wpimport import wpImportCustomers
+from wpfingerprint import getFingerprintIndex, customerFingerprint
+from wpwritebehind import getWriteBehind
 from wptestcard import test
 
 log = logging.getLogger(__name__)  # this allows the name of the current module to be placed in the log entry
@@ -32,6 +43,8 @@ log = logging.getLogger(__name__)  # this allows the name of the current module
 
 def doCreateCustomer():
     '''Perform Create Customer in the vault
+        If the fingerprint index is turned on, it is checked first. If this customer was already created, for
+        instance by a retried or replayed call, the existing customerId is returned and nothing is sent.
         Input:
             nothing
         Output:
@@ -70,25 +83,36 @@ def doCreateCustomer():
     cr.attachUserDefinedField(udf1)
     cr.attachUserDefinedField(udf2)
 
-    # 2. Send the transaction on a serialized Request Object
-    try:
-        response = wpTransact("CreateCustomer", cr.serialize())
-    except:  # pass the exception up. Nothing to do here at the moment
-        raise
-
-    # 3. Deserialize the result into a Response Object
-    rp = CustomerResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
-
-    if (rp.responseCode != 1):
-        errMsg = "doCreateCustomer failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
-        raise WpBadResponseError(errMsg)
-
-    msg = "Create Customer transaction successful. CustomerId: " + str(rp.customerId)
+    def create():
+        # 2. Send the transaction on a serialized Request Object
+        try:
+            response = wpTransact("CreateCustomer", cr.serialize())
+        except:  # pass the exception up. Nothing to do here at the moment
+            raise
+
+        # 3. Deserialize the result into a Response Object
+        rp = CustomerResponseParameters(response)
+        log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
+
+        if (rp.responseCode != 1):
+            errMsg = "doCreateCustomer failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
+            raise WpBadResponseError(errMsg)
+        return rp.customerId
+
+    index = getFingerprintIndex()
+    if index is None:
+        cid, created = create(), True
+    else:
+        cid, created = index.findOrCreate(customerFingerprint(cr), create)
+
+    if created:
+        msg = "Create Customer transaction successful. CustomerId: " + str(cid)
+    else:
+        msg = "Create Customer skipped. Customer already exists. CustomerId: " + str(cid)
     print msg
     log.info(msg)
 
-    return rp.customerId
+    return cid
 
 
 def doUpdateCustomer(cid):
@@ -140,15 +164,21 @@ def doUpdateCustomer(cid):
         response = wpTransact("UpdateCustomer", cr.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:  # even a failed call may have changed the customer
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = CustomerResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdateCustomer failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
         raise WpBadResponseError(errMsg)
 
+    index = getFingerprintIndex()
+    if index is not None:  # index the customer under its new details
+        index.replace(cid, customerFingerprint(cr))
+
     msg = "Update Customer transaction successful. CustomerId: " + str(rp.customerId)
     print msg
     log.info(msg)
@@ -166,15 +196,15 @@ def doGetCustomer(cid):
             Exceptions raised by wpTransact()
     '''
     # 1. Fill in the Request Object - there transaction doesn't require a Request Object
-    # 2. Send the transaction
+    # 2. Send the transaction, unless the customer is in the vault cache
     try:
-        response = wpTransact("GetCustomer", "", cid)
+        response = vaultCache.read(customerKey(cid), lambda: wpTransact("GetCustomer", "", cid))
     except:  # pass the exception up. Nothing to do here at the moment
         raise
 
     # 3. Deserialize the result into a Response Object
     rp = CustomerResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doGetCustomer failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -214,10 +244,12 @@ def doCreatePaymentAccount(cid):
         response = wpTransact("CreatePaymentAccount", va.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = PaymentAccountResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doCreatePaymentAccount failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -241,15 +273,15 @@ def doGetPaymentAccount(cid, pid):
             Exceptions raised by wpTransact()
     '''
     # 1. Fill in the Request Object - this transaction doesn't require a Request Object
-    # 2. Send the transaction
+    # 2. Send the transaction, unless the payment account is in the vault cache
     try:
-        response = wpTransact("GetPaymentAccount", "", cid, pid)
+        response = vaultCache.read(accountKey(cid, pid), lambda: wpTransact("GetPaymentAccount", "", cid, pid))
     except:  # pass the exception up. Nothing to do here at the moment
         raise
 
     # 3. Deserialize the result into a Response Object
     rp = PaymentAccountResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doGetPaymentAccount failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -283,7 +315,7 @@ def doUpdatePaymentAccount(cid, pid):
     va = PaymentAccountRequest()
     va.customerId = cid
     va.primary = True
-    va.paymnetMethodId = pid
+    va.paymentMethodId = pid
     va.attachCard(card)
 
     # 2. Send the transaction on a serialized Request Object
@@ -291,10 +323,12 @@ def doUpdatePaymentAccount(cid, pid):
         response = wpTransact("UpdatePaymentAccount", va.serialize(), cid, pid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = PaymentAccountResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdatePaymentAccount failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -329,10 +363,12 @@ def doDeletePaymentAccount(cid, pid):
         response = wpTransact("DeletePaymentAccount", "", cid, pid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = PaymentAccountResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doDeletePaymentAccount failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -390,7 +426,7 @@ def doCreateCustomerAndPayment():
 
     # 3. Deserialize the result into a Response Object
     rp = CustomerAndPaymentResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doCreateCustomerAndPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -457,10 +493,12 @@ def doUpdateCustomerAndPayment(cid):
         response = wpTransact("UpdateCustomerAndPayment", cr.serialize(), cid)
     except:  # pass the exception up. Nothing to do here at the moment
         raise
+    finally:
+        vaultCache.forgetCustomer(cid)
 
     # 3. Deserialize the result into a Response Object
     rp = CustomerAndPaymentResponseParameters(response)
-    log.info(">>>Response>>> \n%s", pformat(rp, indent=1))
+    log.info(">>>Response>>> \n%s", lazyPformat(rp, indent=1))
 
     if (rp.responseCode != 1):
         errMsg = "doUpdateCustomerAndPayment failed. Result: " + str(rp.result) + " Response Code: " + str(rp.responseCode) + " Message: " + rp.message
@@ -471,3 +509,56 @@ def doUpdateCustomerAndPayment(cid):
     log.info(msg)
 
     return rp.vaultCustomer.customerId
+
+
+def doImportCustomers(source, results):
+    '''Create vault customers and their cards in bulk from a CSV or JSON lines file (see wpimport.py)
+        Running it again with the same files resumes an import that was interrupted.
+        Input:
+            source - file of customers
+            results - CSV file mapping each source row to its customerId and paymentMethodId
+        Output:
+            number of customers created
+        Raises:
+            WpStoreError - the results or checkpoint file could not be used
+    '''
+    created, failed, skipped = wpImportCustomers(source, results)
+
+    msg = "Import customers complete. Created: " + str(created) + " Failed: " + str(failed) + " Already done: " + str(skipped)
+    print msg
+    log.info(msg)
+    return created
+
+
+def doQueueCustomerUpdate(cid, **fields):
+    '''Queue changes to a customer to be sent by the write-behind queue (see wpwritebehind.py)
+        Changes queued for the same customer within WPTotal.writeBehindSeconds are sent as one UpdateCustomer.
+        Input:
+            cid - customerId
+            fields - CustomerRequest fields to change, e.g. emailAddress="new@example.com". An Address may be passed as address
+        Output:
+            number of customers and payment accounts with changes queued
+        Raises:
+            WpInvalidFunctionCallError - a field is not a CustomerRequest field
+    '''
+    queue = getWriteBehind()
+    queue.updateCustomer(cid, **fields)
+
+    msg = "Update Customer queued. CustomerId: " + str(cid) + " Fields: " + ", ".join(sorted(fields))
+    print msg
+    log.info(msg)
+    return queue.pendingCount()
+
+
+# Non-blocking versions of the operations above. Each returns a WpFuture; call result() on it to get the value
+doCreateCustomerAsync = wpAsync(doCreateCustomer)
+doUpdateCustomerAsync = wpAsync(doUpdateCustomer)
+doGetCustomerAsync = wpAsync(doGetCustomer)
+doCreatePaymentAccountAsync = wpAsync(doCreatePaymentAccount)
+doGetPaymentAccountAsync = wpAsync(doGetPaymentAccount)
+doUpdatePaymentAccountAsync = wpAsync(doUpdatePaymentAccount)
+doDeletePaymentAccountAsync = wpAsync(doDeletePaymentAccount)
+doCreateCustomerAndPaymentAsync = wpAsync(doCreateCustomerAndPayment)
+doUpdateCustomerAndPaymentAsync = wpAsync(doUpdateCustomerAndPayment)
+doImportCustomersAsync = wpAsync(doImportCustomers)
+doQueueCustomerUpdateAsync = wpAsync(doQueueCustomerUpdate)